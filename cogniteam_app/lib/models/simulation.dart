@@ -10,6 +10,7 @@ class Simulation {
   final String? resultSummary;
   final String? errorMessage;
   final String createdBy;
+  final bool hasResult;
 
   Simulation({
     required this.simulationId,
@@ -23,7 +24,8 @@ class Simulation {
     this.resultSummary,
     this.errorMessage,
     required this.createdBy,
-  });
+    bool? hasResult,
+  }) : hasResult = hasResult ?? resultSummary != null;
 
   factory Simulation.fromJson(Map<String, dynamic> json) {
     return Simulation(
@@ -42,6 +44,8 @@ class Simulation {
       resultSummary: json['result_summary'],
       errorMessage: json['error_message'],
       createdBy: json['created_by'] ?? '',
+      // 一覧APIは result_summary を返さないため has_result で判定
+      hasResult: json['has_result'],
     );
   }
 
@@ -58,6 +62,7 @@ class Simulation {
       'result_summary': resultSummary,
       'error_message': errorMessage,
       'created_by': createdBy,
+      'has_result': hasResult,
     };
   }
 
@@ -73,6 +78,7 @@ class Simulation {
     String? resultSummary,
     String? errorMessage,
     String? createdBy,
+    bool? hasResult,
   }) {
     return Simulation(
       simulationId: simulationId ?? this.simulationId,
@@ -86,6 +92,7 @@ class Simulation {
       resultSummary: resultSummary ?? this.resultSummary,
       errorMessage: errorMessage ?? this.errorMessage,
       createdBy: createdBy ?? this.createdBy,
+      hasResult: hasResult ?? this.hasResult,
     );
   }
 }
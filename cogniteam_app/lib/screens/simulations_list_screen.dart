@@ -277,7 +277,7 @@ class _SimulationCard extends ConsumerWidget {
                 ],
               ),
               if (simulation.status == 'completed' &&
-                  simulation.resultSummary != null) ...[
+                  simulation.hasResult) ...[
                 const SizedBox(height: 8),
                 Container(
                   padding: const EdgeInsets.all(8),
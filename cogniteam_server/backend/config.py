@@ -33,6 +33,109 @@ class Settings:
     VERTEX_AI_STAGING_BUCKET: str = os.getenv("VERTEX_AI_STAGING_BUCKET", f"gs://{VERTEX_AI_PROJECT}-agent-staging")
     VERTEX_AI_AGENT_ENGINE_FRAMEWORK: str = os.getenv("VERTEX_AI_AGENT_ENGINE_FRAMEWORK", "langchain")  # Options: langchain, adk, ag2, llama_index
     VERTEX_AI_AGENT_ENGINE_DEPLOYMENT_TIMEOUT: int = int(os.getenv("VERTEX_AI_AGENT_ENGINE_DEPLOYMENT_TIMEOUT", "300"))  # 5 minutes default
+    # User agents are deployed in the background after signup (users.agent_status), this many at a time per process
+    AGENT_PROVISIONING_MAX_CONCURRENCY: int = int(os.getenv("AGENT_PROVISIONING_MAX_CONCURRENCY", "2"))
+    AGENT_PROVISIONING_TIMEOUT_SECONDS: float = float(os.getenv("AGENT_PROVISIONING_TIMEOUT_SECONDS", "600"))
+    # Deployments take minutes; on shutdown they get this long to finish before being put back to "pending"
+    AGENT_PROVISIONING_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("AGENT_PROVISIONING_SHUTDOWN_GRACE_SECONDS", "600"))
+
+    # "per_user": one deployed agent per user (users.agent_engine_id). "shared": participants are answered by a small
+    # pool of generic agents (SHARED_PARTICIPANT_AGENT_IDS, comma-separated) with the user's persona in the session state
+    PARTICIPANT_AGENT_MODE: str = os.getenv("PARTICIPANT_AGENT_MODE", "per_user")
+    SHARED_PARTICIPANT_AGENT_IDS: str = os.getenv("SHARED_PARTICIPANT_AGENT_IDS", "")
+
+    # Seconds a resolved Agent Engine handle (agent_engines.get) is reused before it is fetched again
+    REMOTE_AGENT_HANDLE_TTL_SECONDS: float = float(os.getenv("REMOTE_AGENT_HANDLE_TTL_SECONDS", "600"))
+    # Time allowed for resolving a participant's agent when a simulation is created (timeouts are not treated as invalid)
+    REMOTE_AGENT_PROBE_TIMEOUT_SECONDS: float = float(os.getenv("REMOTE_AGENT_PROBE_TIMEOUT_SECONDS", "10"))
+    # Agent Engine sessions are reused across turns of a simulation; idle ones are deleted by a sweeper
+    REMOTE_SESSION_IDLE_TTL_SECONDS: float = float(os.getenv("REMOTE_SESSION_IDLE_TTL_SECONDS", "900"))
+    REMOTE_SESSION_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("REMOTE_SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+    # Retries (exponential backoff with jitter) and per-agent circuit breakers for Agent Engine calls
+    REMOTE_AGENT_RETRY_MAX_ATTEMPTS: int = int(os.getenv("REMOTE_AGENT_RETRY_MAX_ATTEMPTS", "3"))
+    REMOTE_AGENT_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("REMOTE_AGENT_RETRY_BASE_DELAY_SECONDS", "1"))
+    REMOTE_AGENT_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("REMOTE_AGENT_RETRY_MAX_DELAY_SECONDS", "10"))
+    # Total time budget for one participant question, retries included
+    REMOTE_AGENT_CALL_DEADLINE_SECONDS: float = float(os.getenv("REMOTE_AGENT_CALL_DEADLINE_SECONDS", "120"))
+    REMOTE_AGENT_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("REMOTE_AGENT_BREAKER_FAILURE_THRESHOLD", "5"))
+    REMOTE_AGENT_BREAKER_RESET_SECONDS: float = float(os.getenv("REMOTE_AGENT_BREAKER_RESET_SECONDS", "30"))
+    # Agent Engine query quota (token bucket shared by all simulations in the process)
+    AGENT_ENGINE_REQUESTS_PER_MINUTE: float = float(os.getenv("AGENT_ENGINE_REQUESTS_PER_MINUTE", "10"))
+    AGENT_ENGINE_RATE_BURST: float = float(os.getenv("AGENT_ENGINE_RATE_BURST", "1"))
+    # AGENT_ENGINE_RATE_LIMIT_SCOPE: "project" (one bucket per project/region) or "agent" (one bucket per deployed agent)
+    AGENT_ENGINE_RATE_LIMIT_SCOPE: str = os.getenv("AGENT_ENGINE_RATE_LIMIT_SCOPE", "project").lower()
+
+    # Event bus settings (fan-out of chat messages and simulation notifications across workers)
+    # EVENT_BUS_BACKEND: "inprocess" (single worker only) or "redis" (Redis server or services.event_broker stand-in)
+    EVENT_BUS_BACKEND: str = os.getenv("EVENT_BUS_BACKEND", "inprocess").lower()
+    # redis://host:port or unix:///path/to/broker.sock
+    EVENT_BUS_URL: str = os.getenv("EVENT_BUS_URL", "redis://localhost:6379")
+    EVENT_BUS_NAMESPACE: str = os.getenv("EVENT_BUS_NAMESPACE", "cogniteam")
+    # SSE_MESSAGE_FEED: "bus" (messages written through this API only) or "firestore"
+    # (one on_snapshot listener per subscribed group, so messages written by any process or script reach SSE clients)
+    SSE_MESSAGE_FEED: str = os.getenv("SSE_MESSAGE_FEED", "bus").lower()
+
+    # SSE backpressure: per-connection queue bound and overflow policy per event type
+    # Policies: drop_oldest, coalesce (keep only the latest event of that type), disconnect
+    SSE_QUEUE_MAXSIZE: int = int(os.getenv("SSE_QUEUE_MAXSIZE", "100"))
+    SSE_OVERFLOW_POLICIES: str = os.getenv(
+        "SSE_OVERFLOW_POLICIES",
+        "message:drop_oldest,simulation_completed:disconnect,simulation_failed:disconnect",
+    )
+    SSE_DEFAULT_OVERFLOW_POLICY: str = os.getenv("SSE_DEFAULT_OVERFLOW_POLICY", "drop_oldest")
+
+    # Simulation job runner settings
+    SIMULATION_MAX_CONCURRENCY: int = int(os.getenv("SIMULATION_MAX_CONCURRENCY", "4"))
+    SIMULATION_MAX_CONCURRENCY_PER_USER: int = int(os.getenv("SIMULATION_MAX_CONCURRENCY_PER_USER", "2"))
+    # Seconds to let running simulations finish on shutdown before they are interrupted and marked resumable
+    SIMULATION_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("SIMULATION_SHUTDOWN_GRACE_SECONDS", "10"))
+    # Simulation turns are checkpointed to simulations/{id}/turns every N turns or every N seconds
+    SIMULATION_CHECKPOINT_BATCH_SIZE: int = int(os.getenv("SIMULATION_CHECKPOINT_BATCH_SIZE", "10"))
+    SIMULATION_CHECKPOINT_FLUSH_SECONDS: float = float(os.getenv("SIMULATION_CHECKPOINT_FLUSH_SECONDS", "5"))
+    # How often a running simulation checks Firestore for a cancel request made by another process
+    SIMULATION_CANCEL_POLL_SECONDS: float = float(os.getenv("SIMULATION_CANCEL_POLL_SECONDS", "5"))
+    # SIMULATION_DIRECTOR_MODE: "single" (one director designs and runs scenario A then B) or "pipeline"
+    # (planner -> scenario A and B runners in parallel -> evaluator)
+    SIMULATION_DIRECTOR_MODE: str = os.getenv("SIMULATION_DIRECTOR_MODE", "single")
+    # Opt-in cache of participant answers keyed by agent, persona (prompt) version and question text, so
+    # reruns and batch sweeps skip repeated remote calls. Backend: "sqlite" (PARTICIPANT_RESPONSE_CACHE_PATH) or "firestore"
+    PARTICIPANT_RESPONSE_CACHE_ENABLED: bool = os.getenv("PARTICIPANT_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    PARTICIPANT_RESPONSE_CACHE_BACKEND: str = os.getenv("PARTICIPANT_RESPONSE_CACHE_BACKEND", "sqlite")
+    PARTICIPANT_RESPONSE_CACHE_PATH: str = os.getenv("PARTICIPANT_RESPONSE_CACHE_PATH", "./data/participant_response_cache.sqlite3")
+    PARTICIPANT_RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("PARTICIPANT_RESPONSE_CACHE_TTL_SECONDS", "86400"))
+    PARTICIPANT_RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("PARTICIPANT_RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+    # AGENT_RECORDING_MODE: "off", "record" (save Agent Engine and director model traffic to AGENT_RECORDING_DIR)
+    # or "replay" (serve the recordings offline). Replay delays are the recorded timings x AGENT_REPLAY_LATENCY_SCALE,
+    # plus AGENT_REPLAY_EXTRA_LATENCY_SECONDS (+ up to AGENT_REPLAY_LATENCY_JITTER_SECONDS) before each first event
+    AGENT_RECORDING_MODE: str = os.getenv("AGENT_RECORDING_MODE", "off")
+    AGENT_RECORDING_DIR: str = os.getenv("AGENT_RECORDING_DIR", "./data/agent_recordings")
+    AGENT_REPLAY_LATENCY_SCALE: float = float(os.getenv("AGENT_REPLAY_LATENCY_SCALE", "1.0"))
+    AGENT_REPLAY_EXTRA_LATENCY_SECONDS: float = float(os.getenv("AGENT_REPLAY_EXTRA_LATENCY_SECONDS", "0"))
+    AGENT_REPLAY_LATENCY_JITTER_SECONDS: float = float(os.getenv("AGENT_REPLAY_LATENCY_JITTER_SECONDS", "0"))
+    # Results larger than SIMULATION_RESULT_INLINE_MAX_BYTES are zlib-compressed into chunks stored in
+    # SIMULATION_RESULT_STORE ("firestore": simulations/{id}/result_chunks, "local": SIMULATION_RESULT_LOCAL_DIR);
+    # only the first SIMULATION_RESULT_PREVIEW_CHARS characters stay inline in result_summary
+    SIMULATION_RESULT_STORE: str = os.getenv("SIMULATION_RESULT_STORE", "firestore")
+    SIMULATION_RESULT_LOCAL_DIR: str = os.getenv("SIMULATION_RESULT_LOCAL_DIR", "./data/simulation_results")
+    SIMULATION_RESULT_INLINE_MAX_BYTES: int = int(os.getenv("SIMULATION_RESULT_INLINE_MAX_BYTES", "65536"))
+    SIMULATION_RESULT_PREVIEW_CHARS: int = int(os.getenv("SIMULATION_RESULT_PREVIEW_CHARS", "2000"))
+    SIMULATION_RESULT_CHUNK_BYTES: int = int(os.getenv("SIMULATION_RESULT_CHUNK_BYTES", "524288"))
+    # Batch sweeps (POST /simulations/batches): maximum instructions x participant sets per batch, and how
+    # much of each result is quoted in the comparison report
+    SIMULATION_BATCH_MAX_CELLS: int = int(os.getenv("SIMULATION_BATCH_MAX_CELLS", "20"))
+    SIMULATION_BATCH_REPORT_PREVIEW_CHARS: int = int(os.getenv("SIMULATION_BATCH_REPORT_PREVIEW_CHARS", "3000"))
+    # Director sessions (ADK event histories) are shared by all runs in the process and deleted when a run ends.
+    # LOCAL_SESSION_STORE: "memory" (evicts least recently updated sessions above LOCAL_SESSION_STORE_MAX_BYTES)
+    # or "sqlite" (histories on disk at LOCAL_SESSION_STORE_PATH)
+    LOCAL_SESSION_STORE: str = os.getenv("LOCAL_SESSION_STORE", "memory").lower()
+    LOCAL_SESSION_STORE_MAX_BYTES: int = int(os.getenv("LOCAL_SESSION_STORE_MAX_BYTES", "268435456"))
+    LOCAL_SESSION_STORE_PATH: str = os.getenv("LOCAL_SESSION_STORE_PATH", "./data/local_sessions.sqlite3")
+    # SIMULATION_EXECUTION_MODE: "inprocess" (run inside the API process) or "worker"
+    # (the API only enqueues; `python -m workers.simulation` processes claim jobs under a lease)
+    SIMULATION_EXECUTION_MODE: str = os.getenv("SIMULATION_EXECUTION_MODE", "inprocess").lower()
+    SIMULATION_LEASE_TTL_SECONDS: float = float(os.getenv("SIMULATION_LEASE_TTL_SECONDS", "60"))
+    SIMULATION_LEASE_HEARTBEAT_SECONDS: float = float(os.getenv("SIMULATION_LEASE_HEARTBEAT_SECONDS", "15"))
+    SIMULATION_WORKER_POLL_SECONDS: float = float(os.getenv("SIMULATION_WORKER_POLL_SECONDS", "5"))
 
     # API keys (should always be from environment variables)
     # EXAMPLE_API_KEY: str = os.getenv("EXAMPLE_API_KEY")
@@ -4,7 +4,10 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.responses import Response
 from starlette.requests import Request
 from utils.firebase_setup import initialize_firebase_admin
-from routers import auth, user, agent, chat_group, chat, insight, simulation, sse
+from utils.vertex_setup import initialize_vertex_ai
+from routers import auth, user, agent, chat_group, chat, insight, simulation, simulation_batch, sse
+from services.event_bus import get_event_bus
+from utils import metrics
 from config import settings
 
 # Initialize Firebase Admin SDK on startup
@@ -52,6 +55,7 @@ app.include_router(agent.router, prefix="/api/v1")
 app.include_router(chat_group.router, prefix="/api/v1")
 # app.include_router(chat.router, prefix="/api/v1") # WebSocket routes disabled
 app.include_router(insight.router, prefix="/api/v1")
+app.include_router(simulation_batch.router, prefix="/api/v1")
 app.include_router(simulation.router, prefix="/api/v1")
 app.include_router(sse.router, prefix="/api/v1")
 
@@ -63,6 +67,13 @@ async def health_check():
     """
     return {"status": "ok", "project": settings.PROJECT_NAME, "version": settings.PROJECT_VERSION}
 
+@app.get("/api/v1/metrics", tags=["Health"])
+async def get_metrics():
+    """
+    In-process counters, gauges and timings (SSE drops/evictions, remote call latency, etc.).
+    """
+    return metrics.snapshot()
+
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}!"}
@@ -70,6 +81,13 @@ async def read_root():
 # Placeholder for where you might load/initialize other services or ML models if needed
 async def on_startup():
     print("Application startup tasks...")
+    # Connect to the event bus before any broadcast can happen
+    await get_event_bus().start()
+    # Initialize Vertex AI once per process (agent handles and ADK Gemini calls rely on it)
+    initialize_vertex_ai()
+    # Reaps Agent Engine sessions leaked by simulations that never finished
+    from services.remote_session_pool import get_remote_session_pool
+    get_remote_session_pool().start()
     # Ensure Firebase is initialized (already done globally, but good practice if this were separate)
     # initialize_firebase_admin()
     from firebase_admin import firestore
@@ -79,11 +97,36 @@ async def on_startup():
     print("Ensuring default agents in Firestore...")
     await AgentService.ensure_default_agents(db)
     print("Default agent check complete.")
+
+    from services.simulation_service import SimulationService, simulation_job_runner
+    simulation_job_runner.start()
+    await SimulationService().resume_interrupted_simulations()
+    # Batches whose comparison report was being written when the process stopped
+    from services.simulation_batch_service import SimulationBatchService
+    await SimulationBatchService().resume_stuck_batches()
+    # Agent deployments queued before a restart (users still in agent_status "pending")
+    from services.agent_provisioning_service import AgentProvisioningService, agent_provisioning_job_runner
+    agent_provisioning_job_runner.start()
+    await AgentProvisioningService().resume_pending_provisioning()
     # Example: Load ML models, connect to other external services
 
 async def on_shutdown():
     print("Application shutdown tasks...")
-    # Example: Clean up resources
+    from services.simulation_service import simulation_job_runner
+    # Let running simulations drain; the rest are marked resumable
+    await simulation_job_runner.shutdown()
+    from services.agent_provisioning_service import agent_provisioning_job_runner
+    # Unfinished agent deployments go back to "pending" and resume on the next startup
+    await agent_provisioning_job_runner.shutdown()
+    from services.remote_session_pool import get_remote_session_pool
+    await get_remote_session_pool().stop()
+    if sse.chat_service_instance:
+        await sse.chat_service_instance.shutdown()
+    if chat.chat_service_instance:
+        await chat.chat_service_instance.shutdown()
+    if sse.message_feed_instance:
+        sse.message_feed_instance.close()
+    await get_event_bus().stop()
 
 app.add_event_handler("startup", on_startup)
 app.add_event_handler("shutdown", on_shutdown)
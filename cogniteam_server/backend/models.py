@@ -27,6 +27,7 @@ class User(UserBase):
     prompt: Optional[str] = Field(None, description="Generated prompt for the user's agent")
     agent_engine_endpoint: Optional[str] = Field(None, description="Vertex AI Agent Engine endpoint URL")
     agent_engine_id: Optional[str] = Field(None, description="Vertex AI Agent Engine ID")
+    agent_status: Optional[str] = Field(None, description="Agent creation status: pending, deploying, ready or failed")
     # Add other fields as needed (e.g., profile picture URL, preferences, etc.)
 
     class Config:
@@ -37,6 +38,7 @@ class UserResponse(UserBase):
     email: EmailStr
     prompt: Optional[str] = None
     agent_engine_id: Optional[str] = None
+    agent_status: Optional[str] = None  # pending / deploying / ready / failed (None if agents are not created)
 
 class UserUpdate(BaseModel):
     name: Optional[str] = None
@@ -87,6 +89,9 @@ class Message(BaseModel):
     content: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class MessageCreate(BaseModel):
+    content: str
+
 class MissionCreate(BaseModel):
     mission_text: str
 
@@ -115,12 +120,20 @@ class Simulation(BaseModel):
     created_by: str  # user_id
     created_at: datetime = Field(default_factory=datetime.utcnow)
     participant_user_ids: List[str]
-    status: str = "pending"  # "pending", "running", "completed", "failed", "cancelled"
+    status: str = "pending"  # "pending", "running", "completed", "failed", "cancelled", "interrupted"
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     result_summary: Optional[str] = None
     error_message: Optional[str] = None
 
+class SimulationTurn(BaseModel):
+    turn: int
+    author: str
+    kind: str  # "message", "question", "answer"
+    text: str
+    participant: Optional[str] = None  # question の宛先ツール名
+    created_at: Optional[datetime] = None
+
 class SimulationResponse(BaseModel):
     simulation_id: str
     simulation_name: str
@@ -133,7 +146,40 @@ class SimulationResponse(BaseModel):
     completed_at: Optional[datetime] = None
     result_summary: Optional[str] = None
     error_message: Optional[str] = None
+    transcript: Optional[List[SimulationTurn]] = None  # include_transcript=true の場合のみ（実行中は途中経過）
+    has_result: Optional[bool] = None  # 一覧では result_summary を返さないため、結果の有無のみ示す
+    result_truncated: Optional[bool] = None  # Trueの場合 result_summary は先頭部分のみ（全文は外部に保存）
+    batch_id: Optional[str] = None  # バッチ実行の一部として作成された場合
+    telemetry: Optional[dict] = None  # 実行時の計測結果（フェーズごとの所要時間、リモート呼び出し回数、トークン数、ターンごとの記録）
 
 class SimulationListResponse(BaseModel):
     simulations: List[SimulationResponse]
     total_count: int
+    next_cursor: Optional[str] = None  # 次のページを取得する場合に cursor として渡す
+
+class SimulationBatchCreate(BaseModel):
+    batch_name: str
+    instructions: List[str]  # 比較する指示のバリエーション
+    participant_sets: List[List[str]]  # 比較するチーム構成（参加者のユーザーIDリスト）
+
+class SimulationBatchCell(BaseModel):
+    instruction_index: int
+    participant_set_index: int
+    simulation_id: str
+    status: str
+    has_result: Optional[bool] = None
+
+class SimulationBatchResponse(BaseModel):
+    batch_id: str
+    batch_name: str
+    created_by: str
+    created_at: datetime
+    instructions: List[str]
+    participant_sets: List[List[str]]
+    status: str  # "running", "reporting", "completed", "failed"
+    total_count: int
+    finished_count: int = 0
+    completed_at: Optional[datetime] = None
+    cells: List[SimulationBatchCell] = []
+    comparison_report: Optional[str] = None  # 全セル終了後に作成される比較レポート（Markdown）
+    error_message: Optional[str] = None
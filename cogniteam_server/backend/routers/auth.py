@@ -19,6 +19,7 @@ async def signup_new_user(user_data: UserCreate):
     Registers a new user.
     - Creates user in Firebase Authentication.
     - Creates user profile in Firestore with a generated initial prompt.
+    - Queues the creation of the user's agent (agent_status "pending"); progress is sent over SSE.
     - If user already exists, attempts to sign them in instead.
     """
     print(f"Starting signup process for email: {user_data.email}")
@@ -66,43 +67,11 @@ async def signup_new_user(user_data: UserCreate):
                         prompt = UserService.generate_prompt_from_user_data(user_profile_data)
                         print(f"Generated prompt: {prompt[:100]}...")  # Show first 100 chars
                         
-                        # Create Google AI Agent and register with Vertex AI Agent Engine (same as new user creation)
-                        agent_engine_endpoint = None
-                        if settings.VERTEX_AI_AGENT_ENGINE_ENABLED and not settings.VERTEX_AI_AGENT_ENGINE_SKIP_CREATION:
-                            try:
-                                import asyncio
-                                from services.agent_engine_service import AgentEngineService
-                                
-                                print(f"Starting Agent Engine creation for existing user {uid} with timeout...")
-                                
-                                # Set timeout for Agent Engine creation (10 minutes)
-                                agent_engine_service = AgentEngineService()
-                                agent_result = await asyncio.wait_for(
-                                    agent_engine_service.create_and_register_agent(
-                                        name=user_data.name,
-                                        description=str(user_data.model_dump()),
-                                        instruction=prompt
-                                    ),
-                                    timeout=600.0  # 10 minutes timeout
-                                )
-                                agent_engine_endpoint = agent_result["endpoint_url"]
-                                agent_engine_id = agent_result["agent_id"]
-                                print(f"Successfully created and registered agent for existing user {uid}. Endpoint: {agent_engine_endpoint}")
-                            except asyncio.TimeoutError:
-                                print(f"Agent Engine creation timed out for existing user {uid}. Continuing without agent.")
-                                agent_engine_endpoint = None
-                            except Exception as e:
-                                print(f"Warning: Failed to create/register agent for existing user {uid}: {e}")
-                                print(f"Error type: {type(e)}")
-                                import traceback
-                                print(f"Full traceback: {traceback.format_exc()}")
-                                # Continue with user profile creation even if agent creation fails
-                                # The user can still use the system, just without a personalized agent
-                                agent_engine_endpoint = None
-                        elif settings.VERTEX_AI_AGENT_ENGINE_SKIP_CREATION:
-                            print(f"Agent Engine creation is skipped (VERTEX_AI_AGENT_ENGINE_SKIP_CREATION=true). Skipping agent creation for existing user {uid}")
-                        else:
-                            print(f"Agent Engine is disabled. Skipping agent creation for existing user {uid}")
+                        # The agent is created in the background (same as new user creation)
+                        from services.agent_provisioning_service import AgentProvisioningService, initial_agent_status, AGENT_STATUS_PENDING
+                        agent_status = initial_agent_status()
+                        if agent_status != AGENT_STATUS_PENDING:
+                            print(f"Agent Engine creation is disabled or skipped. Skipping agent creation for existing user {uid}")
                         
                         # Create user profile in Firestore
                         print(f"Attempting to create user profile in Firestore for UID: {uid}")
@@ -111,13 +80,14 @@ async def signup_new_user(user_data: UserCreate):
                             user_email=user_data.email,
                             user_data_dict=user_profile_data,
                             prompt=prompt,
-                            agent_engine_endpoint=agent_engine_endpoint,  # Pass the endpoint URL
-                            agent_engine_id=agent_engine_id,  # Pass the agent ID
+                            agent_status=agent_status,  # "pending" if an agent will be created in the background, "ready" with shared agents
                             db_client=db
                         )
                         
                         if created_user_profile:
                             print(f"Successfully created missing user profile for {user_data.email}")
+                            if agent_status == AGENT_STATUS_PENDING:
+                                AgentProvisioningService().enqueue(uid)
                             if isinstance(created_user_profile, dict):
                                 return UserResponse(**created_user_profile)
                             return UserResponse(**created_user_profile.model_dump())
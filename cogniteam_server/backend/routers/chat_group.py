@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from firebase_admin import firestore
 
-from models import ChatGroup, ChatGroupCreate, Message, User, Mission, MissionCreate # Pydantic models
+from models import ChatGroup, ChatGroupCreate, Message, MessageCreate, User, Mission, MissionCreate # Pydantic models
 from services.chat_group_service import ChatGroupService
+from services.chat_service import ChatService
+from routers.sse import get_chat_service # Shared with the SSE stream so replies reach SSE clients
 from dependencies import get_current_user # For authentication
 from utils.firebase_setup import initialize_firebase_admin
 
@@ -90,6 +92,42 @@ async def get_messages_for_a_group(
     return messages
 
 
+@router.post("/{group_id}/messages", response_model=Message, status_code=status.HTTP_201_CREATED)
+async def send_message_to_group(
+    group_id: str,
+    message_data: MessageCreate,
+    current_user: User = Depends(get_current_user),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """
+    Sends a message to a chat group over plain HTTP (pairs with the SSE stream at /sse/chat/{group_id}).
+    Returns as soon as the message is stored and broadcast; agent replies are generated
+    in the background and delivered to subscribers over SSE.
+    """
+    initialize_firebase_admin()
+    db = firestore.client()
+
+    if not message_data.content.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message content must not be empty.")
+
+    group = await ChatGroupService.get_chat_group_by_id(group_id, db_client=db)
+    if not group:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Chat group with ID {group_id} not found.")
+    if current_user.user_id not in group.member_user_ids and current_user.user_id != group.created_by:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not authorized to send messages to this chat group.")
+
+    stored_message = await chat_service.send_user_message(
+        group_id=group_id,
+        user_id=current_user.user_id,
+        content=message_data.content,
+        user_name=current_user.name
+    )
+    if not stored_message:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to store message.")
+
+    return stored_message
+
+
 # Placeholder for listing groups a user is part of
 @router.get("/", response_model=List[ChatGroup])
 async def list_my_chat_groups(current_user: User = Depends(get_current_user)):
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import json
 from models import SimulationCreate, SimulationResponse, SimulationListResponse
 from services.simulation_service import SimulationService
 from dependencies import get_current_user, User
@@ -37,35 +39,43 @@ async def create_simulation(
 @router.get("/", response_model=SimulationListResponse)
 async def get_simulations(
     limit: int = Query(50, ge=1, le=100, description="Number of simulations to return"),
-    offset: int = Query(0, ge=0, description="Number of simulations to skip"),
+    offset: int = Query(0, ge=0, description="Number of simulations to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     current_user: User = Depends(get_current_user),
     simulation_service: SimulationService = Depends()
 ):
     """
-    ユーザーが作成したシミュレーション一覧を取得します。
+    ユーザーが作成したシミュレーション一覧を取得します（新しい順）。
+    一覧では result_summary は返さず、has_result で結果の有無を示します。
     """
     try:
         simulations = await simulation_service.get_simulations_by_user(
             current_user.user_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
         return simulations
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/{simulation_id}", response_model=SimulationResponse)
 async def get_simulation(
     simulation_id: str,
+    include_transcript: bool = Query(False, description="Include checkpointed turns (partial transcript while running)"),
+    full_result: bool = Query(True, description="Stream the full result when it is stored externally (false returns only the preview)"),
     current_user: User = Depends(get_current_user),
     simulation_service: SimulationService = Depends()
 ):
     """
     シミュレーションの詳細を取得します。
+    結果が外部に保存されている場合は、result_summary をチャンクごとに読み込みながらストリーミングで返します。
     """
     try:
-        simulation = await simulation_service.get_simulation(simulation_id)
+        simulation = await simulation_service.get_simulation(simulation_id, include_transcript=include_transcript)
         
         if not simulation:
             raise HTTPException(status_code=404, detail="Simulation not found")
@@ -73,6 +83,12 @@ async def get_simulation(
         # 作成者のみアクセス可能
         if simulation.created_by != current_user.user_id:
             raise HTTPException(status_code=403, detail="Access denied")
+
+        if simulation.result_truncated and full_result:
+            return StreamingResponse(
+                _stream_simulation_with_result(simulation, simulation_service),
+                media_type="application/json"
+            )
             
         return simulation
         
@@ -81,6 +97,24 @@ async def get_simulation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+async def _stream_simulation_with_result(simulation: SimulationResponse, simulation_service: SimulationService):
+    """
+    SimulationResponse と同じ形式のJSONを、result_summary の全文を少しずつ書き出しながら生成します。
+    """
+    body = simulation.model_dump(mode="json", exclude={"result_summary"})
+    body["result_truncated"] = False
+    # 閉じ括弧の前に result_summary を文字列として開く
+    yield json.dumps(body, ensure_ascii=False)[:-1] + ', "result_summary": "'
+    try:
+        async for piece in simulation_service.iter_simulation_result(simulation.simulation_id):
+            # JSON文字列としてエスケープし、前後の引用符を除いて書き出す
+            yield json.dumps(piece, ensure_ascii=False)[1:-1]
+    except Exception as e:
+        # ステータスコードは送信済みのため、ログに残して不完全なレスポンスとして終了する
+        print(f"Error streaming result of simulation {simulation.simulation_id}: {str(e)}")
+        raise
+    yield '"}'
+
 @router.delete("/{simulation_id}")
 async def delete_simulation(
     simulation_id: str,
@@ -108,19 +142,46 @@ async def delete_simulation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/{simulation_id}/cancel", response_model=SimulationResponse)
+async def cancel_simulation(
+    simulation_id: str,
+    current_user: User = Depends(get_current_user),
+    simulation_service: SimulationService = Depends()
+):
+    """
+    実行中または待機中のシミュレーションをキャンセルします。
+    記録済みの途中経過は保存され、ステータスは cancelled になります。
+    """
+    try:
+        simulation = await simulation_service.cancel_simulation(
+            simulation_id,
+            current_user.user_id
+        )
+        return simulation
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.post("/{simulation_id}/rerun", response_model=SimulationResponse)
 async def rerun_simulation(
     simulation_id: str,
+    resume: bool = Query(False, description="Continue from the last checkpointed turn instead of starting over"),
     current_user: User = Depends(get_current_user),
     simulation_service: SimulationService = Depends()
 ):
     """
     シミュレーションを再実行します。
+    resume=true の場合は最後のチェックポイントから続きを実行します。
     """
     try:
         simulation = await simulation_service.rerun_simulation(
             simulation_id, 
-            current_user.user_id
+            current_user.user_id,
+            resume=resume
         )
         return simulation
         
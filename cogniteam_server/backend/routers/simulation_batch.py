@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException
+from models import SimulationBatchCreate, SimulationBatchResponse
+from services.simulation_batch_service import SimulationBatchService
+from dependencies import get_current_user, User
+
+router = APIRouter(prefix="/simulations/batches", tags=["simulations"])
+
+@router.post("/", response_model=SimulationBatchResponse)
+async def create_simulation_batch(
+    batch_data: SimulationBatchCreate,
+    current_user: User = Depends(get_current_user),
+    batch_service: SimulationBatchService = Depends()
+):
+    """
+    指示 × 参加者セットの組み合わせをまとめて実行するバッチを作成します。
+    全セルの終了後、比較レポートが comparison_report に保存されます。
+    """
+    try:
+        return await batch_service.create_batch(batch_data, current_user.user_id)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/{batch_id}", response_model=SimulationBatchResponse)
+async def get_simulation_batch(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+    batch_service: SimulationBatchService = Depends()
+):
+    """
+    バッチの進捗（各セルのステータス）と比較レポートを取得します。
+    """
+    try:
+        batch = await batch_service.get_batch(batch_id)
+
+        if not batch:
+            raise HTTPException(status_code=404, detail="Simulation batch not found")
+
+        # 作成者のみアクセス可能
+        if batch.created_by != current_user.user_id:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        return batch
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
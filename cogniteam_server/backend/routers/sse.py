@@ -3,14 +3,19 @@ from fastapi.responses import StreamingResponse
 from firebase_admin import firestore, auth
 import asyncio
 import json
-from typing import Dict, Set
+from collections import OrderedDict
+from typing import Dict, Set, Optional
 from datetime import datetime
 
-from services.chat_service import ChatService, ConnectionManager
+from services.chat_service import ChatService
+from services.event_bus import get_event_bus, chat_channel, user_channel
+from services.message_feed import FirestoreMessageFeed
+from services.sse_queue import BoundedSSEQueue
 from services.auth_service import AuthService
 from services.chat_group_service import ChatGroupService
 from utils.firebase_setup import initialize_firebase_admin
 from models import Message
+from config import settings
 
 router = APIRouter(
     prefix="/sse",
@@ -28,19 +33,37 @@ def get_chat_service():
         chat_service_instance = ChatService(db_client=db_client)
     return chat_service_instance
 
+# Global Firestore message feed (only used when SSE_MESSAGE_FEED=firestore)
+message_feed_instance = None
+
+def get_message_feed() -> Optional[FirestoreMessageFeed]:
+    global message_feed_instance
+    if settings.SSE_MESSAGE_FEED != "firestore":
+        return None
+    if message_feed_instance is None:
+        initialize_firebase_admin()
+        db_client = firestore.client()
+        message_feed_instance = FirestoreMessageFeed(db_client=db_client, deliver=deliver_to_local_sse_group)
+    return message_feed_instance
+
 # Store active SSE connections
-active_sse_connections: Dict[str, Set[asyncio.Queue]] = {}
+active_sse_connections: Dict[str, Set[BoundedSSEQueue]] = {}
+
+# Recently delivered message IDs per group. In firestore feed mode a message can arrive both from
+# the snapshot listener and from the event bus; this keeps each client seeing it once.
+recent_sse_message_ids: Dict[str, "OrderedDict[str, bool]"] = {}
+RECENT_MESSAGE_ID_LIMIT = 500
 
 # Store active simulation SSE connections (user-based)
-active_simulation_sse_connections: Dict[str, Set[asyncio.Queue]] = {}
+active_simulation_sse_connections: Dict[str, Set[BoundedSSEQueue]] = {}
 
-async def sse_generator(group_id: str, user_id: str, queue: asyncio.Queue):
+async def sse_generator(group_id: str, user_id: str, queue: BoundedSSEQueue):
     """Generate SSE events from the queue"""
     try:
         while True:
             # Wait for messages from the queue with longer timeout
             message = await asyncio.wait_for(queue.get(), timeout=60.0)
-            if message is None:  # Shutdown signal
+            if message is None:  # Shutdown signal or slow-consumer eviction
                 break
             
             # Format as SSE event
@@ -57,15 +80,19 @@ async def sse_generator(group_id: str, user_id: str, queue: asyncio.Queue):
             print(f"SSE: Removed connection from group {group_id}. Remaining connections: {len(active_sse_connections[group_id])}")
             if not active_sse_connections[group_id]:
                 del active_sse_connections[group_id]
+                recent_sse_message_ids.pop(group_id, None)
                 print(f"SSE: No more connections for group {group_id}, removed from active connections")
+        message_feed = get_message_feed()
+        if message_feed:
+            message_feed.release(group_id)
 
-async def simulation_sse_generator(user_id: str, queue: asyncio.Queue):
+async def simulation_sse_generator(user_id: str, queue: BoundedSSEQueue):
     """Generate SSE events for simulation notifications"""
     try:
         while True:
             # Wait for messages from the queue with longer timeout
             message = await asyncio.wait_for(queue.get(), timeout=60.0)
-            if message is None:  # Shutdown signal
+            if message is None:  # Shutdown signal or slow-consumer eviction
                 break
             
             # Format as SSE event
@@ -85,7 +112,23 @@ async def simulation_sse_generator(user_id: str, queue: asyncio.Queue):
                 print(f"Simulation SSE: No more connections for user {user_id}, removed from active connections")
 
 async def broadcast_to_sse_group(group_id: str, message_data: dict):
-    """Broadcast message to all SSE connections in a group"""
+    """Publish message to a group via the event bus; every process delivers it to its own SSE connections"""
+    await get_event_bus().publish(chat_channel(group_id), message_data)
+
+async def broadcast_simulation_notification(user_id: str, notification_data: dict):
+    """Publish simulation notification for a specific user via the event bus"""
+    await get_event_bus().publish(user_channel(user_id), notification_data)
+
+async def deliver_to_local_sse_group(group_id: str, message_data: dict):
+    """Deliver message to the SSE connections of a group held by this process"""
+    message_id = message_data.get("message_id")
+    if message_id and settings.SSE_MESSAGE_FEED == "firestore":
+        seen = recent_sse_message_ids.setdefault(group_id, OrderedDict())
+        if message_id in seen:
+            return
+        seen[message_id] = True
+        if len(seen) > RECENT_MESSAGE_ID_LIMIT:
+            seen.popitem(last=False)
     print(f"SSE: Broadcasting to group {group_id}: {message_data}")
     if group_id in active_sse_connections:
         print(f"SSE: Found {len(active_sse_connections[group_id])} active SSE connections")
@@ -98,8 +141,8 @@ async def broadcast_to_sse_group(group_id: str, message_data: dict):
     else:
         print(f"SSE: No active SSE connections found for group {group_id}")
 
-async def broadcast_simulation_notification(user_id: str, notification_data: dict):
-    """Broadcast simulation notification to a specific user"""
+async def deliver_simulation_notification_locally(user_id: str, notification_data: dict):
+    """Deliver simulation notification to the SSE connections of a user held by this process"""
     print(f"Simulation SSE: Broadcasting to user {user_id}: {notification_data}")
     if user_id in active_simulation_sse_connections:
         print(f"Simulation SSE: Found {len(active_simulation_sse_connections[user_id])} active SSE connections")
@@ -164,13 +207,18 @@ async def sse_chat_endpoint(
             detail=f"Authentication error: {str(e)}"
         )
 
-    # Create queue for this connection
-    queue = asyncio.Queue()
+    # Create bounded queue for this connection
+    queue = BoundedSSEQueue(stream="chat")
     
     # Add to active connections
     if group_id not in active_sse_connections:
         active_sse_connections[group_id] = set()
     active_sse_connections[group_id].add(queue)
+
+    # In firestore feed mode, hold the group's snapshot listener while this connection is open
+    message_feed = get_message_feed()
+    if message_feed:
+        message_feed.acquire(group_id)
     
     print(f"User {user_id} ({user_email}) connected via SSE to group {group_id}")
     print(f"SSE: Total active connections for group {group_id}: {len(active_sse_connections[group_id])}")
@@ -230,8 +278,8 @@ async def sse_simulation_endpoint(
             detail=f"Authentication error: {str(e)}"
         )
 
-    # Create queue for this connection
-    queue = asyncio.Queue()
+    # Create bounded queue for this connection
+    queue = BoundedSSEQueue(stream="simulation")
     
     # Add to active simulation connections
     if user_id not in active_simulation_sse_connections:
@@ -288,25 +336,19 @@ async def sse_chat_options():
         }
     )
 
-# Modify ChatService to also broadcast to SSE connections
+# Deliver event bus traffic to the SSE connections held by this process
+# (EventBus._dispatch logs a handler's error and goes on with the other subscribers)
+async def _on_chat_event(channel: str, payload: dict):
+    await deliver_to_local_sse_group(channel.split(":", 1)[1], payload)
+
+async def _on_user_event(channel: str, payload: dict):
+    await deliver_simulation_notification_locally(channel.split(":", 1)[1], payload)
+
 def setup_sse_broadcasting():
-    """Setup SSE broadcasting in ChatService"""
-    # Store the original broadcast method from ConnectionManager
-    original_broadcast = ConnectionManager.broadcast_to_group
-    
-    async def broadcast_to_all(self, group_id: str, message_json: str):
-        # Original WebSocket broadcast
-        await original_broadcast(self, group_id, message_json)
-        
-        # SSE broadcast
-        try:
-            message_data = json.loads(message_json)
-            await broadcast_to_sse_group(group_id, message_data)
-        except Exception as e:
-            print(f"Error broadcasting to SSE: {e}")
-    
-    # Replace the ConnectionManager's broadcast method
-    ConnectionManager.broadcast_to_group = broadcast_to_all
+    """Subscribe local SSE delivery to chat and user channels of the event bus"""
+    event_bus = get_event_bus()
+    event_bus.subscribe("chat:", _on_chat_event)
+    event_bus.subscribe("user:", _on_user_event)
 
 # Initialize SSE broadcasting
-setup_sse_broadcasting() 
\ No newline at end of file
+setup_sse_broadcasting()
@@ -4,6 +4,7 @@ from typing import List
 
 from models import UserUpdate, UserResponse, User # Pydantic models
 from services.user_service import UserService
+from services.agent_provisioning_service import AgentProvisioningService
 from dependencies import get_current_user
 from utils.firebase_setup import initialize_firebase_admin # Ensure initialized
 
@@ -92,3 +93,19 @@ async def get_my_agent_prompt(current_user: User = Depends(get_current_user)):
         return {"user_id": current_user.user_id, "prompt": None, "message": "Prompt not available or not set."}
 
     return {"user_id": current_user.user_id, "prompt": prompt}
+
+
+@router.post("/me/agent", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def provision_my_agent(current_user: User = Depends(get_current_user)):
+    """
+    Queue the creation of the current user's agent again (e.g. after agent_status became "failed").
+    Progress is sent over the simulation SSE stream as "agent_status" events.
+    """
+    try:
+        agent_status = await AgentProvisioningService().request_provisioning(current_user.user_id)
+        return {"user_id": current_user.user_id, "agent_status": agent_status}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        print(f"Error queueing agent creation for {current_user.user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
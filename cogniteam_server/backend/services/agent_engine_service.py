@@ -158,7 +158,31 @@ class AgentEngineService:
             print(f"AgentEngineService: Using placeholder endpoint: {placeholder_endpoint}")
             return placeholder_endpoint
     
-    async def create_and_register_agent(self, name: str, description: str, instruction: str) -> dict:
+    def find_agent_by_display_name(self, display_name: str) -> dict | None:
+        """
+        Look up an already deployed agent by its display name (blocking)
+        
+        Args:
+            display_name: Agent Engine display name
+            
+        Returns:
+            dict | None: Contains agent_id and endpoint_url (same shape as create_and_register_agent), or None if not found
+        """
+        for remote_app in agent_engines.list(filter=f'display_name="{display_name}"'):
+            endpoint_url = f"https://projects/{self.project_id}/locations/{self.location}/reasoningEngines/{remote_app.resource_name}"
+            print(f"AgentEngineService: Found existing agent {remote_app.name} with display name {display_name}")
+            return {
+                "agent_id": remote_app.name,
+                "endpoint_url": endpoint_url,
+                "deployment_result": {
+                    "status": "success",
+                    "agent_name": remote_app.name,
+                    "resource_name": remote_app.resource_name
+                }
+            }
+        return None
+    
+    async def create_and_register_agent(self, name: str, description: str, instruction: str, display_name: str | None = None) -> dict:
         """
         Create a Google AI Agent and register it with Vertex AI Agent Engine
         
@@ -166,6 +190,7 @@ class AgentEngineService:
             name: Agent name
             description: Agent description
             instruction: Agent instruction/prompt
+            display_name: Agent Engine display name (defaults to name)
             
         Returns:
             dict: Contains agent_id and endpoint_url
@@ -182,7 +207,7 @@ class AgentEngineService:
             
             # Step 2: Register with Vertex AI Agent Engine
             print(f"AgentEngineService: Step 2 - Registering with Vertex AI Agent Engine...")
-            deployment_result = await self.register_agent_with_vertex_ai_engine(agent, name, description)
+            deployment_result = await self.register_agent_with_vertex_ai_engine(agent, display_name or name, description)
             print(f"AgentEngineService: Step 2 completed - Deployment result: {deployment_result}")
             
             # Extract endpoint URL from deployment result
@@ -214,4 +239,30 @@ class AgentEngineService:
             print(f"AgentEngineService: Error type: {type(e)}")
             import traceback
             print(f"AgentEngineService: Full traceback: {traceback.format_exc()}")
-            raise Exception(f"Failed to create and register agent: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Failed to create and register agent: {str(e)}") 
+    async def create_shared_participant_agent(self, index: int = 1) -> dict:
+        """
+        Create and register a generic participant agent for PARTICIPANT_AGENT_MODE=shared.
+        The agent answers as the persona passed in each session's state, so one deployment serves many users.
+        
+        Args:
+            index: Number used to tell the agents of the pool apart
+            
+        Returns:
+            dict: Contains agent_id and endpoint_url (add agent_id to SHARED_PARTICIPANT_AGENT_IDS)
+        """
+        from services.shared_participant_agent import SHARED_PARTICIPANT_INSTRUCTION
+        return await self.create_and_register_agent(
+            name=f"shared_participant_{index}",
+            description="Team member agent that answers as the persona given in the session state",
+            instruction=SHARED_PARTICIPANT_INSTRUCTION
+        )
+
+
+if __name__ == "__main__":
+    # python -m services.agent_engine_service [count]: deploy shared participant agents
+    import sys
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    service = AgentEngineService()
+    agent_ids = [asyncio.run(service.create_shared_participant_agent(i + 1))["agent_id"] for i in range(count)]
+    print(f"SHARED_PARTICIPANT_AGENT_IDS={','.join(agent_ids)}")
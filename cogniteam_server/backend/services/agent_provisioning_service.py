@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from firebase_admin import firestore
+
+from config import settings
+from services.agent_engine_service import AgentEngineService
+from services.job_runner import JobRunner
+from services.shared_participant_agent import shared_participant_mode
+from utils import metrics
+from utils.firebase_setup import initialize_firebase_admin
+
+# Firebase Admin SDKを初期化
+initialize_firebase_admin()
+
+logger = logging.getLogger(__name__)
+
+# users/{id}.agent_status
+AGENT_STATUS_PENDING = 'pending'
+AGENT_STATUS_DEPLOYING = 'deploying'
+AGENT_STATUS_READY = 'ready'
+AGENT_STATUS_FAILED = 'failed'
+
+# エージェントの説明に含めるプロフィールの項目
+PROFILE_FIELDS = ('name', 'sex', 'birth_date', 'mbti', 'company', 'division', 'department', 'section', 'role')
+
+# エージェント作成のジョブランナー（デプロイは数分かかるため、サインアップとは別に実行する）
+agent_provisioning_job_runner = JobRunner(
+    name="agent-provisioning",
+    max_workers=settings.AGENT_PROVISIONING_MAX_CONCURRENCY,
+    max_per_user=1,
+    shutdown_grace_seconds=settings.AGENT_PROVISIONING_SHUTDOWN_GRACE_SECONDS,
+)
+
+
+def agent_display_name(user_id: str) -> str:
+    """ユーザーのエージェントの表示名（Agent Engine上で既存のエージェントを探すため、ユーザーごとに固定）。"""
+    return f"cogniteam-user-{user_id}"
+
+
+def agent_provisioning_enabled() -> bool:
+    """ユーザーごとにAgent Engineのエージェントを作成する設定かどうか（共有エージェントを使う場合は作成しない）。"""
+    return (settings.VERTEX_AI_AGENT_ENGINE_ENABLED and not settings.VERTEX_AI_AGENT_ENGINE_SKIP_CREATION
+            and not shared_participant_mode())
+
+
+def initial_agent_status() -> Optional[str]:
+    """
+    新規ユーザーの agent_status。共有エージェントを使う場合はペルソナがあればすぐに参加できるため ready、
+    エージェントを作成する場合は pending（作成をキューに入れる）、どちらでもない場合は None。
+    """
+    if shared_participant_mode():
+        return AGENT_STATUS_READY
+    if agent_provisioning_enabled():
+        return AGENT_STATUS_PENDING
+    return None
+
+
+class AgentProvisioningService:
+    """
+    ユーザーのエージェント（Vertex AI Agent Engine）をバックグラウンドで作成します。
+    キューの実体は users/{id}.agent_status（pending → deploying → ready / failed）で、
+    pending のユーザーはプロセスの再起動後も resume_pending_provisioning() で再投入されます。
+    状態が変わるたびに agent_status イベントをSSEでユーザーに送信します。
+    """
+
+    def __init__(self):
+        self.db = firestore.client()
+        self.users_collection = self.db.collection('users')
+
+    def enqueue(self, user_id: str):
+        """
+        エージェント作成をジョブランナーに投入します（agent_status が pending のユーザーのみ実行されます）。
+
+        Args:
+            user_id: ユーザーID
+        """
+        try:
+            agent_provisioning_job_runner.submit(
+                job_id=user_id,
+                user_id=user_id,
+                factory=lambda: self._provision(user_id),
+                on_interrupted=lambda: self._mark_pending(user_id),
+            )
+        except ValueError:
+            logger.info(f"Agent provisioning for user {user_id} is already queued")
+
+    async def request_provisioning(self, user_id: str) -> str:
+        """
+        エージェントがない（作成に失敗した）ユーザーのエージェント作成を再度キューに入れます。
+
+        Args:
+            user_id: ユーザーID
+
+        Returns:
+            キューに入れた後の agent_status
+        """
+        if not agent_provisioning_enabled():
+            raise ValueError("Agent creation is disabled")
+        doc_ref = self.users_collection.document(user_id)
+
+        @firestore.transactional
+        def request(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                raise ValueError("User not found")
+            data = snapshot.to_dict()
+            if data.get('agent_engine_id'):
+                raise ValueError("The user already has an agent")
+            if data.get('agent_status') in (AGENT_STATUS_PENDING, AGENT_STATUS_DEPLOYING):
+                return data['agent_status']
+            transaction.update(doc_ref, {
+                'agent_status': AGENT_STATUS_PENDING,
+                'agent_status_updated_at': datetime.now(timezone.utc),
+                'agent_error': None
+            })
+            return AGENT_STATUS_PENDING
+
+        agent_status = request(self.db.transaction())
+        if agent_status == AGENT_STATUS_PENDING:
+            self.enqueue(user_id)
+        return agent_status
+
+    async def resume_pending_provisioning(self) -> int:
+        """
+        pending のユーザーと、作成中のままタイムアウトを過ぎた（作成中にプロセスが停止した）ユーザーを
+        再投入します（起動時に呼び出し）。停止前に開始したデプロイが完了していれば、そのエージェントを使います。
+
+        Returns:
+            再投入したユーザー数
+        """
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.AGENT_PROVISIONING_TIMEOUT_SECONDS)
+        query = self.users_collection.where(
+            filter=firestore.FieldFilter('agent_status', 'in', [AGENT_STATUS_PENDING, AGENT_STATUS_DEPLOYING])
+        )
+        resumed = 0
+        for doc in query.stream():
+            data = doc.to_dict()
+            if data['agent_status'] == AGENT_STATUS_DEPLOYING:
+                updated_at = data.get('agent_status_updated_at')
+                if updated_at and updated_at > stale_before:
+                    continue
+                await self._mark_pending(doc.id)
+            self.enqueue(doc.id)
+            resumed += 1
+        if resumed:
+            logger.info(f"Resumed agent provisioning for {resumed} users")
+        return resumed
+
+    async def _provision(self, user_id: str):
+        data = await asyncio.to_thread(self._claim, user_id)
+        if data is None:
+            return
+        await self._notify(user_id, AGENT_STATUS_DEPLOYING, 'エージェントを作成しています')
+
+        started_at = time.monotonic()
+        display_name = agent_display_name(user_id)
+        try:
+            agent_engine_service = AgentEngineService()
+            # 中断前に開始したデプロイはサーバー側で続いているため、同じ表示名のエージェントがあればそれを使う
+            result = await asyncio.to_thread(agent_engine_service.find_agent_by_display_name, display_name)
+            if result:
+                logger.info(f"Adopting existing agent {result['agent_id']} for user {user_id}")
+            else:
+                result = await asyncio.wait_for(
+                    agent_engine_service.create_and_register_agent(
+                        name=data['name'],
+                        description=str({field: data.get(field) for field in PROFILE_FIELDS}),
+                        instruction=data.get('prompt') or '',
+                        display_name=display_name
+                    ),
+                    timeout=settings.AGENT_PROVISIONING_TIMEOUT_SECONDS
+                )
+            # create_and_register_agent はデプロイに失敗してもプレースホルダーのIDを返すため、デプロイ結果を確認する
+            deployment_result = result.get('deployment_result')
+            if not isinstance(deployment_result, dict) or deployment_result.get('status') != 'success':
+                raise Exception('Agent deployment to Vertex AI Agent Engine failed')
+        except Exception as e:
+            error_message = 'Agent creation timed out' if isinstance(e, asyncio.TimeoutError) else str(e)
+            logger.error(f"Agent provisioning failed for user {user_id}: {error_message}")
+            metrics.increment("agent_provisioning_total", status=AGENT_STATUS_FAILED)
+            await asyncio.to_thread(self.users_collection.document(user_id).update, {
+                'agent_status': AGENT_STATUS_FAILED,
+                'agent_status_updated_at': datetime.now(timezone.utc),
+                'agent_error': error_message
+            })
+            await self._notify(user_id, AGENT_STATUS_FAILED, 'エージェントの作成に失敗しました', error=error_message)
+            return
+
+        await asyncio.to_thread(self.users_collection.document(user_id).update, {
+            'agent_engine_id': result['agent_id'],
+            'agent_engine_endpoint': result['endpoint_url'],
+            'agent_status': AGENT_STATUS_READY,
+            'agent_status_updated_at': datetime.now(timezone.utc),
+            'agent_error': None
+        })
+        metrics.increment("agent_provisioning_total", status=AGENT_STATUS_READY)
+        metrics.observe("agent_provisioning_seconds", time.monotonic() - started_at)
+        logger.info(f"Agent provisioned for user {user_id}: {result['agent_id']}")
+        await self._notify(user_id, AGENT_STATUS_READY, 'エージェントの作成が完了しました')
+
+    def _claim(self, user_id: str) -> Optional[dict]:
+        """pending のユーザーを deploying にし、ユーザーデータを返します（他で処理中・処理済みの場合はNone）。"""
+        doc_ref = self.users_collection.document(user_id)
+
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.to_dict().get('agent_status') != AGENT_STATUS_PENDING:
+                return None
+            transaction.update(doc_ref, {
+                'agent_status': AGENT_STATUS_DEPLOYING,
+                'agent_status_updated_at': datetime.now(timezone.utc)
+            })
+            return snapshot.to_dict()
+
+        return claim(self.db.transaction())
+
+    async def _mark_pending(self, user_id: str):
+        """シャットダウンで中断された作成を pending に戻します（次回起動時に再開）。"""
+        try:
+            await asyncio.to_thread(self.users_collection.document(user_id).update, {
+                'agent_status': AGENT_STATUS_PENDING,
+                'agent_status_updated_at': datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            logger.error(f"Failed to mark agent provisioning of user {user_id} as pending: {str(e)}")
+
+    async def _notify(self, user_id: str, agent_status: str, message: str, error: Optional[str] = None):
+        notification_data = {
+            'type': 'agent_status',
+            'user_id': user_id,
+            'agent_status': agent_status,
+            'message': message,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if error:
+            notification_data['error'] = error
+        # routers.sse は AuthService を使うため、循環インポートを避けてここでインポート
+        from routers.sse import broadcast_simulation_notification
+        try:
+            await broadcast_simulation_notification(user_id, notification_data)
+        except Exception as e:
+            logger.error(f"Failed to send agent status notification to user {user_id}: {str(e)}")
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional, Union
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+
+from config import settings
+from services.shared_participant_agent import PERSONA_STATE_KEY
+
+logger = logging.getLogger(__name__)
+
+# AGENT_RECORDING_MODE
+RECORDING_OFF = 'off'
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay mode when no recording matches the request."""
+
+
+class Cassette:
+    """
+    Append-only JSONL file of recorded interactions, keyed by a request hash.
+    Replaying the same key several times walks through its recordings in order and then
+    starts over, so a deterministic run that asked the same thing twice gets both answers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, List[dict]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry['key'], []).append(entry)
+            logger.info(f"Cassette: Loaded {sum(len(v) for v in self._entries.values())} recordings from {path}")
+
+    def append(self, entry: dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._entries.setdefault(entry['key'], []).append(entry)
+
+    def next(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return entries[cursor % len(entries)]
+
+
+def _hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+def _replay_delay(offset_seconds: float, first: bool) -> float:
+    """Recorded timing scaled by AGENT_REPLAY_LATENCY_SCALE, plus injected latency (and jitter) before the first event."""
+    delay = offset_seconds * settings.AGENT_REPLAY_LATENCY_SCALE
+    if first:
+        delay += settings.AGENT_REPLAY_EXTRA_LATENCY_SECONDS + random.uniform(0, settings.AGENT_REPLAY_LATENCY_JITTER_SECONDS)
+    return max(0.0, delay)
+
+
+def _session_persona(state: Optional[dict]) -> Optional[str]:
+    # Shared participant agents answer as the persona in the session state, so it is part of the key
+    return (state or {}).get(PERSONA_STATE_KEY)
+
+
+class RecordingRemoteAgent:
+    """Wraps an Agent Engine handle and records every completed stream_query to the cassette."""
+
+    def __init__(self, inner, agent_id: str, cassette: Cassette):
+        self._inner = inner
+        self.agent_id = agent_id
+        self.cassette = cassette
+        self._personas: Dict[str, Optional[str]] = {}
+
+    def create_session(self, **kwargs):
+        session = self._inner.create_session(**kwargs)
+        self._personas[session['id']] = _session_persona(kwargs.get('state'))
+        return session
+
+    def delete_session(self, **kwargs):
+        self._personas.pop(kwargs.get('session_id'), None)
+        return self._inner.delete_session(**kwargs)
+
+    def stream_query(self, user_id: str, session_id: str, message: str, **kwargs) -> Iterator[dict]:
+        started_at = time.monotonic()
+        last_at = started_at
+        events = []
+        for event in self._inner.stream_query(user_id=user_id, session_id=session_id, message=message, **kwargs):
+            now = time.monotonic()
+            # Delay since the previous event (the first one is the time to first event)
+            events.append({'delay': now - last_at, 'event': event})
+            last_at = now
+            yield event
+        self.cassette.append({
+            'key': remote_query_key(self.agent_id, message, self._personas.get(session_id)),
+            'agent_id': self.agent_id,
+            'message': message,
+            'duration': time.monotonic() - started_at,
+            'events': events,
+        })
+
+
+class ReplayRemoteAgent:
+    """Serves recorded stream_query events for an agent without contacting Vertex AI."""
+
+    def __init__(self, agent_id: str, cassette: Cassette):
+        self.agent_id = agent_id
+        self.cassette = cassette
+        self._personas: Dict[str, Optional[str]] = {}
+
+    def create_session(self, user_id: str, state: Optional[dict] = None, **kwargs) -> dict:
+        time.sleep(_replay_delay(0, first=True))
+        session_id = f"replay-{uuid.uuid4().hex}"
+        self._personas[session_id] = _session_persona(state)
+        return {'id': session_id, 'user_id': user_id}
+
+    def delete_session(self, **kwargs):
+        self._personas.pop(kwargs.get('session_id'), None)
+        return None
+
+    def stream_query(self, user_id: str, session_id: str, message: str, **kwargs) -> Iterator[dict]:
+        entry = self.cassette.next(remote_query_key(self.agent_id, message, self._personas.get(session_id)))
+        if entry is None:
+            raise ReplayMissError(f"No recording for agent {self.agent_id} and message {message[:80]!r}")
+        for index, recorded in enumerate(entry['events']):
+            time.sleep(_replay_delay(recorded['delay'], first=index == 0))
+            yield recorded['event']
+
+
+def remote_query_key(agent_id: str, message: str, persona: Optional[str] = None) -> str:
+    if persona is None:
+        return _hash([agent_id, message.strip()])
+    return _hash([agent_id, persona, message.strip()])
+
+
+def _strip_call_ids(value):
+    # ADK assigns random IDs to function calls/responses; they must not affect the key
+    if isinstance(value, dict):
+        return {k: _strip_call_ids(v) for k, v in value.items() if k != 'id'}
+    if isinstance(value, list):
+        return [_strip_call_ids(v) for v in value]
+    return value
+
+
+def llm_request_key(model: str, llm_request: LlmRequest) -> str:
+    contents = [_strip_call_ids(content.model_dump(mode='json', exclude_none=True)) for content in llm_request.contents]
+    system_instruction = llm_request.config.system_instruction if llm_request.config else None
+    if hasattr(system_instruction, 'model_dump'):
+        system_instruction = system_instruction.model_dump(mode='json', exclude_none=True)
+    return _hash([model, system_instruction, sorted(llm_request.tools_dict), contents])
+
+
+class RecordingLlm(BaseLlm):
+    """Delegates to the real model and records each request's responses to the cassette."""
+
+    inner: Any = None
+    cassette: Any = None
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        key = llm_request_key(self.model, llm_request)
+        last_at = time.monotonic()
+        responses = []
+        async for response in self.inner.generate_content_async(llm_request, stream):
+            now = time.monotonic()
+            responses.append({'delay': now - last_at, 'response': response.model_dump(mode='json', exclude_none=True)})
+            last_at = now
+            yield response
+        self.cassette.append({'key': key, 'model': self.model, 'responses': responses})
+
+
+class ReplayLlm(BaseLlm):
+    """Serves recorded model responses; requests must match a recording exactly (apart from call IDs)."""
+
+    cassette: Any = None
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        entry = self.cassette.next(llm_request_key(self.model, llm_request))
+        if entry is None:
+            raise ReplayMissError(f"No recording for a {self.model} request from agent contents of length {len(llm_request.contents)}")
+        for index, recorded in enumerate(entry['responses']):
+            await asyncio.sleep(_replay_delay(recorded['delay'], first=index == 0))
+            yield LlmResponse.model_validate(recorded['response'])
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(name: str) -> Cassette:
+    with _cassettes_lock:
+        cassette = _cassettes.get(name)
+        if cassette is None:
+            cassette = Cassette(os.path.join(settings.AGENT_RECORDING_DIR, f"{name}.jsonl"))
+            _cassettes[name] = cassette
+        return cassette
+
+
+def resolve_remote_agent(resource_id: str):
+    """
+    Returns the Agent Engine handle for `resource_id` (agent_engines.get), wrapped for recording,
+    or a replay stand-in that never touches the network, depending on AGENT_RECORDING_MODE. Blocking.
+    """
+    mode = settings.AGENT_RECORDING_MODE
+    if mode == REPLAY:
+        return ReplayRemoteAgent(resource_id, get_cassette('remote_agents'))
+    from vertexai import agent_engines
+    handle = agent_engines.get(resource_id)
+    if mode == RECORD:
+        return RecordingRemoteAgent(handle, resource_id, get_cassette('remote_agents'))
+    return handle
+
+
+def resolve_model(model: str) -> Union[str, BaseLlm]:
+    """Model for an LlmAgent: the model name as-is, or a recording/replaying wrapper around it."""
+    mode = settings.AGENT_RECORDING_MODE
+    if mode == REPLAY:
+        return ReplayLlm(model=model, cassette=get_cassette('models'))
+    if mode == RECORD:
+        return RecordingLlm(model=model, inner=LLMRegistry.new_llm(model), cassette=get_cassette('models'))
+    return model
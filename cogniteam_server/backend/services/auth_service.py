@@ -1,7 +1,7 @@
 from firebase_admin import auth, firestore
 from models import UserCreate, User # Pydantic models
 from services.user_service import UserService
-from services.agent_engine_service import AgentEngineService
+from services.agent_provisioning_service import AgentProvisioningService, initial_agent_status, AGENT_STATUS_PENDING
 from fastapi import HTTPException, status
 from utils.firebase_setup import initialize_firebase_admin # Ensure initialized
 from config import settings
@@ -19,7 +19,8 @@ class AuthService:
     async def register_new_user(user_data: UserCreate) -> User:
         """
         Registers a new user in Firebase Authentication and then saves their profile to Firestore.
-        Also creates a Google AI Agent and registers it with Vertex AI Agent Engine.
+        The user's Google AI Agent is created and registered with Vertex AI Agent Engine in the
+        background (see AgentProvisioningService); the returned profile has agent_status "pending".
         """
         print(f"AuthService: Starting register_new_user for email: {user_data.email}")
         initialize_firebase_admin() # Ensure it's initialized, though ideally done once at startup
@@ -57,51 +58,17 @@ class AuthService:
         # Generate prompt (this might be better placed in UserService or called by it)
         prompt = UserService.generate_prompt_from_user_data(user_profile_data)
 
-        # Create Google AI Agent and register with Vertex AI Agent Engine
-        agent_engine_endpoint = None
-        agent_engine_id = None
-        if settings.VERTEX_AI_AGENT_ENGINE_ENABLED and not settings.VERTEX_AI_AGENT_ENGINE_SKIP_CREATION:
-            print(f"AuthService: Agent Engine is enabled, attempting to create agent for user {uid}")
-            try:
-                import asyncio
-                agent_engine_service = AgentEngineService()
-                
-                print(f"AuthService: Starting Agent Engine creation with timeout...")
-                
-                # Set timeout for Agent Engine creation (10 minutes)
-                agent_result = await asyncio.wait_for(
-                    agent_engine_service.create_and_register_agent(
-                        name=user_data.name,
-                        description=str(user_data.model_dump()),
-                        instruction=prompt
-                    ),
-                    timeout=600.0  # 10 minutes timeout
-                )
-                print(f"AuthService: Agent Engine result: {agent_result['agent_id']}")
-                agent_engine_endpoint = agent_result["endpoint_url"]
-                agent_engine_id = agent_result["agent_id"]
-                print(f"AuthService: Successfully created and registered agent for user {uid}. Endpoint: {agent_engine_endpoint}, ID: {agent_engine_id}")
-            except asyncio.TimeoutError:
-                print(f"AuthService: Agent Engine creation timed out for user {uid}. Continuing without agent.")
-                agent_engine_endpoint = None
-                agent_engine_id = None
-            except Exception as e:
-                print(f"AuthService: Warning: Failed to create/register agent for user {uid}: {e}")
-                print(f"AuthService: Error type: {type(e)}")
-                import traceback
-                print(f"AuthService: Full traceback: {traceback.format_exc()}")
-                # Continue with user creation even if agent creation fails
-                # The user can still use the system, just without a personalized agent
-                agent_engine_endpoint = None
-                agent_engine_id = None
+        # The agent (Vertex AI Agent Engine) is deployed in the background once the profile exists,
+        # so signup does not wait for it. Progress is tracked in agent_status and pushed over SSE.
+        agent_status = initial_agent_status()
+        if agent_status == AGENT_STATUS_PENDING:
+            print(f"AuthService: Agent Engine is enabled, agent creation for user {uid} will be queued")
+        elif agent_status:
+            print(f"AuthService: Shared participant agents are used (PARTICIPANT_AGENT_MODE=shared). Skipping agent creation for user {uid}")
         elif settings.VERTEX_AI_AGENT_ENGINE_SKIP_CREATION:
             print(f"AuthService: Agent Engine creation is skipped (VERTEX_AI_AGENT_ENGINE_SKIP_CREATION=true). Skipping agent creation for user {uid}")
-            agent_engine_endpoint = None
-            agent_engine_id = None
         else:
             print(f"AuthService: Agent Engine is disabled (VERTEX_AI_AGENT_ENGINE_ENABLED=false). Skipping agent creation for user {uid}")
-            agent_engine_endpoint = None
-            agent_engine_id = None
 
         try:
             # Create user profile in Firestore using UserService
@@ -111,8 +78,7 @@ class AuthService:
                 user_email=user_data.email, # Pass email to be stored in Firestore user doc
                 user_data_dict=user_profile_data, # Pass the full Pydantic model data as dict
                 prompt=prompt,
-                agent_engine_endpoint=agent_engine_endpoint, # Pass the endpoint URL
-                agent_engine_id=agent_engine_id, # Pass the agent engine ID
+                agent_status=agent_status, # "pending" if an agent will be created in the background, "ready" with shared agents
                 db_client=db # Pass the Firestore client
             )
             if not created_user_profile:
@@ -126,6 +92,8 @@ class AuthService:
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="Failed to store user profile after Firebase Auth creation. User creation rolled back."
                 )
+            if agent_status == AGENT_STATUS_PENDING:
+                AgentProvisioningService().enqueue(uid)
             # Assuming created_user_profile is already a Pydantic User model instance or a dict that User can parse
             if isinstance(created_user_profile, dict):
                 return User(**created_user_profile)
@@ -7,13 +7,17 @@ from services.chat_group_service import ChatGroupService
 from services.agent_service import AgentService
 from services.user_service import UserService # To get user names
 from models import Message as MessageModel, Agent as AgentModel, Mission as MissionModel # Pydantic models
+from services.event_bus import get_event_bus, chat_channel
 from utils.firebase_setup import initialize_firebase_admin
+import asyncio
 import json # For serializing messages for WebSocket
 
 class ConnectionManager:
     def __init__(self):
         # active_connections: Dict[group_id, Set[WebSocket]]
         self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # Every process delivers bus events for the groups it holds sockets for
+        get_event_bus().subscribe("chat:", self._on_chat_event)
 
     async def connect(self, group_id: str, websocket: WebSocket):
         await websocket.accept()
@@ -31,8 +35,23 @@ class ConnectionManager:
         else:
             print(f"Attempted to disconnect WebSocket from non-tracked group {group_id}.")
 
+    def close(self):
+        """Stops receiving bus events (call on shutdown)."""
+        get_event_bus().unsubscribe("chat:", self._on_chat_event)
+
 
     async def broadcast_to_group(self, group_id: str, message_json: str):
+        """
+        Publishes a message to the group through the event bus.
+        Delivery to WebSocket (and SSE) clients happens in each process that holds connections.
+        """
+        await get_event_bus().publish(chat_channel(group_id), json.loads(message_json))
+
+    async def _on_chat_event(self, channel: str, payload: dict):
+        await self.deliver_to_group(channel.split(":", 1)[1], json.dumps(payload))
+
+    async def deliver_to_group(self, group_id: str, message_json: str):
+        """Sends a message to the WebSocket connections of a group held by this process."""
         if group_id in self.active_connections:
             # Create a list of tasks for sending messages concurrently
             # tasks = [conn.send_text(message_json) for conn in self.active_connections[group_id]]
@@ -62,6 +81,8 @@ class ChatService:
     def __init__(self, db_client):
         self.manager = ConnectionManager()
         self.db = db_client # Firestore client instance
+        # Agent reply jobs scheduled after a message is stored (kept referenced so they are not garbage-collected)
+        self._background_tasks: Set[asyncio.Task] = set()
 
         try:
             # Initialize Vertex AI (if not already done globally or per-session)
@@ -82,39 +103,73 @@ class ChatService:
     async def handle_websocket_message(self, group_id: str, user_id: str, data: str):
         """
         Handles an incoming message from a user via WebSocket.
+        Storage, broadcast and agent reply scheduling are shared with the HTTP send endpoint.
+        """
+        await self.send_user_message(group_id, user_id, data)
+
+    async def send_user_message(self, group_id: str, user_id: str, content: str, user_name: str | None = None) -> MessageModel | None:
+        """
+        Handles a message sent by a user (over HTTP or WebSocket).
         1. Stores the user's message in Firestore.
         2. Broadcasts the user's message to all connected clients in the group.
-        3. Triggers agent responses if applicable.
+        3. Schedules agent responses in the background.
+        Returns as soon as the message is stored, so send latency does not depend on LLM latency.
+        Returns None if the message could not be stored.
         """
         # 1. Store user's message
-        user_profile = await UserService.get_user_by_id(user_id, self.db)
-        user_name = user_profile.get('name', "Unknown User") if user_profile else "Unknown User"
+        if user_name is None:
+            user_profile = await UserService.get_user_by_id(user_id, self.db)
+            user_name = user_profile.get('name', "Unknown User") if user_profile else "Unknown User"
 
-        print(f"Message from user {user_id} ({user_name}) in group {group_id}: {data}")
+        print(f"Message from user {user_id} ({user_name}) in group {group_id}: {content}")
 
         stored_message = await ChatGroupService.add_message_to_group(
             group_id=group_id,
             sender_id=user_id,
             sender_name=user_name,
-            content=data,
+            content=content,
             db_client=self.db
         )
 
         if not stored_message:
             print(f"Error: Failed to store user message from {user_id} in group {group_id}.")
-            # Optionally send an error message back to the originating user?
-            return
+            return None
 
         # 2. Broadcast user's message (as Pydantic model serialized to JSON)
-        # Ensure the message model sent over WebSocket is consistent (e.g., always MessageModel)
-        await self.manager.broadcast_to_group(group_id, stored_message.model_dump_json())
+        # The message is already stored, so a bus failure must not fail the send (clients would retry and duplicate it)
+        try:
+            await self.manager.broadcast_to_group(group_id, stored_message.model_dump_json())
+        except Exception as e:
+            print(f"Error broadcasting message {stored_message.message_id} to group {group_id}: {e}")
 
-        # 3. Trigger agent responses (Simplified logic for now)
+        # 3. Hand agent responses to the background scheduler
         if self.vertex_ai_enabled:
-            await self.trigger_agent_responses_for_group(group_id, stored_message)
+            self.schedule_agent_responses(group_id, stored_message)
         else:
             print("Vertex AI is not enabled. Skipping agent responses.")
 
+        return stored_message
+
+    def schedule_agent_responses(self, group_id: str, last_human_message: MessageModel):
+        """Runs trigger_agent_responses_for_group in the background; replies are delivered via broadcast."""
+        task = asyncio.create_task(self._run_agent_responses(group_id, last_human_message))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _run_agent_responses(self, group_id: str, last_human_message: MessageModel):
+        try:
+            await self.trigger_agent_responses_for_group(group_id, last_human_message)
+        except Exception as e:
+            print(f"Error generating agent responses for group {group_id}: {e}")
+
+    async def shutdown(self):
+        """Unsubscribes from the event bus and cancels agent reply jobs that are still running."""
+        self.manager.close()
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
 
     async def trigger_agent_responses_for_group(self, group_id: str, last_human_message: MessageModel):
         """
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.tool_context import ToolContext
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+ToolHandler = Callable[[dict], Awaitable[Any]]
+
+
+class ConcurrentToolCalls:
+    """
+    Runs the function calls of one model response concurrently.
+    ADK executes the function calls of a model response one after another, so the director
+    asking three participants in one turn used to take three round trips. Registered as the
+    agent's after_model_callback, this starts every registered call as a task as soon as the
+    response arrives; when ADK then invokes each tool in turn, the tool awaits its
+    already-running task instead of starting the call itself.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, ToolHandler] = {}
+        self._pending: Dict[Tuple[str, str, str], Deque[asyncio.Task]] = {}
+
+    def register(self, tool_name: str, handler: ToolHandler):
+        self._handlers[tool_name] = handler
+
+    async def after_model_callback(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        if llm_response.partial or not llm_response.content or not llm_response.content.parts:
+            return None
+        calls = [
+            part.function_call for part in llm_response.content.parts
+            if part.function_call and part.function_call.name in self._handlers
+        ]
+        if len(calls) < 2:
+            return None
+        for call in calls:
+            args = dict(call.args or {})
+            key = self._key(callback_context.invocation_id, call.name, args)
+            task = asyncio.create_task(self._handlers[call.name](args))
+            self._pending.setdefault(key, deque()).append(task)
+        metrics.increment("concurrent_tool_calls_total", len(calls))
+        logger.info(f"Started {len(calls)} tool calls concurrently: {[call.name for call in calls]}")
+        return None
+
+    async def call(self, tool_context: ToolContext, tool_name: str, args: dict) -> Any:
+        """Returns the result of the prefetched call for these arguments, or runs the call now."""
+        key = self._key(tool_context.invocation_id, tool_name, args)
+        queue = self._pending.get(key)
+        if queue:
+            task = queue.popleft()
+            if not queue:
+                del self._pending[key]
+            return await task
+        return await self._handlers[tool_name](args)
+
+    async def cancel_pending(self) -> int:
+        """
+        Cancels the started calls that no tool picked up (an earlier tool raised, the run was
+        cancelled or it ended) and waits for them to finish. Returns the number cancelled.
+        """
+        tasks = [task for queue in self._pending.values() for task in queue]
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} concurrent tool calls that were never awaited")
+        return len(tasks)
+
+    @staticmethod
+    def _key(invocation_id: str, tool_name: str, args: dict) -> Tuple[str, str, str]:
+        return invocation_id, tool_name, json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
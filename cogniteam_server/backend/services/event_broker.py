@@ -0,0 +1,129 @@
+"""
+Stand-in pub/sub broker speaking the subset of the Redis protocol used by RedisEventBus
+(SUBSCRIBE, PSUBSCRIBE, UNSUBSCRIBE, PUNSUBSCRIBE, PUBLISH, PING).
+Useful for tests and for running several local workers without a Redis server:
+
+    python -m services.event_broker unix:///tmp/cogniteam-bus.sock
+    python -m services.event_broker redis://127.0.0.1:6379
+"""
+import asyncio
+import fnmatch
+import logging
+import sys
+from typing import Optional, Set
+from urllib.parse import urlparse
+
+from services.event_bus import encode_resp_command, read_resp_value
+
+logger = logging.getLogger(__name__)
+
+
+class _Client:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.channels: Set[str] = set()
+        self.patterns: Set[str] = set()
+
+
+class LocalEventBroker:
+    def __init__(self, url: str):
+        self.url = url
+        self._clients: Set[_Client] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            self._server = await asyncio.start_unix_server(self._handle_client, path=parsed.path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        logger.info(f"EventBroker: Listening on {self.url}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for client in list(self._clients):
+            client.writer.close()
+        self._clients.clear()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Client(writer)
+        self._clients.add(client)
+        try:
+            while True:
+                command = await read_resp_value(reader)
+                if not isinstance(command, list) or not command:
+                    continue
+                name = command[0].decode().upper()
+                args = [a.decode() for a in command[1:]]
+                await self._execute(client, name, args)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.warning(f"EventBroker: Client error: {e}")
+        finally:
+            self._clients.discard(client)
+            writer.close()
+
+    async def _execute(self, client: _Client, name: str, args):
+        writer = client.writer
+        if name in ("SUBSCRIBE", "PSUBSCRIBE"):
+            target = client.channels if name == "SUBSCRIBE" else client.patterns
+            for arg in args:
+                target.add(arg)
+                writer.write(self._subscription_reply(name.lower(), arg, len(client.channels) + len(client.patterns)))
+        elif name in ("UNSUBSCRIBE", "PUNSUBSCRIBE"):
+            target = client.channels if name == "UNSUBSCRIBE" else client.patterns
+            for arg in (args or list(target)):
+                target.discard(arg)
+                writer.write(self._subscription_reply(name.lower(), arg, len(client.channels) + len(client.patterns)))
+        elif name == "PUBLISH" and len(args) == 2:
+            receivers = await self._publish(args[0], args[1])
+            writer.write(f":{receivers}\r\n".encode())
+        elif name == "PING":
+            writer.write(b"+PONG\r\n")
+        else:
+            writer.write(f"-ERR unsupported command '{name}'\r\n".encode())
+        await writer.drain()
+
+    @staticmethod
+    def _subscription_reply(kind: str, target: str, count: int) -> bytes:
+        # Same shape as Redis: [kind, target, subscription count]
+        encoded = target.encode()
+        return (
+            b"*3\r\n"
+            + f"${len(kind)}\r\n{kind}\r\n".encode()
+            + f"${len(encoded)}\r\n".encode() + encoded + b"\r\n"
+            + f":{count}\r\n".encode()
+        )
+
+    async def _publish(self, channel: str, message: str) -> int:
+        receivers = 0
+        for client in list(self._clients):
+            try:
+                if channel in client.channels:
+                    client.writer.write(encode_resp_command("message", channel, message))
+                    receivers += 1
+                for pattern in client.patterns:
+                    if fnmatch.fnmatchcase(channel, pattern):
+                        client.writer.write(encode_resp_command("pmessage", pattern, channel, message))
+                        receivers += 1
+                await client.writer.drain()
+            except Exception as e:
+                logger.warning(f"EventBroker: Dropping client after write error: {e}")
+                self._clients.discard(client)
+                client.writer.close()
+        return receivers
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    broker_url = sys.argv[1] if len(sys.argv) > 1 else "redis://127.0.0.1:6379"
+    asyncio.run(LocalEventBroker(broker_url).serve_forever())
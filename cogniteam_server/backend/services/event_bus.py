@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Handlers receive the channel name (without namespace) and the decoded payload.
+EventHandler = Callable[[str, dict], Awaitable[None]]
+
+
+def chat_channel(group_id: str) -> str:
+    """Channel carrying every message broadcast to a chat group."""
+    return f"chat:{group_id}"
+
+
+def user_channel(user_id: str) -> str:
+    """Channel carrying notifications addressed to a single user (simulation events, etc.)."""
+    return f"user:{user_id}"
+
+
+class EventBus(ABC):
+    """
+    Pub/sub abstraction used for all SSE/WebSocket fan-out.
+    Publishers never touch connection state directly; every process that holds
+    connections subscribes to the channel prefixes it cares about and delivers
+    the events to its own local clients.
+    """
+
+    def __init__(self):
+        # handlers: Dict[channel_prefix, List[EventHandler]]
+        self._handlers: Dict[str, List[EventHandler]] = {}
+
+    def subscribe(self, prefix: str, handler: EventHandler):
+        """Registers a handler for every channel starting with `prefix`."""
+        self._handlers.setdefault(prefix, []).append(handler)
+
+    def unsubscribe(self, prefix: str, handler: EventHandler):
+        handlers = self._handlers.get(prefix)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self._handlers[prefix]
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: dict):
+        """Sends `payload` to every subscriber of `channel` (in every process, for cross-process backends)."""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def _dispatch(self, channel: str, payload: dict):
+        for prefix, handlers in list(self._handlers.items()):
+            if not channel.startswith(prefix):
+                continue
+            for handler in list(handlers):
+                try:
+                    await handler(channel, payload)
+                except Exception as e:
+                    logger.error(f"EventBus: Handler error on channel {channel}: {e}")
+
+
+class InProcessEventBus(EventBus):
+    """Delivers events to handlers of the current process only (single worker deployments)."""
+
+    async def publish(self, channel: str, payload: dict):
+        await self._dispatch(channel, payload)
+
+
+# --- Minimal RESP (Redis serialization protocol) codec, shared with services.event_broker ---
+
+def encode_resp_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_resp_value(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("RESP connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RuntimeError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_resp_value(reader) for _ in range(count)]
+    raise ValueError(f"Unexpected RESP type byte: {kind!r}")
+
+
+async def open_bus_connection(url: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Opens a connection for `redis://host:port` or `unix:///path/to.sock` URLs."""
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    if parsed.scheme in ("redis", "tcp"):
+        return await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+    raise ValueError(f"Unsupported event bus URL scheme: {parsed.scheme}")
+
+
+class RedisEventBus(EventBus):
+    """
+    Cross-process backend speaking the Redis pub/sub protocol.
+    Works against a real Redis server or against the stand-in broker in
+    services.event_broker (TCP or Unix socket), so every worker and instance
+    sees every event. Local delivery happens only when an event comes back
+    through the subscription, which keeps publishers and subscribers symmetric.
+    """
+
+    def __init__(self, url: str, namespace: str = "cogniteam", reconnect_delay: float = 1.0):
+        super().__init__()
+        self.url = url
+        self.namespace = namespace
+        self.reconnect_delay = reconnect_delay
+        self._publish_conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._publish_lock = asyncio.Lock()
+        self._reader_task: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def start(self):
+        if self._reader_task is None:
+            self._reader_task = asyncio.create_task(self._subscribe_loop())
+            try:
+                await asyncio.wait_for(self._subscribed.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                logger.warning(f"EventBus: Subscription to {self.url} not confirmed yet; will keep retrying in background")
+
+    async def stop(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._publish_conn:
+            self._publish_conn[1].close()
+            self._publish_conn = None
+
+    async def publish(self, channel: str, payload: dict):
+        data = json.dumps(payload, default=str)
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None:
+                        self._publish_conn = await open_bus_connection(self.url)
+                    reader, writer = self._publish_conn
+                    writer.write(encode_resp_command("PUBLISH", f"{self.namespace}:{channel}", data))
+                    await writer.drain()
+                    await read_resp_value(reader)
+                    return
+                except Exception as e:
+                    if self._publish_conn:
+                        self._publish_conn[1].close()
+                    self._publish_conn = None
+                    if attempt == 1:
+                        logger.error(f"EventBus: Failed to publish to {channel}: {e}")
+                        raise
+
+    async def _subscribe_loop(self):
+        prefix = f"{self.namespace}:"
+        while True:
+            writer = None
+            try:
+                reader, writer = await open_bus_connection(self.url)
+                writer.write(encode_resp_command("PSUBSCRIBE", f"{prefix}*"))
+                await writer.drain()
+                while True:
+                    value = await read_resp_value(reader)
+                    if not isinstance(value, list) or not value:
+                        continue
+                    kind = value[0].decode() if isinstance(value[0], bytes) else value[0]
+                    if kind == "psubscribe":
+                        self._subscribed.set()
+                        logger.info(f"EventBus: Subscribed to {prefix}* on {self.url}")
+                    elif kind == "pmessage" and len(value) == 4:
+                        channel = value[2].decode()[len(prefix):]
+                        try:
+                            payload = json.loads(value[3])
+                        except ValueError:
+                            logger.warning(f"EventBus: Dropping non-JSON event on {channel}")
+                            continue
+                        await self._dispatch(channel, payload)
+            except asyncio.CancelledError:
+                if writer:
+                    writer.close()
+                raise
+            except Exception as e:
+                self._subscribed.clear()
+                logger.warning(f"EventBus: Subscription to {self.url} lost ({e}); reconnecting in {self.reconnect_delay}s")
+                if writer:
+                    writer.close()
+                await asyncio.sleep(self.reconnect_delay)
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """Returns the process-wide event bus selected by EVENT_BUS_BACKEND."""
+    global _event_bus
+    if _event_bus is None:
+        if settings.EVENT_BUS_BACKEND == "redis":
+            _event_bus = RedisEventBus(settings.EVENT_BUS_URL, namespace=settings.EVENT_BUS_NAMESPACE)
+        else:
+            _event_bus = InProcessEventBus()
+        logger.info(f"EventBus: Using {type(_event_bus).__name__}")
+    return _event_bus
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[None]]
+InterruptedCallback = Callable[[], Awaitable[None]]
+
+
+class Job:
+    """A unit of background work owned by a JobRunner."""
+
+    def __init__(self, job_id: str, user_id: str, factory: JobFactory, priority: int,
+                 on_interrupted: Optional[InterruptedCallback] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.factory = factory
+        self.priority = priority
+        self.on_interrupted = on_interrupted
+        self.status = "queued"  # "queued", "running", "completed", "failed", "cancelled", "interrupted"
+        self.task: Optional[asyncio.Task] = None
+
+
+class JobRunner:
+    """
+    In-process background job runner.
+    - Bounded worker pool: at most `max_workers` jobs run at once.
+    - Priority queue: lower `priority` values run first, FIFO within a priority.
+    - Per-user limit: a user never has more than `max_per_user` running jobs; extra jobs wait
+      without blocking other users.
+    - Graceful drain: shutdown() stops accepting jobs, waits up to `shutdown_grace_seconds`
+      for running jobs, then cancels the rest and calls their `on_interrupted` callback
+      (also called for jobs that never started) so they can be marked resumable.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_per_user: int, shutdown_grace_seconds: float):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_per_user = max_per_user
+        self.shutdown_grace_seconds = shutdown_grace_seconds
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._deferred: Dict[str, Deque[Job]] = {}
+        self._running_per_user: Dict[str, int] = {}
+        self._workers: List[asyncio.Task] = []
+        self._accepting = True
+
+    def start(self):
+        if self._workers:
+            return
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+        logger.info(f"JobRunner[{self.name}]: Started {self.max_workers} workers (max {self.max_per_user} per user)")
+
+    def submit(self, job_id: str, user_id: str, factory: JobFactory, priority: int = 10,
+               on_interrupted: Optional[InterruptedCallback] = None) -> Job:
+        """
+        Queues a job. Raises RuntimeError while shutting down and ValueError if a job
+        with the same ID is already queued or running.
+        """
+        if not self._accepting:
+            raise RuntimeError(f"Job runner '{self.name}' is shutting down")
+        if job_id in self._jobs:
+            raise ValueError(f"Job {job_id} is already queued or running")
+        self.start()
+        job = Job(job_id, user_id, factory, priority, on_interrupted)
+        self._jobs[job_id] = job
+        self._queue.put_nowait((priority, next(self._sequence), job))
+        logger.info(f"JobRunner[{self.name}]: Queued job {job_id} for user {user_id} (priority {priority}, queued {self._queue.qsize()})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if the job is unknown."""
+        job = self._jobs.get(job_id)
+        if not job:
+            return False
+        if job.status == "running" and job.task:
+            job.task.cancel()
+        else:
+            job.status = "cancelled"
+            self._forget(job)
+        return True
+
+    def active_job_ids(self) -> List[str]:
+        """IDs of jobs that are queued or running."""
+        return [job_id for job_id, job in self._jobs.items() if job.status in ("queued", "running")]
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(1 for job in self._jobs.values() if job.status == "queued"),
+            "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "workers": len(self._workers),
+        }
+
+    async def shutdown(self):
+        self._accepting = False
+        running = [job for job in self._jobs.values() if job.status == "running" and job.task]
+        if running:
+            logger.info(f"JobRunner[{self.name}]: Draining {len(running)} running jobs (grace {self.shutdown_grace_seconds}s)")
+            await asyncio.wait([job.task for job in running], timeout=self.shutdown_grace_seconds)
+
+        interrupted = [job for job in self._jobs.values() if job.status in ("queued", "running")]
+        for job in interrupted:
+            if job.status == "running" and job.task and not job.task.done():
+                job.task.cancel()
+            job.status = "interrupted"
+        tasks = [job.task for job in interrupted if job.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for job in interrupted:
+            if job.on_interrupted:
+                try:
+                    await job.on_interrupted()
+                except Exception as e:
+                    logger.error(f"JobRunner[{self.name}]: on_interrupted failed for job {job.job_id}: {e}")
+        if interrupted:
+            logger.info(f"JobRunner[{self.name}]: Interrupted {len(interrupted)} jobs on shutdown")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._jobs.clear()
+        self._deferred.clear()
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            if self._running_per_user.get(job.user_id, 0) >= self.max_per_user:
+                # Park until one of this user's jobs finishes
+                self._deferred.setdefault(job.user_id, deque()).append(job)
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        self._running_per_user[job.user_id] = self._running_per_user.get(job.user_id, 0) + 1
+        job.task = asyncio.create_task(job.factory())
+        try:
+            # asyncio.wait does not propagate cancellation of this worker into the job itself
+            await asyncio.wait([job.task])
+            if job.status == "running":
+                if job.task.cancelled():
+                    job.status = "cancelled"
+                elif job.task.exception():
+                    job.status = "failed"
+                    logger.error(f"JobRunner[{self.name}]: Job {job.job_id} failed: {job.task.exception()}")
+                else:
+                    job.status = "completed"
+        finally:
+            self._running_per_user[job.user_id] -= 1
+            if not self._running_per_user[job.user_id]:
+                del self._running_per_user[job.user_id]
+            if job.status != "interrupted":
+                self._forget(job)
+            self._release_deferred(job.user_id)
+
+    def _forget(self, job: Job):
+        if self._jobs.get(job.job_id) is job:
+            del self._jobs[job.job_id]
+
+    def _release_deferred(self, user_id: str):
+        waiting = self._deferred.get(user_id)
+        while waiting:
+            job = waiting.popleft()
+            if job.status == "queued":
+                self._queue.put_nowait((job.priority, next(self._sequence), job))
+                break
+        if waiting is not None and not waiting:
+            del self._deferred[user_id]
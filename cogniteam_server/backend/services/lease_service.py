@@ -0,0 +1,128 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseService:
+    """
+    Firestore lease documents used by out-of-process workers to claim jobs.
+    A lease is owned by one worker until `expires_at`; the owner keeps it alive with
+    renew() (heartbeat). If a worker crashes, its lease expires and another worker can
+    take the job over with try_acquire().
+    """
+
+    def __init__(self, db_client, collection_name: str):
+        self.db = db_client
+        self.leases_collection = self.db.collection(collection_name)
+        # (resource_id, worker_id) -> time.monotonic() of the last successful acquire/renew
+        self._renewed_at: Dict[Tuple[str, str], float] = {}
+
+    def try_acquire(self, resource_id: str, worker_id: str, ttl_seconds: float, extra_updates=None) -> bool:
+        """
+        Takes the lease if it is free, expired or already owned by `worker_id`.
+        `extra_updates` is an optional list of (document_ref, updates, precondition) applied in the
+        same transaction; precondition(snapshot) must return True for the claim to go ahead.
+        `updates` is a dict, or a callable taking the snapshot and returning one.
+        """
+        lease_ref = self.leases_collection.document(resource_id)
+
+        @firestore.transactional
+        def acquire(transaction):
+            now = datetime.now(timezone.utc)
+            snapshots = [(ref, ref.get(transaction=transaction), updates, precondition)
+                         for ref, updates, precondition in (extra_updates or [])]
+            lease = lease_ref.get(transaction=transaction)
+            if lease.exists:
+                data = lease.to_dict()
+                if data.get('worker_id') != worker_id and data.get('expires_at') and data['expires_at'] > now:
+                    return False
+            for _, snapshot, _, precondition in snapshots:
+                if precondition and not precondition(snapshot):
+                    return False
+            transaction.set(lease_ref, {
+                'resource_id': resource_id,
+                'worker_id': worker_id,
+                'acquired_at': now,
+                'heartbeat_at': now,
+                'expires_at': now + timedelta(seconds=ttl_seconds),
+            })
+            for ref, snapshot, updates, _ in snapshots:
+                transaction.update(ref, updates(snapshot) if callable(updates) else updates)
+            return True
+
+        try:
+            acquired = acquire(self.db.transaction())
+            if acquired:
+                self._renewed_at[(resource_id, worker_id)] = time.monotonic()
+            return acquired
+        except Exception as e:
+            logger.warning(f"LeaseService: Could not acquire lease {resource_id} for {worker_id}: {e}")
+            return False
+
+    def renew(self, resource_id: str, worker_id: str, ttl_seconds: float) -> bool:
+        """
+        Extends the lease. Returns False if `worker_id` no longer owns it, or if heartbeats have
+        been failing for longer than the TTL (the lease may have expired and been taken over).
+        """
+        lease_ref = self.leases_collection.document(resource_id)
+
+        @firestore.transactional
+        def renew_lease(transaction):
+            lease = lease_ref.get(transaction=transaction)
+            if not lease.exists or lease.get('worker_id') != worker_id:
+                return False
+            now = datetime.now(timezone.utc)
+            transaction.update(lease_ref, {
+                'heartbeat_at': now,
+                'expires_at': now + timedelta(seconds=ttl_seconds),
+            })
+            return True
+
+        key = (resource_id, worker_id)
+        try:
+            renewed = renew_lease(self.db.transaction())
+        except Exception as e:
+            logger.warning(f"LeaseService: Heartbeat failed for lease {resource_id}: {e}")
+            # Transient error: keep the job running while the last renewal is still within the TTL
+            renewed_at = self._renewed_at.get(key)
+            return renewed_at is not None and time.monotonic() - renewed_at < ttl_seconds
+        if renewed:
+            self._renewed_at[key] = time.monotonic()
+        else:
+            self._renewed_at.pop(key, None)
+        return renewed
+
+    def release(self, resource_id: str, worker_id: str):
+        """Deletes the lease if `worker_id` still owns it."""
+        self._renewed_at.pop((resource_id, worker_id), None)
+        lease_ref = self.leases_collection.document(resource_id)
+
+        @firestore.transactional
+        def release_lease(transaction):
+            lease = lease_ref.get(transaction=transaction)
+            if lease.exists and lease.get('worker_id') == worker_id:
+                transaction.delete(lease_ref)
+
+        try:
+            release_lease(self.db.transaction())
+        except Exception as e:
+            logger.warning(f"LeaseService: Could not release lease {resource_id}: {e}")
+
+    def is_held(self, resource_id: str) -> bool:
+        """True if someone holds an unexpired lease on the resource."""
+        lease = self.leases_collection.document(resource_id).get()
+        if not lease.exists:
+            return False
+        expires_at = lease.to_dict().get('expires_at')
+        return bool(expires_at and expires_at > datetime.now(timezone.utc))
+
+    def list_expired(self, limit: int = 20) -> List[str]:
+        """Resource IDs whose lease has expired (their worker stopped heart-beating)."""
+        now = datetime.now(timezone.utc)
+        query = self.leases_collection.where(filter=firestore.FieldFilter('expires_at', '<', now)).limit(limit)
+        return [doc.id for doc in query.stream()]
@@ -1,9 +1,8 @@
-import copy, json, os, re, uuid
+import copy, json, os, re, time, uuid
 from google.genai.types import Part, Content
-from google.adk.artifacts import InMemoryArtifactService
-from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from .local_session_store import BoundedInMemorySessionService, get_local_session_service
+from .simulation_telemetry import current_telemetry
 
 DEBUG = False
 
@@ -11,33 +10,43 @@ class LocalApp:
     def __init__(self, agent, user_id='default_user'):
         self._agent = agent
         self._user_id = user_id
+        # Sessions live in the shared, bounded store (LOCAL_SESSION_STORE); the agents use no artifacts or memory
         self._runner = Runner(
             app_name=self._agent.name,
             agent=self._agent,
-            artifact_service=InMemoryArtifactService(),
-            session_service=InMemorySessionService(),
-            memory_service=InMemoryMemoryService(),
+            session_service=get_local_session_service(),
         )
         self._session = None
         
-    async def _stream(self, query):
+    async def _stream(self, query, on_event=None, routing=None):
+        """Yields response texts as they arrive; a wrong routing message is held back and recorded in `routing`."""
         if not self._session:
             self._session = await self._runner.session_service.create_session(
                 app_name=self._agent.name,
                 user_id=self._user_id,
                 session_id=uuid.uuid4().hex,
             )
+            # Keep the session out of the store's eviction until close()
+            if isinstance(self._runner.session_service, BoundedInMemorySessionService):
+                self._runner.session_service.retain(self._agent.name, self._user_id, self._session.id)
         content = Content(role='user', parts=[Part.from_text(text=query)])
         async_events = self._runner.run_async(
             user_id=self._user_id,
             session_id=self._session.id,
             new_message=content,
         )
-        result = []
         agent_name = None
+        telemetry = current_telemetry.get()
+        # Per author, so that agents running in parallel are timed separately
+        last_event_at = {}
+        started_at = time.monotonic()
         async for event in async_events:
             if DEBUG:
                 print(f'----\n{event}\n----')
+            if telemetry:
+                self._record_turn(telemetry, event, time.monotonic() - last_event_at.get(event.author, started_at))
+                last_event_at[event.author] = time.monotonic()
+            forward = True
             if (event.content and event.content.parts):
                 response = ''
                 for p in event.content.parts:
@@ -49,18 +58,70 @@ class LocalApp:
                     matched = re.search(pattern, response)
                     if (not agent_name) and matched:
                         agent_name = matched.group(1)
+                        if routing is not None:
+                            routing['agent_name'] = agent_name
+                        forward = False
                     else:
                         print(response)
-                        result.append(response)
+                        yield response
                     ####
-        return result, agent_name
+            # Forward each event as it arrives (e.g. live progress over SSE)
+            if on_event and forward:
+                await on_event(event)
 
-    async def stream(self, query):
-        result, agent_name = await self._stream(query)
+    @staticmethod
+    def _record_turn(telemetry, event, seconds):
+        """Model output events are timed from the author's previous event (its last tool result or the start)."""
+        parts = event.content.parts if event.content and event.content.parts else []
+        if not parts or any(p.function_response for p in parts):
+            return
+        usage = event.usage_metadata
+        telemetry.add_span('model', seconds)
+        telemetry.add_turn(
+            event.author, 'model', seconds,
+            input_tokens=(usage.prompt_token_count or 0) if usage else 0,
+            output_tokens=(usage.candidates_token_count or 0) if usage else 0,
+        )
+
+    async def get_state(self):
+        """
+        Returns the session state (e.g. values saved by agents with an output_key).
+        Raises ValueError if the session is no longer in the store, rather than passing off an empty state.
+        """
+        if not self._session:
+            return {}
+        session = await self._runner.session_service.get_session(
+            app_name=self._agent.name,
+            user_id=self._user_id,
+            session_id=self._session.id,
+        )
+        if session is None:
+            raise ValueError(f"Session {self._session.id} of {self._agent.name} is no longer in the session store")
+        return dict(session.state)
+
+    async def close(self):
+        """Deletes the session (and its event history) from the shared store. Call once the run is finished."""
+        if self._session:
+            await self._runner.session_service.delete_session(
+                app_name=self._agent.name,
+                user_id=self._user_id,
+                session_id=self._session.id,
+            )
+            self._session = None
+
+    async def iter_stream(self, query, on_event=None):
+        """Yields response texts as they arrive, including those of the routing workaround turn."""
+        routing = {}
+        async for response in self._stream(query, on_event, routing):
+            yield response
         #### Temporary fix for wrong agent routing message
+        agent_name = routing.get('agent_name')
         if agent_name:
             if DEBUG:
                 print(f'----\nForce transferring to {agent_name}\n----')
-            result, _ = await self._stream(f'Please transfer to {agent_name}')
+            async for response in self._stream(f'Please transfer to {agent_name}', on_event):
+                yield response
         ####
-        return result
\ No newline at end of file
+
+    async def stream(self, query, on_event=None):
+        return [response async for response in self.iter_stream(query, on_event)]
\ No newline at end of file
@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Set, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+
+from config import settings
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# LOCAL_SESSION_STORE
+MEMORY_STORE = 'memory'
+SQLITE_STORE = 'sqlite'
+
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    """
+    InMemorySessionService with an approximate memory cap (serialized size of the stored events).
+    When the cap is exceeded, least recently updated sessions are dropped, except those marked
+    open with retain() (a LocalApp run between its first stream and close()). ADK keeps running
+    a session that is no longer stored and silently records nothing, so an open run is never
+    evicted; the store may then stay above the cap until runs close. Sessions are normally deleted
+    by LocalApp.close() as soon as a run finishes, so eviction only reclaims sessions that were
+    never closed; size the cap for SIMULATION_MAX_CONCURRENCY runs.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # (app_name, user_id, session_id) -> bytes, least recently updated first
+        self._sizes: 'OrderedDict[Tuple[str, str, str], int]' = OrderedDict()
+        # Sessions with a run in progress (never evicted)
+        self._open: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    def retain(self, app_name: str, user_id: str, session_id: str):
+        """Marks a session as in use by a run, so the cap does not evict it."""
+        with self._lock:
+            self._open.add((app_name, user_id, session_id))
+
+    def release(self, app_name: str, user_id: str, session_id: str):
+        with self._lock:
+            self._open.discard((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        if event.partial or session.id not in self.sessions.get(session.app_name, {}).get(session.user_id, {}):
+            return event
+        size = len(event.model_dump_json(exclude_none=True))
+        with self._lock:
+            self._sizes[key] = self._sizes.get(key, 0) + size
+            self._sizes.move_to_end(key)
+            self.total_bytes += size
+            evicted = []
+            if self.total_bytes > self.max_bytes:
+                for candidate in [candidate for candidate in self._sizes if candidate not in self._open]:
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self.total_bytes -= self._sizes.pop(candidate)
+                    evicted.append(candidate)
+            metrics.set_gauge("local_session_store_bytes", self.total_bytes)
+        for app_name, user_id, session_id in evicted:
+            self._delete_session_impl(app_name=app_name, user_id=user_id, session_id=session_id)
+            metrics.increment("local_session_store_evictions_total")
+            logger.warning(f"LocalSessionStore: Evicted session {session_id} of {app_name} (store over {self.max_bytes} bytes)")
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        with self._lock:
+            self.total_bytes -= self._sizes.pop((app_name, user_id, session_id), 0)
+            self._open.discard((app_name, user_id, session_id))
+            metrics.set_gauge("local_session_store_bytes", self.total_bytes)
+
+
+def _create_session_service() -> BaseSessionService:
+    if settings.LOCAL_SESSION_STORE == SQLITE_STORE:
+        # Event histories live on disk; only the session being run is loaded into memory
+        from google.adk.sessions import DatabaseSessionService
+        directory = os.path.dirname(settings.LOCAL_SESSION_STORE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        logger.info(f"LocalSessionStore: Using SQLite session store at {settings.LOCAL_SESSION_STORE_PATH}")
+        return DatabaseSessionService(f"sqlite:///{settings.LOCAL_SESSION_STORE_PATH}")
+    return BoundedInMemorySessionService(settings.LOCAL_SESSION_STORE_MAX_BYTES)
+
+
+local_session_service_instance: Optional[BaseSessionService] = None
+_instance_lock = threading.Lock()
+
+
+def get_local_session_service() -> BaseSessionService:
+    """Process-wide session service shared by all LocalApp runners (LOCAL_SESSION_STORE)."""
+    global local_session_service_instance
+    with _instance_lock:
+        if local_session_service_instance is None:
+            local_session_service_instance = _create_session_service()
+    return local_session_service_instance
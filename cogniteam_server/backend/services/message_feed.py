@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from firebase_admin import firestore
+from models import Message
+
+logger = logging.getLogger(__name__)
+
+# Listener start is backdated by this much so writers with a slightly skewed clock are not missed.
+# Overlap with bus-delivered messages is removed by message_id de-duplication on the SSE side.
+LISTENER_START_SKEW = timedelta(seconds=5)
+
+
+def decode_message_document(doc) -> Optional[dict]:
+    """
+    Single decode path for message documents pushed to SSE subscribers.
+    Produces the same JSON shape as Message.model_dump_json() used by the broadcast path.
+    """
+    try:
+        return json.loads(Message(**doc.to_dict()).model_dump_json())
+    except Exception as e:
+        print(f"MessageFeed: Could not decode message document {getattr(doc, 'id', '?')}: {e}")
+        return None
+
+
+class _GroupListener:
+    def __init__(self, watch):
+        self.watch = watch
+        self.subscribers = 1
+
+
+class FirestoreMessageFeed:
+    """
+    Holds one Firestore on_snapshot listener per chat group that has local SSE subscribers.
+    Listeners are reference counted: opened with the first subscriber, closed with the last.
+    Every new message document, no matter which process or script wrote it, is decoded once
+    and handed to `deliver(group_id, message_data)` on the event loop.
+    """
+
+    def __init__(self, db_client, deliver: Callable[[str, dict], Awaitable[None]]):
+        self.db = db_client
+        self._deliver = deliver
+        self._listeners: Dict[str, _GroupListener] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def acquire(self, group_id: str):
+        """Registers a local subscriber for a group, opening the listener if needed."""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            listener = self._listeners.get(group_id)
+            if listener:
+                listener.subscribers += 1
+                return
+            since = datetime.now(timezone.utc) - LISTENER_START_SKEW
+            query = (
+                self.db.collection('chat_groups').document(group_id).collection('messages')
+                .where(filter=firestore.FieldFilter('timestamp', '>', since))
+                .order_by('timestamp')
+            )
+            watch = query.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(group_id, changes))
+            self._listeners[group_id] = _GroupListener(watch)
+            print(f"MessageFeed: Opened snapshot listener for group {group_id}")
+
+    def release(self, group_id: str):
+        """Drops a local subscriber, closing the listener when none are left."""
+        with self._lock:
+            listener = self._listeners.get(group_id)
+            if not listener:
+                return
+            listener.subscribers -= 1
+            if listener.subscribers > 0:
+                return
+            del self._listeners[group_id]
+        try:
+            listener.watch.unsubscribe()
+        except Exception as e:
+            print(f"MessageFeed: Error closing snapshot listener for group {group_id}: {e}")
+        print(f"MessageFeed: Closed snapshot listener for group {group_id}")
+
+    def close(self):
+        with self._lock:
+            group_ids = list(self._listeners.keys())
+        for group_id in group_ids:
+            with self._lock:
+                listener = self._listeners.pop(group_id, None)
+            if listener:
+                try:
+                    listener.watch.unsubscribe()
+                except Exception:
+                    pass
+
+    def _on_snapshot(self, group_id: str, changes):
+        # Runs on a Firestore watch thread; hand results over to the event loop.
+        if self._loop is None or self._loop.is_closed():
+            return
+        for change in changes:
+            if change.type.name != 'ADDED':
+                continue
+            message_data = decode_message_document(change.document)
+            if message_data is not None:
+                asyncio.run_coroutine_threadsafe(self._deliver(group_id, message_data), self._loop)
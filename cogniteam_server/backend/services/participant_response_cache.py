@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from config import settings
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def persona_version(prompt: Optional[str]) -> str:
+    """ペルソナ（ユーザーのプロンプト）の内容から決まるバージョン。プロンプトが変わるとキャッシュが効かなくなります。"""
+    return hashlib.sha256((prompt or '').encode('utf-8')).hexdigest()[:16]
+
+
+class SqliteResponseCacheBackend:
+    """ローカルのSQLiteファイルに保存します（単一インスタンス・ワーカー用）。"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS participant_response_cache ('
+                'key TEXT PRIMARY KEY, agent_id TEXT, response TEXT, created_at REAL, last_used_at REAL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS participant_response_cache_last_used '
+                'ON participant_response_cache (last_used_at)'
+            )
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created_at FROM participant_response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row:
+                with self._conn:
+                    self._conn.execute(
+                        'UPDATE participant_response_cache SET last_used_at = ? WHERE key = ?', (time.time(), key)
+                    )
+        return row
+
+    def put(self, key: str, agent_id: str, response: str, created_at: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO participant_response_cache VALUES (?, ?, ?, ?, ?)',
+                (key, agent_id, response, created_at, created_at)
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM participant_response_cache WHERE key = ?', (key,))
+
+    def evict(self, max_entries: int, expired_before: float) -> int:
+        """期限切れのエントリと、最近使われていない順に max_entries を超えた分を削除します。"""
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                'DELETE FROM participant_response_cache WHERE created_at < ?', (expired_before,)
+            ).rowcount
+            deleted += self._conn.execute(
+                'DELETE FROM participant_response_cache WHERE key NOT IN ('
+                'SELECT key FROM participant_response_cache ORDER BY last_used_at DESC LIMIT ?)',
+                (max_entries,)
+            ).rowcount
+        return deleted
+
+
+class FirestoreResponseCacheBackend:
+    """
+    participant_response_cache コレクションに保存します（複数インスタンスで共有）。
+    期限切れのドキュメントは expires_at にFirestoreのTTLポリシーを設定して削除してください。
+    """
+
+    name = 'firestore'
+
+    def __init__(self, db_client):
+        self.collection = db_client.collection('participant_response_cache')
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        snapshot = self.collection.document(key).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        return data['response'], data['created_at']
+
+    def put(self, key: str, agent_id: str, response: str, created_at: float):
+        self.collection.document(key).set({
+            'agent_id': agent_id,
+            'response': response,
+            'created_at': created_at,
+            'expires_at': datetime.utcfromtimestamp(created_at) + timedelta(seconds=settings.PARTICIPANT_RESPONSE_CACHE_TTL_SECONDS),
+        })
+
+    def delete(self, key: str):
+        self.collection.document(key).delete()
+
+    def evict(self, max_entries: int, expired_before: float) -> int:
+        # 件数の上限はメモリ上のLRUで管理し、永続側はTTLポリシーに任せる
+        return 0
+
+
+class ParticipantResponseCache:
+    """
+    参加者への質問と回答のキャッシュ（エージェントID・ペルソナのバージョン・質問文をキーにする）。
+    再実行やバッチ実行で同じ参加者に同じ質問をした場合、リモート呼び出しを省略します。
+    メモリ上のLRU（max_entries件）の後ろに永続化用のバックエンドを置き、ttl_seconds を過ぎた回答は使いません。
+    キャッシュから回答した質問はリモートセッションの履歴には追加されない点に注意してください。
+    """
+
+    # 永続側の期限切れ・上限超過の削除を行う間隔（put の回数）
+    EVICT_EVERY_PUTS = 100
+
+    def __init__(self, backend, ttl_seconds: float, max_entries: int):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    @staticmethod
+    def make_key(agent_id: str, persona_version: str, query: str) -> str:
+        payload = json.dumps([agent_id, persona_version, query.strip()], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, agent_id: str, persona_version: str, query: str) -> Optional[str]:
+        """キャッシュされた回答を返します（なければNone）。ブロッキング。"""
+        key = self.make_key(agent_id, persona_version, query)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+        if entry is None:
+            try:
+                entry = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"ParticipantResponseCache: Could not read from {self.backend.name}: {str(e)}")
+                entry = None
+            if entry:
+                self._remember(key, entry)
+
+        if entry and time.time() - entry[1] < self.ttl_seconds:
+            metrics.increment("participant_response_cache_hits_total")
+            return entry[0]
+        if entry:
+            self._forget(key)
+        metrics.increment("participant_response_cache_misses_total")
+        return None
+
+    def put(self, agent_id: str, persona_version: str, query: str, response: str):
+        """回答を保存します。ブロッキング。"""
+        key = self.make_key(agent_id, persona_version, query)
+        created_at = time.time()
+        self._remember(key, (response, created_at))
+        try:
+            self.backend.put(key, agent_id, response, created_at)
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY_PUTS == 0:
+                evicted = self.backend.evict(self.max_entries, created_at - self.ttl_seconds)
+                if evicted:
+                    logger.info(f"ParticipantResponseCache: Evicted {evicted} entries from {self.backend.name}")
+        except Exception as e:
+            logger.warning(f"ParticipantResponseCache: Could not write to {self.backend.name}: {str(e)}")
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"ParticipantResponseCache: Could not delete from {self.backend.name}: {str(e)}")
+
+
+participant_response_cache_instance: Optional[ParticipantResponseCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_participant_response_cache() -> Optional[ParticipantResponseCache]:
+    """キャッシュが有効な場合（PARTICIPANT_RESPONSE_CACHE_ENABLED=true）のみインスタンスを返します。"""
+    global participant_response_cache_instance
+    if not settings.PARTICIPANT_RESPONSE_CACHE_ENABLED:
+        return None
+    with _instance_lock:
+        if participant_response_cache_instance is None:
+            if settings.PARTICIPANT_RESPONSE_CACHE_BACKEND == 'firestore':
+                from firebase_admin import firestore
+                backend = FirestoreResponseCacheBackend(firestore.client())
+            else:
+                backend = SqliteResponseCacheBackend(settings.PARTICIPANT_RESPONSE_CACHE_PATH)
+            participant_response_cache_instance = ParticipantResponseCache(
+                backend,
+                ttl_seconds=settings.PARTICIPANT_RESPONSE_CACHE_TTL_SECONDS,
+                max_entries=settings.PARTICIPANT_RESPONSE_CACHE_MAX_ENTRIES,
+            )
+    return participant_response_cache_instance
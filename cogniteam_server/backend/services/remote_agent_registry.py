@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import settings
+from utils import metrics
+from utils.vertex_setup import initialize_vertex_ai
+from services.agent_recording import resolve_remote_agent
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteAgentRegistry:
+    """
+    Process-wide cache of Agent Engine handles (agent_engines.get results) keyed by resource ID.
+    Handles are refetched after `ttl_seconds`, or right away after invalidate() when a call
+    through the handle failed (e.g. the agent was redeployed). Concurrent lookups of the same
+    resource share a single fetch.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._handles: Dict[str, Tuple[object, float]] = {}
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, resource_id: str):
+        """Returns the cached handle, fetching it if missing or expired. Blocking; call from a worker thread."""
+        handle = self._cached(resource_id)
+        if handle is not None:
+            metrics.increment("remote_agent_registry_hits_total")
+            return handle
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(resource_id, threading.Lock())
+        with fetch_lock:
+            # Another thread may have fetched it while we waited
+            handle = self._cached(resource_id)
+            if handle is not None:
+                metrics.increment("remote_agent_registry_hits_total")
+                return handle
+            initialize_vertex_ai()
+            started_at = time.monotonic()
+            # agent_engines.get, or a recording/replay stand-in (AGENT_RECORDING_MODE)
+            handle = resolve_remote_agent(resource_id)
+            metrics.observe("remote_agent_registry_fetch_seconds", time.monotonic() - started_at)
+            metrics.increment("remote_agent_registry_misses_total")
+            with self._lock:
+                self._handles[resource_id] = (handle, time.monotonic())
+            logger.info(f"RemoteAgentRegistry: Resolved handle for agent {resource_id}")
+            return handle
+
+    def invalidate(self, resource_id: str):
+        """Drops the cached handle so the next get() resolves it again."""
+        with self._lock:
+            if self._handles.pop(resource_id, None) is not None:
+                logger.info(f"RemoteAgentRegistry: Invalidated handle for agent {resource_id}")
+
+    def _cached(self, resource_id: str):
+        with self._lock:
+            entry = self._handles.get(resource_id)
+            if entry and time.monotonic() - entry[1] < self.ttl_seconds:
+                return entry[0]
+            return None
+
+
+remote_agent_registry_instance: Optional[RemoteAgentRegistry] = None
+
+
+def get_remote_agent_registry() -> RemoteAgentRegistry:
+    global remote_agent_registry_instance
+    if remote_agent_registry_instance is None:
+        remote_agent_registry_instance = RemoteAgentRegistry(settings.REMOTE_AGENT_HANDLE_TTL_SECONDS)
+    return remote_agent_registry_instance
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from utils import metrics
+from utils.resilience import get_remote_agent_retry_policy
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSession:
+    """An open Agent Engine session reused for every turn of one participant in one simulation."""
+
+    def __init__(self, scope: str, agent_id: str, remote_agent, user_id: str, session_id: str):
+        self.scope = scope
+        self.agent_id = agent_id
+        self.remote_agent = remote_agent
+        self.user_id = user_id
+        self.session_id = session_id
+        self.last_used_at = time.monotonic()
+        # One query at a time per session: the remote agent appends each turn to the session history
+        self.lock = threading.Lock()
+
+
+# create() returns (remote_agent, user_id, session_id) for a freshly created remote session
+SessionFactory = Callable[[], Tuple[object, str, str]]
+
+
+class RemoteSessionPool:
+    """
+    Agent Engine sessions keyed by (scope, agent_id), where the scope is usually a simulation ID.
+    A participant keeps its session (and therefore its conversation context) across turns;
+    release_scope() deletes the sessions when the simulation finishes, and a background
+    sweeper deletes sessions idle longer than `idle_ttl_seconds` (e.g. leaked by a crash).
+    """
+
+    def __init__(self, idle_ttl_seconds: float, sweep_interval_seconds: float):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._sessions: Dict[Tuple[str, str], PooledSession] = {}
+        self._create_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    def get_or_create(self, scope: str, agent_id: str, create: SessionFactory) -> PooledSession:
+        """Returns the pooled session, creating it with `create` on first use. Blocking."""
+        key = (scope, agent_id)
+        with self._lock:
+            pooled = self._sessions.get(key)
+            if pooled:
+                pooled.last_used_at = time.monotonic()
+                return pooled
+            create_lock = self._create_locks.setdefault(key, threading.Lock())
+        with create_lock:
+            with self._lock:
+                pooled = self._sessions.get(key)
+                if pooled:
+                    pooled.last_used_at = time.monotonic()
+                    return pooled
+            remote_agent, user_id, session_id = create()
+            pooled = PooledSession(scope, agent_id, remote_agent, user_id, session_id)
+            with self._lock:
+                self._sessions[key] = pooled
+                open_sessions = len(self._sessions)
+            metrics.increment("remote_sessions_created_total")
+            metrics.set_gauge("remote_sessions_open", open_sessions)
+            logger.info(f"RemoteSessionPool: Opened session {session_id} for agent {agent_id} (scope {scope})")
+            return pooled
+
+    def discard(self, scope: str, agent_id: str):
+        """Drops and deletes a session that failed, so the next turn opens a new one."""
+        with self._lock:
+            pooled = self._sessions.pop((scope, agent_id), None)
+            self._create_locks.pop((scope, agent_id), None)
+        if pooled:
+            self._delete([pooled])
+
+    def release_scope(self, scope: str) -> int:
+        """Deletes every session opened for `scope`. Blocking."""
+        with self._lock:
+            keys = [key for key in self._sessions if key[0] == scope]
+            released = [self._sessions.pop(key) for key in keys]
+            # Also drop locks of sessions whose creation failed (they never entered the pool)
+            for key in [key for key in self._create_locks if key[0] == scope]:
+                self._create_locks.pop(key, None)
+        self._delete(released)
+        return len(released)
+
+    async def release_scope_async(self, scope: str) -> int:
+        return await asyncio.to_thread(self.release_scope, scope)
+
+    def sweep(self) -> int:
+        """Deletes sessions that have been idle longer than the TTL. Blocking."""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        with self._lock:
+            keys = [key for key, pooled in self._sessions.items()
+                    if pooled.last_used_at < cutoff and not pooled.lock.locked()]
+            idle = [self._sessions.pop(key) for key in keys]
+            for key in keys:
+                self._create_locks.pop(key, None)
+        if idle:
+            metrics.increment("remote_sessions_reaped_total", len(idle))
+            logger.warning(f"RemoteSessionPool: Reaping {len(idle)} idle sessions")
+        self._delete(idle)
+        return len(idle)
+
+    def start(self):
+        if self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper_task:
+            self._sweeper_task.cancel()
+            await asyncio.gather(self._sweeper_task, return_exceptions=True)
+            self._sweeper_task = None
+        with self._lock:
+            remaining = list(self._sessions.values())
+            self._sessions.clear()
+            self._create_locks.clear()
+        if remaining:
+            await asyncio.to_thread(self._delete, remaining)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"RemoteSessionPool: Sweep failed: {e}")
+
+    def _delete(self, sessions: List[PooledSession]):
+        for pooled in sessions:
+            try:
+                get_remote_agent_retry_policy().call(
+                    lambda: pooled.remote_agent.delete_session(user_id=pooled.user_id, session_id=pooled.session_id),
+                    operation="delete_session",
+                )
+            except Exception as e:
+                logger.warning(f"RemoteSessionPool: Could not delete session {pooled.session_id} for agent {pooled.agent_id}: {e}")
+        with self._lock:
+            open_sessions = len(self._sessions)
+        metrics.set_gauge("remote_sessions_open", open_sessions)
+
+
+remote_session_pool_instance: Optional[RemoteSessionPool] = None
+
+
+def get_remote_session_pool() -> RemoteSessionPool:
+    global remote_session_pool_instance
+    if remote_session_pool_instance is None:
+        remote_session_pool_instance = RemoteSessionPool(
+            idle_ttl_seconds=settings.REMOTE_SESSION_IDLE_TTL_SECONDS,
+            sweep_interval_seconds=settings.REMOTE_SESSION_SWEEP_INTERVAL_SECONDS,
+        )
+    return remote_session_pool_instance
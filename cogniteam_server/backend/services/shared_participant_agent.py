@@ -0,0 +1,46 @@
+import hashlib
+from typing import List
+
+from config import settings
+
+# PARTICIPANT_AGENT_MODE
+PER_USER_MODE = 'per_user'
+SHARED_MODE = 'shared'
+
+# 共有エージェントのセッション状態に入れるペルソナ（ユーザーの prompt）のキー
+PERSONA_STATE_KEY = 'persona'
+
+# 共有エージェントの指示。{persona} はADKがセッション状態から埋め込む（セッションごとに参加者のペルソナになる）
+SHARED_PARTICIPANT_INSTRUCTION = """あなたはチームのメンバーとして会話に参加するエージェントです。
+以下のペルソナになりきり、その人物の立場・性格・価値観に沿って一貫した回答をしてください。
+ペルソナ以外の人物として振る舞ったり、自分がAIであることに言及したりしてはいけません。
+
+## ペルソナ
+{persona}
+"""
+
+
+def shared_participant_mode() -> bool:
+    """参加者がユーザーごとのエージェントではなく、共有エージェントにペルソナを渡して回答する設定かどうか。"""
+    return settings.PARTICIPANT_AGENT_MODE == SHARED_MODE
+
+
+def shared_participant_agent_ids() -> List[str]:
+    return [agent_id.strip() for agent_id in settings.SHARED_PARTICIPANT_AGENT_IDS.split(',') if agent_id.strip()]
+
+
+def shared_participant_agent_id(user_id: str) -> str:
+    """
+    ユーザーに割り当てる共有エージェントを返します（同じユーザーは常に同じエージェントに割り当てられます）。
+
+    Args:
+        user_id: ユーザーID
+
+    Returns:
+        共有エージェントのリソースID
+    """
+    agent_ids = shared_participant_agent_ids()
+    if not agent_ids:
+        raise ValueError("SHARED_PARTICIPANT_AGENT_IDS must be set when PARTICIPANT_AGENT_MODE=shared")
+    index = int(hashlib.sha256(user_id.encode('utf-8')).hexdigest(), 16) % len(agent_ids)
+    return agent_ids[index]
@@ -0,0 +1,299 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
+from firebase_admin import firestore
+from models import (
+    SimulationCreate, SimulationBatchCreate, SimulationBatchResponse, SimulationBatchCell
+)
+from services.simulation_service import SimulationService, SIMULATION_PRIORITY_BATCH
+from services.simulation_result_store import load_result_text
+from routers.sse import broadcast_simulation_notification
+from utils.firebase_setup import initialize_firebase_admin
+from config import settings
+
+# Firebase Admin SDKを初期化
+initialize_firebase_admin()
+
+logger = logging.getLogger(__name__)
+
+# これらのステータスになったセルは終了とみなす（interrupted は再開されるため含めない）
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# reporting のまま、この秒数を過ぎたバッチは比較レポートの作成中にプロセスが停止したとみなす
+REPORTING_STALE_SECONDS = 300
+
+
+class SimulationBatchService:
+    def __init__(self):
+        self.db = firestore.client()
+        self.batches_collection = self.db.collection('simulation_batches')
+        self.simulations_collection = self.db.collection('simulations')
+
+    async def create_batch(self, batch_data: SimulationBatchCreate, created_by: str) -> SimulationBatchResponse:
+        """
+        指示 × 参加者セットの組み合わせごとにシミュレーションを作成し、1つのバッチとして実行します。
+        各セルは通常のシミュレーションと同じジョブランナー（同時実行数・ユーザーごとの上限）と
+        Agent Engineのレート制限を共有し、個別に作成されたシミュレーションより後に実行されます。
+
+        Args:
+            batch_data: バッチ作成データ
+            created_by: 作成者のユーザーID
+
+        Returns:
+            作成されたバッチのレスポンス
+        """
+        if not batch_data.instructions:
+            raise ValueError("At least one instruction is required")
+        if not batch_data.participant_sets or any(not participant_set for participant_set in batch_data.participant_sets):
+            raise ValueError("Each participant set needs at least one participant")
+        total_count = len(batch_data.instructions) * len(batch_data.participant_sets)
+        if total_count > settings.SIMULATION_BATCH_MAX_CELLS:
+            raise ValueError(f"A batch can contain at most {settings.SIMULATION_BATCH_MAX_CELLS} simulations (requested {total_count})")
+
+        try:
+            batch_id = str(uuid.uuid4())
+            created_at = datetime.utcnow()
+            batch_ref = self.batches_collection.document(batch_id)
+            # セルより先に作成しておく（早く終わったセルが進捗を更新できるように）
+            batch_ref.set({
+                'batch_name': batch_data.batch_name,
+                'created_by': created_by,
+                'created_at': created_at,
+                'instructions': batch_data.instructions,
+                # Firestoreは配列の入れ子を保存できないため、参加者セットはマップのリストとして保存
+                'participant_sets': [{'participant_user_ids': participant_set} for participant_set in batch_data.participant_sets],
+                'status': 'running',
+                'total_count': total_count,
+                'finished_count': 0,
+                'cells': [],
+                'completed_at': None,
+                'comparison_report': None
+            })
+
+            simulation_service = SimulationService()
+            cells = []
+            try:
+                for instruction_index, instruction in enumerate(batch_data.instructions):
+                    for participant_set_index, participant_set in enumerate(batch_data.participant_sets):
+                        simulation = await simulation_service.create_simulation(
+                            SimulationCreate(
+                                simulation_name=f"{batch_data.batch_name} [指示{instruction_index + 1} × チーム{participant_set_index + 1}]",
+                                instruction=instruction,
+                                participant_user_ids=participant_set
+                            ),
+                            created_by,
+                            batch_id=batch_id,
+                            priority=SIMULATION_PRIORITY_BATCH
+                        )
+                        cell = {
+                            'instruction_index': instruction_index,
+                            'participant_set_index': participant_set_index,
+                            'simulation_id': simulation.simulation_id
+                        }
+                        cells.append(cell)
+                        # 途中で失敗してもバッチから辿れるよう、作成したセルはすぐに記録する
+                        batch_ref.update({'cells': firestore.ArrayUnion([cell])})
+            except Exception as e:
+                # 一部だけ作成されたバッチは完了しないため、作成済みのセルを取り消す
+                batch_ref.update({'status': 'failed', 'cells': cells, 'error_message': str(e)})
+                for cell in cells:
+                    try:
+                        await simulation_service.cancel_simulation(cell['simulation_id'], created_by)
+                    except Exception as cancel_error:
+                        logger.error(f"Failed to cancel simulation {cell['simulation_id']} of failed batch {batch_id}: {str(cancel_error)}")
+                raise
+
+            logger.info(f"Simulation batch created: {batch_id} ({total_count} simulations)")
+            return await self.get_batch(batch_id)
+
+        except Exception as e:
+            logger.error(f"Error creating simulation batch: {str(e)}")
+            raise
+
+    async def get_batch(self, batch_id: str) -> Optional[SimulationBatchResponse]:
+        """
+        バッチの詳細（各セルのステータスと比較レポート）を取得します。
+
+        Args:
+            batch_id: バッチID
+
+        Returns:
+            バッチの詳細、存在しない場合はNone
+        """
+        try:
+            doc = self.batches_collection.document(batch_id).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+
+            statuses = {
+                cell.id: cell.to_dict()
+                for cell in await asyncio.to_thread(self._list_cells, batch_id)
+            }
+            cells = []
+            for cell in data.get('cells', []):
+                cell_data = statuses.get(cell['simulation_id'], {})
+                cells.append(SimulationBatchCell(
+                    **cell,
+                    status=cell_data.get('status', 'deleted'),
+                    has_result=cell_data.get('has_result')
+                ))
+
+            return SimulationBatchResponse(
+                batch_id=batch_id,
+                batch_name=data['batch_name'],
+                created_by=data['created_by'],
+                created_at=data['created_at'],
+                instructions=data['instructions'],
+                participant_sets=[participant_set['participant_user_ids'] for participant_set in data['participant_sets']],
+                status=data['status'],
+                total_count=data['total_count'],
+                finished_count=data.get('finished_count', 0),
+                completed_at=data.get('completed_at'),
+                cells=cells,
+                comparison_report=data.get('comparison_report'),
+                error_message=data.get('error_message')
+            )
+
+        except Exception as e:
+            logger.error(f"Error getting simulation batch: {str(e)}")
+            raise
+
+    async def update_progress(self, batch_id: str):
+        """
+        セルの終了時に呼び出され、終了数を更新します。
+        全セルが終了していれば、1回だけ比較レポートを作成してバッチを完了にします。
+
+        Args:
+            batch_id: バッチID
+        """
+        batch_ref = self.batches_collection.document(batch_id)
+        cells = await asyncio.to_thread(self._list_cells, batch_id)
+        finished_count = sum(1 for cell in cells if cell.get('status') in TERMINAL_STATUSES)
+
+        @firestore.transactional
+        def claim_completion(transaction):
+            snapshot = batch_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get('status') != 'running':
+                return None
+            data = snapshot.to_dict()
+            if finished_count < data['total_count']:
+                transaction.update(batch_ref, {'finished_count': finished_count})
+                return None
+            transaction.update(batch_ref, {
+                'finished_count': finished_count,
+                'status': 'reporting',
+                'reporting_started_at': datetime.utcnow()
+            })
+            return data
+
+        data = claim_completion(self.db.transaction())
+        if data is None:
+            return
+        await self._complete_batch(batch_id, data, cells)
+
+    async def resume_stuck_batches(self) -> int:
+        """
+        比較レポートの作成中にプロセスが停止し、reporting のまま残ったバッチを完了させます（起動時に呼び出し）。
+        複数インスタンスが同時に起動しても1回だけ処理されるよう、トランザクションで取得します。
+
+        Returns:
+            完了させたバッチ数
+        """
+        @firestore.transactional
+        def claim(transaction, batch_ref):
+            snapshot = batch_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get('status') != 'reporting':
+                return None
+            data = snapshot.to_dict()
+            started_at = data.get('reporting_started_at')
+            if started_at and started_at.replace(tzinfo=None) > datetime.utcnow() - timedelta(seconds=REPORTING_STALE_SECONDS):
+                return None
+            transaction.update(batch_ref, {'reporting_started_at': datetime.utcnow()})
+            return data
+
+        resumed = 0
+        query = self.batches_collection.where(filter=firestore.FieldFilter('status', '==', 'reporting'))
+        for doc in query.stream():
+            try:
+                data = claim(self.db.transaction(), doc.reference)
+                if data is None:
+                    continue
+                cells = await asyncio.to_thread(self._list_cells, doc.id)
+                await self._complete_batch(doc.id, data, cells)
+                resumed += 1
+            except Exception as e:
+                logger.error(f"Failed to resume simulation batch {doc.id}: {str(e)}")
+        if resumed:
+            logger.info(f"Completed {resumed} simulation batches left in reporting")
+        return resumed
+
+    async def _complete_batch(self, batch_id: str, data: dict, cells: List):
+        """比較レポートを作成してバッチを完了にし、作成者に通知します。"""
+        batch_ref = self.batches_collection.document(batch_id)
+        try:
+            report = await asyncio.to_thread(self._build_comparison_report, data, cells)
+        except Exception as e:
+            logger.error(f"Failed to build comparison report for batch {batch_id}: {str(e)}")
+            report = None
+        batch_ref.update({
+            'status': 'completed',
+            'completed_at': datetime.utcnow(),
+            'comparison_report': report
+        })
+        logger.info(f"Simulation batch completed: {batch_id}")
+
+        await broadcast_simulation_notification(data['created_by'], {
+            'type': 'simulation_batch_completed',
+            'batch_id': batch_id,
+            'batch_name': data['batch_name'],
+            'message': f'バッチ "{data["batch_name"]}" の全シミュレーションが終了しました',
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    def _list_cells(self, batch_id: str) -> List:
+        query = self.simulations_collection.where(filter=firestore.FieldFilter('batch_id', '==', batch_id))
+        return list(query.stream())
+
+    def _build_comparison_report(self, data: dict, cells: List) -> str:
+        """
+        指示 × 参加者セットごとの結果を並べた比較レポート（Markdown）を作成します。ブロッキング。
+        """
+        cells_by_id = {cell.id: cell.to_dict() for cell in cells}
+        participant_sets = [participant_set['participant_user_ids'] for participant_set in data['participant_sets']]
+        preview_chars = settings.SIMULATION_BATCH_REPORT_PREVIEW_CHARS
+
+        lines = [f"# {data['batch_name']} 比較レポート", "", "## ステータス一覧", ""]
+        lines.append("| 指示 | " + " | ".join(f"チーム{i + 1}" for i in range(len(participant_sets))) + " |")
+        lines.append("|---" * (len(participant_sets) + 1) + "|")
+        grid = {}
+        for cell in data.get('cells', []):
+            grid[(cell['instruction_index'], cell['participant_set_index'])] = cell['simulation_id']
+        for instruction_index in range(len(data['instructions'])):
+            row = [cells_by_id.get(grid.get((instruction_index, j)), {}).get('status', '-') for j in range(len(participant_sets))]
+            lines.append(f"| 指示{instruction_index + 1} | " + " | ".join(row) + " |")
+
+        lines += ["", "## チーム構成", ""]
+        for i, participant_set in enumerate(participant_sets):
+            lines.append(f"- チーム{i + 1}: {', '.join(participant_set)}")
+
+        for instruction_index, instruction in enumerate(data['instructions']):
+            lines += ["", f"## 指示{instruction_index + 1}", "", f"> {instruction}"]
+            for participant_set_index in range(len(participant_sets)):
+                simulation_id = grid.get((instruction_index, participant_set_index))
+                cell_data = cells_by_id.get(simulation_id, {})
+                lines += ["", f"### チーム{participant_set_index + 1}（{cell_data.get('status', '-')}）", ""]
+                if cell_data.get('status') == 'failed':
+                    lines.append(f"エラー: {cell_data.get('error_message', '')}")
+                    continue
+                result_text = load_result_text(self.db, simulation_id, cell_data) if simulation_id and cell_data else None
+                if not result_text:
+                    lines.append("（結果なし）")
+                    continue
+                lines.append(result_text[:preview_chars])
+                if len(result_text) > preview_chars:
+                    lines.append(f"\n…（全文はシミュレーション {simulation_id} を参照）")
+
+        return '\n'.join(lines)
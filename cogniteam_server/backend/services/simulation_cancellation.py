@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationCancelledError(Exception):
+    """参加者ツールがキャンセル要求を検出したときに送出されます。"""
+
+
+class CancellationToken:
+    """
+    シミュレーションのキャンセル要求を伝えるトークン。
+    同じプロセス内では cancel() で即座に、別プロセス（ワーカーや他のAPIインスタンス）からの要求は
+    simulations/{id}.cancel_requested を poll_interval_seconds ごとに確認して検出します。
+    参加者ツールはリモート呼び出しの合間に check() を呼び出します。
+    """
+
+    def __init__(self, db_client, simulation_id: str, poll_interval_seconds: float = None):
+        self.simulation_id = simulation_id
+        self.simulation_ref = db_client.collection('simulations').document(simulation_id)
+        self.poll_interval_seconds = poll_interval_seconds or settings.SIMULATION_CANCEL_POLL_SECONDS
+        self._cancelled = threading.Event()
+        self._last_polled_at = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        """キャンセルされていればSimulationCancelledErrorを送出します。ブロッキング（Firestoreを読む場合あり）。"""
+        if not self._cancelled.is_set() and time.monotonic() - self._last_polled_at >= self.poll_interval_seconds:
+            self._last_polled_at = time.monotonic()
+            try:
+                snapshot = self.simulation_ref.get()
+                if snapshot.exists and snapshot.to_dict().get('cancel_requested'):
+                    self._cancelled.set()
+            except Exception as e:
+                logger.warning(f"Could not poll cancellation for simulation {self.simulation_id}: {str(e)}")
+        if self._cancelled.is_set():
+            raise SimulationCancelledError(f"Simulation {self.simulation_id} was cancelled")
+
+    async def check_async(self):
+        if self._cancelled.is_set() or time.monotonic() - self._last_polled_at >= self.poll_interval_seconds:
+            await asyncio.to_thread(self.check)
+
+
+# このプロセスで実行中のシミュレーションのトークン
+active_cancellation_tokens: Dict[str, CancellationToken] = {}
+
+
+def register_cancellation_token(token: CancellationToken):
+    active_cancellation_tokens[token.simulation_id] = token
+
+
+def unregister_cancellation_token(token: CancellationToken):
+    if active_cancellation_tokens.get(token.simulation_id) is token:
+        del active_cancellation_tokens[token.simulation_id]
+
+
+def get_cancellation_token(simulation_id: str) -> Optional[CancellationToken]:
+    return active_cancellation_tokens.get(simulation_id)
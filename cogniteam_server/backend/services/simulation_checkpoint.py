@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Tuple
+
+from config import settings
+from services.simulation_telemetry import telemetry_span
+
+logger = logging.getLogger(__name__)
+
+# simulations/{simulation_id}/turns/{turn:06d}
+TURNS_SUBCOLLECTION = 'turns'
+# Firestoreのバッチ書き込みは1回あたり500件まで
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class SimulationCheckpointer:
+    """
+    シミュレーションの各ターンを simulations/{id}/turns にバッチ書き込みで追記します。
+    batch_size 件たまるか flush_interval_seconds 経過するたびに書き込むため、
+    クラッシュやデプロイで失われるのは最後の数ターンだけです。
+    """
+
+    def __init__(self, db_client, simulation_id: str, batch_size: int = None, flush_interval_seconds: float = None):
+        self.db = db_client
+        self.simulation_id = simulation_id
+        self.batch_size = batch_size or settings.SIMULATION_CHECKPOINT_BATCH_SIZE
+        self.flush_interval_seconds = flush_interval_seconds or settings.SIMULATION_CHECKPOINT_FLUSH_SECONDS
+        self.simulation_ref = self.db.collection('simulations').document(simulation_id)
+        self._pending: List[Tuple[int, dict]] = []
+        self._last_flush_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def add(self, turn: int, entry: dict):
+        """ターンを追加し、必要に応じて書き込みます。"""
+        self._pending.append((turn, entry))
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush_at >= self.flush_interval_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """未書き込みのターンをすべて書き込みます。"""
+        async with self._lock:
+            if not self._pending:
+                return
+            items, self._pending = self._pending, []
+            self._last_flush_at = time.monotonic()
+            try:
+                await asyncio.to_thread(self._write, items)
+            except Exception as e:
+                # 次回のflushで再試行する
+                self._pending = items + self._pending
+                logger.error(f"Failed to checkpoint {len(items)} turns for simulation {self.simulation_id}: {str(e)}")
+
+    def _write(self, items: List[Tuple[int, dict]]):
+        with telemetry_span('checkpoint_write'):
+            self._write_batches(items)
+
+    def _write_batches(self, items: List[Tuple[int, dict]]):
+        turns_collection = self.simulation_ref.collection(TURNS_SUBCOLLECTION)
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT - 1):
+            chunk = items[start:start + FIRESTORE_BATCH_LIMIT - 1]
+            batch = self.db.batch()
+            for turn, entry in chunk:
+                batch.set(turns_collection.document(f"{turn:06d}"), {
+                    'turn': turn,
+                    'created_at': datetime.utcnow(),
+                    **entry,
+                })
+            batch.update(self.simulation_ref, {'checkpoint_turn': chunk[-1][0]})
+            batch.commit()
+
+
+def load_turns(db_client, simulation_id: str) -> List[dict]:
+    """
+    チェックポイント済みのターンをターン順に返します。
+
+    Args:
+        db_client: Firestoreクライアント
+        simulation_id: シミュレーションID
+
+    Returns:
+        ターンのリスト
+    """
+    turns_collection = db_client.collection('simulations').document(simulation_id).collection(TURNS_SUBCOLLECTION)
+    return [doc.to_dict() for doc in turns_collection.order_by('turn').stream()]
+
+
+def delete_turns(db_client, simulation_id: str) -> int:
+    """
+    チェックポイント済みのターンをすべて削除します（Firestoreはサブコレクションを連鎖削除しないため）。
+
+    Returns:
+        削除したターン数
+    """
+    turns_collection = db_client.collection('simulations').document(simulation_id).collection(TURNS_SUBCOLLECTION)
+    deleted = 0
+    while True:
+        docs = list(turns_collection.limit(FIRESTORE_BATCH_LIMIT).stream())
+        if not docs:
+            return deleted
+        batch = db_client.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+
+def format_transcript(turns: List[dict]) -> str:
+    """
+    ターンのリストを、ディレクターに続きを実行させるためのテキストに整形します。
+    """
+    lines = []
+    for turn in turns:
+        kind = turn.get('kind')
+        if kind == 'question':
+            lines.append(f"[{turn.get('author')} → {turn.get('participant')}] {turn.get('text', '')}")
+        else:
+            lines.append(f"[{turn.get('author')}] {turn.get('text', '')}")
+    return '\n'.join(lines)
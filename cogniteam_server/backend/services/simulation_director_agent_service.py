@@ -1,33 +1,43 @@
 import copy, os
 import asyncio
-import vertexai
 from google.adk.agents.llm_agent import LlmAgent
+from google.adk.agents import ParallelAgent, SequentialAgent
 from google.adk.tools.agent_tool import AgentTool
 from typing import List, Optional
+from firebase_admin import firestore
 from datetime import datetime
 import logging
 import types
 from .local_app import LocalApp
 from config import settings
-import time
+from utils.rate_limiter import get_agent_engine_rate_limiter, agent_engine_quota_scope
+from utils.vertex_setup import initialize_vertex_ai
+from utils.resilience import CircuitOpenError, get_remote_agent_breaker, get_remote_agent_retry_policy, is_transient_error
+from .remote_agent_registry import get_remote_agent_registry
+from .remote_session_pool import get_remote_session_pool
+from .concurrent_tool_calls import ConcurrentToolCalls
+from .simulation_cancellation import CancellationToken
+from .participant_response_cache import get_participant_response_cache
+from .agent_recording import resolve_model
+from .simulation_telemetry import current_telemetry, telemetry_span, telemetry_increment
+from .shared_participant_agent import PERSONA_STATE_KEY, shared_participant_agent_id, shared_participant_mode
+from google.adk.tools.tool_context import ToolContext
 import re
+import time
+import uuid
 
 
-PROJECT_ID = os.getenv('VERTEX_AI_PROJECT')
-LOCATION = os.getenv('VERTEX_AI_LOCATION')
-
-vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-os.environ['GOOGLE_CLOUD_PROJECT'] = PROJECT_ID
-os.environ['GOOGLE_CLOUD_LOCATION'] = LOCATION
-os.environ['GOOGLE_GENAI_USE_VERTEXAI'] = 'True'
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ディレクター（とパイプラインの各段階）が使用するモデル（AGENT_RECORDING_MODE で記録/再生に置き換え）
+DIRECTOR_MODEL = 'gemini-2.0-flash-001'
+
 class SimulationDirectorAgentService:
     def __init__(self):
+        # 通常は起動時に初期化済み（スクリプトから直接使う場合のため）
+        initialize_vertex_ai()
         self.global_instruction = '''
 必ず日本語で応答してください。すべての出力は日本語で行ってください。
 '''
@@ -60,7 +70,83 @@ class SimulationDirectorAgentService:
 {instruction}
 '''
 
-    def _create_participant_agent_tool(self, agent_id: str, agent_name: str = None, user_id: str = None) -> types.FunctionType:
+        # パイプラインモード（SIMULATION_DIRECTOR_MODE=pipeline）: 設計 → シナリオA/Bを並行実行 → 評価
+        # {{scenario_plan}} などはADKがセッション状態（各エージェントの output_key）から埋め込む
+        self.constraints = '''
+## 絶対的な制約
+- **最重要ルール**: あなたが実行する対話シミュレーションの登場人物は、いかなる場合でもユーザーによって指示された**TeamMemberAgent**のみです。他のエージェント（Sato_Agentなど）を絶対に出現させてはいけません。
+- **シミュレーションの途中経過の報告について**: シミュレーション途中の会話ログは随時出力すること
+'''
+
+        self.planner_instruction_template = '''
+あなたは、世界最高の組織コンサルタントAI『CogniTeam AI』の頭脳であり、`ScenarioPlannerAgent`として振る舞います。
+あなたの役割は、後続のエージェントが並行して実行する2つの比較実験シナリオを設計することです。シミュレーション自体は実行しません。
+{constraints}
+## 思考プロセス
+1. **対立構造の分析**:
+  与えられたメンバーを比較し、両者の「型」の間に存在する、最も重要な**対立の軸**を特定してください。必要であれば各メンバーに1回ずつ簡潔に質問して構いません。
+2. **根本原因の仮説立案**:
+  特定した「対立の軸」が、どのようなコミュニケーションの問題を引き起こしているか、その**因果関係に関する仮説**を立ててください。
+3. **比較実験の設計**:
+  仮説を検証するための具体的な業務シナリオ（例：**「次期主力機能の企画会議」**）を設定し、以下の2つのシナリオを設計してください。
+  - **シナリオA（対立再現シナリオ）**: 「対立の軸」が最も顕著に現れるコミュニケーション
+  - **シナリオB（対立解消シナリオ）**: その対立を解消し、両者のエンゲージメントを最大化する理想的なコミュニケーション
+
+## 出力形式
+最後の応答で、以下の見出しを使ってマークダウン形式で出力してください。
+### 対立の軸
+### 仮説
+### シナリオA（対立再現シナリオ）
+（場面設定、各メンバーへの最初の問いかけ、観察すべきポイント）
+### シナリオB（対立解消シナリオ）
+（場面設定、各メンバーへの最初の問いかけ、観察すべきポイント）
+
+## シミュレーション指示
+{instruction}
+'''
+
+        self.scenario_runner_instruction_template = '''
+あなたは、世界最高の組織コンサルタントAI『CogniTeam AI』の`{agent_name}`です。
+設計済みの比較実験のうち、**{scenario_label}のみ**を実行してください。もう一方のシナリオは別のエージェントが同時に実行します。
+{constraints}
+## 設計済みの比較実験
+{{scenario_plan}}
+
+## 実行方法
+- {scenario_label}の設計に従い、ユーザーによって指定されたメンバーに限定して指示し、対話を実行させてください。
+- この対話は最低でも10往復はするようなシミュレーションをしてください。
+- 最後の応答では、**対話ログ全体**と、{scenario_label}の結果（議論の質や結論の具体性など）の客観的な評価をマークダウン形式でまとめて出力してください。
+
+## シミュレーション指示
+{instruction}
+'''
+
+        self.evaluator_instruction_template = '''
+あなたは、世界最高の組織コンサルタントAI『CogniTeam AI』の`ScenarioEvaluatorAgent`です。
+並行して実行された2つの比較実験の結果を比較・評価し、最終レポートを作成してください。
+
+## 設計済みの比較実験
+{{scenario_plan}}
+
+## シナリオA（対立再現シナリオ）の結果
+{{scenario_a_result}}
+
+## シナリオB（対立解消シナリオ）の結果
+{{scenario_b_result}}
+
+## 最終レポートの生成
+- 2つのシナリオの結果（予測される議論の質や結論の具体性など）を客観的に比較・評価してください。
+- 全ての分析とシミュレーション結果を統合し、**マネージャーTanaka個人が即座に実行できる、単一の具体的なアクションプラン**として「インサイト・ダッシュボード」をマークダウン形式で出力してください。
+- **アウトプットの焦点**: 最終的な改善提案は、チーム全体への一般的なアドバイスではなく、必ずユーザーが明日からすぐに実行できる、単一の具体的なアクションプラン**に絞り込んでください。
+
+## シミュレーション指示
+{instruction}
+'''
+
+    def _create_participant_agent_tool(self, agent_id: str, agent_name: str = None, user_id: str = None, session_scope: str = None,
+                                       concurrent_calls: Optional[ConcurrentToolCalls] = None,
+                                       cancellation_token: Optional[CancellationToken] = None,
+                                       persona_version: Optional[str] = None, persona: Optional[str] = None) -> types.FunctionType:
         """
         参加者エージェント用のツール関数を動的に作成します。
         
@@ -68,12 +154,20 @@ class SimulationDirectorAgentService:
             agent_id: エージェントID
             agent_name: エージェント名（オプション）
             user_id: ユーザーID（オプション）
+            session_scope: リモートセッションを共有する範囲（通常はシミュレーションID）
+            concurrent_calls: 同じターンの複数のツール呼び出しを並行実行する場合に指定
+            cancellation_token: リモート呼び出しの合間に確認するキャンセル要求（オプション）
+            persona_version: 参加者のペルソナのバージョン（指定した場合のみ回答キャッシュを使用）
+            persona: 共有エージェントに渡すペルソナ（PARTICIPANT_AGENT_MODE=shared の場合。セッション状態として渡す）
             
         Returns:
-            ツール関数
+            ツール関数（非同期）
         """
         logger.info(f"Creating participant agent tool for agent_id: {agent_id}, agent_name: {agent_name}, user_id: {user_id}")
         
+        if session_scope is None:
+            session_scope = str(uuid.uuid4())
+        
         if agent_name is None:
             agent_name = f"Agent_{agent_id[:8]}"  # 短縮版のIDを使用
         
@@ -90,7 +184,77 @@ class SimulationDirectorAgentService:
             else:
                 user_id = f"u{user_id}"
         
-        def participant_agent_tool(query: str) -> str:
+        # 共有エージェントでは複数の参加者が同じエージェントを使うため、セッションは参加者ごとに分ける
+        session_key = agent_id if persona is None else f"{agent_id}:{user_id}"
+        session_state = None if persona is None else {PERSONA_STATE_KEY: persona}
+        
+        async def ask_participant(query: str) -> str:
+            AGENT_ID = agent_id
+
+            print(f"AGENT_ID: {AGENT_ID}, USER_ID: {user_id}")
+            started_at = time.monotonic()
+            telemetry_increment('participant_questions')
+
+            # キャンセル済みならリモート呼び出しを行わない
+            if cancellation_token:
+                await cancellation_token.check_async()
+
+            # 同じ参加者（同じペルソナ）への同じ質問の回答がキャッシュにあればリモート呼び出しを省略
+            response_cache = get_participant_response_cache() if persona_version is not None else None
+            if response_cache:
+                cached = await asyncio.to_thread(response_cache.get, AGENT_ID, persona_version, query)
+                if cached is not None:
+                    logger.info(f"Answered from response cache for agent {AGENT_ID}")
+                    telemetry_increment('response_cache_hits')
+                    return cached
+
+            # レート制限（トークンバケットが空のときだけ待機。プロセス内の全シミュレーションで共有）
+            rate_limiter = get_agent_engine_rate_limiter()
+            quota_scope = agent_engine_quota_scope(AGENT_ID)
+            with telemetry_span('rate_limit_wait'):
+                await rate_limiter.acquire(quota_scope)
+            # リトライを含めてこの時刻までに終わらなければ諦める
+            deadline_at = time.monotonic() + settings.REMOTE_AGENT_CALL_DEADLINE_SECONDS
+
+            # エージェントのハンドルはプロセス全体でキャッシュ（TTL付き、呼び出し失敗時に再取得）
+            registry = get_remote_agent_registry()
+            with telemetry_span('agent_handle'):
+                remote_agent = await asyncio.to_thread(registry.get, AGENT_ID)
+
+            # セッションは参加者ごと・シミュレーションごとに1回だけ作成し、ターン間で再利用（会話の文脈を保持）
+            session_pool = get_remote_session_pool()
+            try:
+                pooled = await asyncio.to_thread(
+                    session_pool.get_or_create,
+                    session_scope,
+                    session_key,
+                    lambda: self._create_remote_session(remote_agent, AGENT_ID, user_id, rate_limiter, quota_scope, deadline_at, session_state),
+                )
+                if cancellation_token:
+                    await cancellation_token.check_async()
+                # ブロッキングなストリーミングはスレッドで実行し、イベントループを止めない
+                with telemetry_span('stream_query'):
+                    answer = await asyncio.to_thread(
+                        self._stream_pooled_query, pooled, AGENT_ID, query, rate_limiter, quota_scope, deadline_at
+                    )
+            except CircuitOpenError:
+                # エンドポイントが不調な間は即座に失敗させる（セッションはそのまま）
+                logger.warning(f"Circuit open for agent {AGENT_ID}; skipping remote call")
+                raise
+            except Exception:
+                # 壊れたセッションやハンドルは次のターンで作り直す
+                await asyncio.to_thread(session_pool.discard, session_scope, session_key)
+                registry.invalidate(AGENT_ID)
+                raise
+
+            if response_cache and answer:
+                await asyncio.to_thread(response_cache.put, AGENT_ID, persona_version, query, answer)
+            telemetry = current_telemetry.get()
+            if telemetry:
+                telemetry.add_turn(agent_name, 'participant', time.monotonic() - started_at)
+            return answer
+
+        async def participant_agent_tool(query: str, tool_context: ToolContext) -> str:
             """
             Get an answer to a question from {agent_name}
 
@@ -100,70 +264,11 @@ class SimulationDirectorAgentService:
             Returns:
                 str: An answer from {agent_name}
             """
-            import vertexai
-            from vertexai import agent_engines
-
-            PROJECT_ID = os.getenv('VERTEX_AI_PROJECT')
-            AGENT_ID = agent_id
-            LOCATION = os.getenv('VERTEX_AI_LOCATION')
-            vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-            print(f"AGENT_ID: {AGENT_ID}, USER_ID: {user_id}")
-
-            # レート制限回避のための遅延（1分間に10リクエスト制限のため、最低6秒間隔）
-            time.sleep(6)
+            if concurrent_calls:
+                return await concurrent_calls.call(tool_context, participant_agent_tool.__name__, {'query': query})
+            return await ask_participant(query)
 
-            remote_agent = agent_engines.get(AGENT_ID)
-            
-            # セッション作成をリトライ
-            max_retries = 3
-            session = None
-            final_user_id = user_id  # 最終的に使用されたuser_idを記録
-            
-            for attempt in range(max_retries):
-                try:
-                    session = remote_agent.create_session(user_id=user_id)
-                    break
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        logger.warning(f"Session creation failed for agent {AGENT_ID}, attempt {attempt + 1}/{max_retries}: {e}")
-                        time.sleep(10)  # 10秒待機してリトライ
-                    else:
-                        logger.error(f"Session creation failed for agent {AGENT_ID} after {max_retries} attempts: {e}")
-                        # 最後の試行として固定ユーザーIDを使用
-                        try:
-                            logger.info(f"Trying with fixed user_id for agent {AGENT_ID}")
-                            session = remote_agent.create_session(user_id="default_user")
-                            final_user_id = "default_user"  # 固定ユーザーIDを使用した場合
-                            break
-                        except Exception as e2:
-                            logger.error(f"Session creation failed even with fixed user_id for agent {AGENT_ID}: {e2}")
-                            raise e  # 元のエラーを再発生
-            
-            if session is None:
-                raise Exception(f"Failed to create session for agent {AGENT_ID}")
-            
-            try:
-                events = remote_agent.stream_query(
-                            user_id=final_user_id,
-                            session_id=session['id'],
-                            message=query,
-                         )
-                result = []
-                for event in events:
-                    if ('content' in event and 'parts' in event['content']):
-                        response = '\n'.join(
-                            [p['text'] for p in event['content']['parts'] if 'text' in p]
-                        )
-                        if response:
-                            result.append(response)
-                return '\n'.join(result)
-
-            finally:
-                remote_agent.delete_session(
-                    user_id=final_user_id,
-                    session_id=session['id'],
-                )
+        participant_agent_tool.ask = ask_participant
         
         # 関数のdocstringを設定
         participant_agent_tool.__doc__ = f"""
@@ -178,7 +283,139 @@ class SimulationDirectorAgentService:
         
         return participant_agent_tool
 
-    def create_simulation_director_agent(self, instruction: str, participant_agent_ids: List[str], participant_user_ids: List[str] = None) -> LlmAgent:
+    def _create_remote_session(self, remote_agent, agent_id: str, user_id: str, rate_limiter, quota_scope: str, deadline_at: float = None,
+                               state: Optional[dict] = None):
+        """
+        リモートエージェントのセッションを作成します（一時的なエラーは指数バックオフでリトライ）。
+        
+        Args:
+            remote_agent: Agent Engineのエージェントハンドル
+            agent_id: エージェントID
+            user_id: セッションのユーザーID
+            rate_limiter: リトライ時に使用するレートリミッター
+            quota_scope: レート制限のスコープ
+            deadline_at: リトライを打ち切る時刻（time.monotonic()基準）
+            state: セッションの初期状態（共有エージェントに渡すペルソナなど、オプション）
+            
+        Returns:
+            (エージェントハンドル, 使用したユーザーID, セッションID)
+        """
+        def attempt():
+            telemetry_increment('remote_calls')
+            if state:
+                return remote_agent.create_session(user_id=user_id, state=state)
+            return remote_agent.create_session(user_id=user_id)
+
+        with telemetry_span('session_create'):
+            session = get_remote_agent_retry_policy().call(
+                attempt,
+                operation="create_session",
+                breaker=get_remote_agent_breaker(agent_id),
+                deadline_at=deadline_at,
+                before_retry=self._before_retry(rate_limiter, quota_scope),  # リトライもクォータを消費する
+            )
+        return remote_agent, user_id, session['id']
+
+    @staticmethod
+    def _before_retry(rate_limiter, quota_scope: str):
+        def before_retry():
+            telemetry_increment('remote_retries')
+            rate_limiter.acquire_blocking(quota_scope)
+        return before_retry
+
+    def _stream_pooled_query(self, pooled, agent_id: str, query: str, rate_limiter, quota_scope: str, deadline_at: float = None) -> str:
+        # 同じセッションへの質問は1つずつ（リモート側でセッション履歴に追記されるため）
+        with pooled.lock:
+            progress = {'received': False}
+
+            def attempt():
+                telemetry_increment('remote_calls')
+                return self._stream_remote_query(
+                    pooled.remote_agent, agent_id, pooled.user_id, pooled.session_id, query,
+                    on_event=lambda event: progress.update(received=True),
+                )
+
+            # 応答を受信し始めた後の失敗はリトライしない（同じ質問がセッションに二重に記録されるため）
+            return get_remote_agent_retry_policy().call(
+                attempt,
+                operation="stream_query",
+                breaker=get_remote_agent_breaker(agent_id),
+                deadline_at=deadline_at,
+                retry_on=lambda e: not progress['received'] and is_transient_error(e),
+                before_retry=self._before_retry(rate_limiter, quota_scope),
+            )
+
+    def _stream_remote_query(self, remote_agent, agent_id: str, user_id: str, session_id: str, query: str, on_event=None) -> str:
+        """
+        既存のセッションで質問を送信し、回答を返します。
+        
+        Args:
+            remote_agent: Agent Engineのエージェントハンドル
+            agent_id: エージェントID
+            user_id: セッションのユーザーID
+            session_id: セッションID
+            query: 質問
+            on_event: イベントを受信するたびに呼び出すコールバック（オプション）
+            
+        Returns:
+            エージェントの回答
+        """
+        events = remote_agent.stream_query(
+                    user_id=user_id,
+                    session_id=session_id,
+                    message=query,
+                 )
+        result = []
+        for event in events:
+            if on_event:
+                on_event(event)
+            if ('content' in event and 'parts' in event['content']):
+                response = '\n'.join(
+                    [p['text'] for p in event['content']['parts'] if 'text' in p]
+                )
+                if response:
+                    result.append(response)
+        return '\n'.join(result)
+
+    def _create_participant_tools(self, participant_agent_ids: List[str], participant_user_ids: List[str] = None, session_scope: str = None,
+                                  cancellation_token: Optional[CancellationToken] = None, persona_versions: Optional[List[str]] = None,
+                                  personas: Optional[List[str]] = None):
+        """
+        参加エージェントのツール関数を動的に作成します。
+        1ターンで複数の参加者に質問した場合は並行して実行します（共有レートリミッターの範囲内）。
+        
+        Args:
+            participant_agent_ids: 参加するエージェントのIDリスト
+            participant_user_ids: 参加するユーザーのIDリスト（オプション）
+            session_scope: 参加者のリモートセッションを共有する範囲（オプション）
+            cancellation_token: 参加者ツールが確認するキャンセル要求（オプション）
+            persona_versions: 参加者ごとのペルソナのバージョン（回答キャッシュを使用する場合）
+            personas: 参加者ごとのペルソナ（共有エージェントを使用する場合）
+            
+        Returns:
+            (ツール関数のリスト, エージェントの after_model_callback に登録する ConcurrentToolCalls)
+        """
+        concurrent_calls = ConcurrentToolCalls()
+        tools = []
+        for i, agent_id in enumerate(participant_agent_ids):
+            logger.info(f"Creating tool for agent {i+1}: {agent_id}")
+            # ユーザーIDが指定されている場合は使用、そうでなければagent_idを使用
+            user_id = participant_user_ids[i] if participant_user_ids and i < len(participant_user_ids) else agent_id
+            persona_version = persona_versions[i] if persona_versions and i < len(persona_versions) else None
+            persona = personas[i] if personas and i < len(personas) else None
+            agent_tool = self._create_participant_agent_tool(
+                agent_id, f"Participant_{i+1}", user_id, session_scope, concurrent_calls, cancellation_token, persona_version, persona
+            )
+            # 関数のname属性を設定
+            agent_tool.__name__ = f"participant_{i+1}_tool"
+            concurrent_calls.register(agent_tool.__name__, lambda args, ask=agent_tool.ask: ask(args.get('query', '')))
+            tools.append(agent_tool)
+        return tools, concurrent_calls
+
+    def create_simulation_director_agent(self, instruction: str, participant_agent_ids: List[str], participant_user_ids: List[str] = None, session_scope: str = None,
+                                         cancellation_token: Optional[CancellationToken] = None,
+                                         persona_versions: Optional[List[str]] = None,
+                                         personas: Optional[List[str]] = None) -> LlmAgent:
         """
         SimulationDirectorAgentを作成します。
         
@@ -186,6 +423,10 @@ class SimulationDirectorAgentService:
             instruction: シミュレーションの指示
             participant_agent_ids: 参加するエージェントのIDリスト
             participant_user_ids: 参加するユーザーのIDリスト（オプション）
+            session_scope: 参加者のリモートセッションを共有する範囲（オプション）
+            cancellation_token: 参加者ツールが確認するキャンセル要求（オプション）
+            persona_versions: 参加者ごとのペルソナのバージョン（回答キャッシュを使用する場合、オプション）
+            personas: 参加者ごとのペルソナ（共有エージェントを使用する場合、オプション）
             
         Returns:
             SimulationDirectorAgent
@@ -198,19 +439,12 @@ class SimulationDirectorAgentService:
             logger.info(f"Participant agent IDs: {participant_agent_ids}")
             logger.info(f"Participant user IDs: {participant_user_ids}")
             
-            # 参加エージェントのツール関数を動的に作成
-            tools = []
-            for i, agent_id in enumerate(participant_agent_ids):
-                logger.info(f"Creating tool for agent {i+1}: {agent_id}")
-                # ユーザーIDが指定されている場合は使用、そうでなければagent_idを使用
-                user_id = participant_user_ids[i] if participant_user_ids and i < len(participant_user_ids) else agent_id
-                agent_tool = self._create_participant_agent_tool(agent_id, f"Participant_{i+1}", user_id)
-                # 関数のname属性を設定
-                agent_tool.__name__ = f"participant_{i+1}_tool"
-                tools.append(agent_tool)
+            tools, concurrent_calls = self._create_participant_tools(
+                participant_agent_ids, participant_user_ids, session_scope, cancellation_token, persona_versions, personas
+            )
             
             simulation_director_agent = LlmAgent(
-                model='gemini-2.0-flash-001',
+                model=resolve_model(DIRECTOR_MODEL),
                 name='SimulationDirectorAgent',
                 description=(
                     '''
@@ -220,7 +454,8 @@ class SimulationDirectorAgentService:
                 ),
                 global_instruction=self.global_instruction,
                 instruction=final_instruction,
-                tools=tools
+                tools=tools,
+                after_model_callback=concurrent_calls.after_model_callback
             )
             
             logger.info(f"SimulationDirectorAgent created successfully with {len(tools)} participant tools")
@@ -230,7 +465,96 @@ class SimulationDirectorAgentService:
             logger.error(f"Error creating SimulationDirectorAgent: {str(e)}")
             raise
 
-    async def execute_simulation(self, instruction: str, participant_agent_ids: List[str], participant_user_ids: List[str] = None) -> str:
+    def create_simulation_director_pipeline(self, instruction: str, participant_agent_ids: List[str], participant_user_ids: List[str] = None,
+                                            session_scopes: dict = None, cancellation_token: Optional[CancellationToken] = None,
+                                            persona_versions: Optional[List[str]] = None,
+                                            personas: Optional[List[str]] = None) -> SequentialAgent:
+        """
+        設計・並行実行・評価の3段階からなるディレクターを作成します。
+        シナリオAとシナリオBはそれぞれ専用の参加者ツール（別々のリモートセッション）を持つエージェントが同時に実行し、
+        結果はセッション状態（scenario_plan / scenario_a_result / scenario_b_result）を介して評価エージェントに渡されます。
+        
+        Args:
+            instruction: シミュレーションの指示
+            participant_agent_ids: 参加するエージェントのIDリスト
+            participant_user_ids: 参加するユーザーのIDリスト（オプション）
+            session_scopes: 段階ごとのリモートセッションのスコープ（'plan', 'scenario_a', 'scenario_b'）
+            cancellation_token: 参加者ツールが確認するキャンセル要求（オプション）
+            persona_versions: 参加者ごとのペルソナのバージョン（回答キャッシュを使用する場合、オプション）
+            personas: 参加者ごとのペルソナ（共有エージェントを使用する場合、オプション）
+            
+        Returns:
+            SimulationDirectorAgent（SequentialAgent）
+        """
+        try:
+            session_scopes = session_scopes or {}
+            logger.info(f"Creating SimulationDirectorAgent pipeline with {len(participant_agent_ids)} participants")
+
+            planner_tools, planner_calls = self._create_participant_tools(
+                participant_agent_ids, participant_user_ids, session_scopes.get('plan'), cancellation_token, persona_versions, personas
+            )
+            planner = LlmAgent(
+                model=resolve_model(DIRECTOR_MODEL),
+                name='ScenarioPlannerAgent',
+                description='比較実験（シナリオA/B）を設計します。',
+                global_instruction=self.global_instruction,
+                instruction=self.planner_instruction_template.format(constraints=self.constraints, instruction=instruction),
+                tools=planner_tools,
+                after_model_callback=planner_calls.after_model_callback,
+                output_key='scenario_plan'
+            )
+
+            runners = []
+            for key, agent_name, scenario_label in (
+                ('scenario_a', 'ScenarioARunnerAgent', 'シナリオA（対立再現シナリオ）'),
+                ('scenario_b', 'ScenarioBRunnerAgent', 'シナリオB（対立解消シナリオ）'),
+            ):
+                runner_tools, runner_calls = self._create_participant_tools(
+                    participant_agent_ids, participant_user_ids, session_scopes.get(key), cancellation_token, persona_versions, personas
+                )
+                runners.append(LlmAgent(
+                    model=resolve_model(DIRECTOR_MODEL),
+                    name=agent_name,
+                    description=f'{scenario_label}を実行します。',
+                    global_instruction=self.global_instruction,
+                    instruction=self.scenario_runner_instruction_template.format(
+                        agent_name=agent_name, scenario_label=scenario_label, constraints=self.constraints, instruction=instruction
+                    ),
+                    tools=runner_tools,
+                    after_model_callback=runner_calls.after_model_callback,
+                    output_key=f'{key}_result'
+                ))
+
+            evaluator = LlmAgent(
+                model=resolve_model(DIRECTOR_MODEL),
+                name='ScenarioEvaluatorAgent',
+                description='2つのシナリオの結果を比較し、最終レポートを作成します。',
+                global_instruction=self.global_instruction,
+                instruction=self.evaluator_instruction_template.format(instruction=instruction),
+                output_key='final_report'
+            )
+
+            pipeline = SequentialAgent(
+                name='SimulationDirectorAgent',
+                description='比較実験を設計し、シナリオA/Bを並行して実行・評価します。',
+                sub_agents=[
+                    planner,
+                    ParallelAgent(name='ScenarioRunners', sub_agents=runners),
+                    evaluator,
+                ]
+            )
+            logger.info("SimulationDirectorAgent pipeline created successfully")
+            return pipeline
+
+        except Exception as e:
+            logger.error(f"Error creating SimulationDirectorAgent pipeline: {str(e)}")
+            raise
+
+    async def execute_simulation(self, instruction: str, participant_agent_ids: List[str], participant_user_ids: List[str] = None, simulation_id: str = None,
+                                 on_event=None, prior_transcript: Optional[str] = None,
+                                 cancellation_token: Optional[CancellationToken] = None,
+                                 persona_versions: Optional[List[str]] = None,
+                                 personas: Optional[List[str]] = None) -> str:
         """
         シミュレーションを実行します。
         
@@ -238,20 +562,71 @@ class SimulationDirectorAgentService:
             instruction: シミュレーションの指示
             participant_agent_ids: 参加するエージェントのIDリスト
             participant_user_ids: 参加するユーザーのIDリスト（オプション）
+            simulation_id: シミュレーションID（参加者のリモートセッションのスコープに使用）
+            on_event: ディレクター/参加者のイベントを受け取る非同期コールバック（進捗通知用、オプション）
+            prior_transcript: チェックポイントから再開する場合の前回までの途中経過（オプション）
+            cancellation_token: キャンセル要求（参加者ツールがリモート呼び出しの合間に確認、オプション）
+            persona_versions: 参加者ごとのペルソナのバージョン（指定した場合は回答キャッシュを使用、オプション）
+            personas: 参加者ごとのペルソナ（共有エージェントを使用する場合、オプション）
             
         Returns:
             シミュレーション結果（markdown形式）
         """
+        session_scope = simulation_id or str(uuid.uuid4())
+        release_scopes = [session_scope]
+        director_agent = None
+        client = None
         try:
             logger.info("Starting simulation execution")
             logger.info(f"Participant agent IDs: {participant_agent_ids}")
             logger.info(f"Participant user IDs: {participant_user_ids}")
             
-            # SimulationDirectorAgentを作成
-            director_agent = self.create_simulation_director_agent(instruction, participant_agent_ids, participant_user_ids)
-            client = LocalApp(director_agent)
-            DEBUG = False
-            result_detail = await client.stream(instruction)
+            # チェックポイントから再開する場合は、前回までの途中経過を踏まえて続きから実行させる
+            # 途中経過は最初のユーザーメッセージとして渡す（エージェントの指示に入れると、回答中の {word} が
+            # ADKのセッション状態の埋め込みとして解釈されて失敗するため）
+            director_instruction = instruction
+            if prior_transcript:
+                director_instruction = f"""{instruction}
+
+## これまでの途中経過（前回の実行で記録済み。繰り返さずに続きから実行してください）
+{prior_transcript}
+"""
+            
+            if settings.SIMULATION_DIRECTOR_MODE == 'pipeline':
+                # シナリオA/Bを並行して実行（各段階の参加者セッションは別々のスコープ）
+                pipeline_scopes = {stage: f"{session_scope}:{stage}" for stage in ('plan', 'scenario_a', 'scenario_b')}
+                release_scopes = list(pipeline_scopes.values())
+                director_agent = self.create_simulation_director_pipeline(
+                    instruction, participant_agent_ids, participant_user_ids, pipeline_scopes, cancellation_token, persona_versions, personas
+                )
+                client = LocalApp(director_agent)
+                with telemetry_span('director'):
+                    await client.stream(director_instruction, on_event=on_event)
+                # 並行実行中の出力は入り混じるため、各段階の最終出力を順番に並べる
+                state = await client.get_state()
+                result_detail = [
+                    f"## {title}\n\n{state[key]}\n"
+                    for key, title in (
+                        ('scenario_plan', '比較実験の設計'),
+                        ('scenario_a_result', 'シナリオA（対立再現シナリオ）'),
+                        ('scenario_b_result', 'シナリオB（対立解消シナリオ）'),
+                        ('final_report', '最終レポート'),
+                    )
+                    if state.get(key)
+                ]
+            else:
+                # SimulationDirectorAgentを作成
+                director_agent = self.create_simulation_director_agent(
+                    instruction, participant_agent_ids, participant_user_ids, session_scope, cancellation_token, persona_versions, personas
+                )
+                client = LocalApp(director_agent)
+                DEBUG = False
+                with telemetry_span('director'):
+                    result_detail = await client.stream(director_instruction, on_event=on_event)
+            if prior_transcript:
+                result_detail = [f"## 前回までの途中経過\n\n{prior_transcript}\n"] + list(result_detail)
+            # リストのまま埋め込むと repr（エスケープされた \n）になるため、Markdownとして連結する
+            result_detail = '\n'.join(result_detail)
             # シミュレーション実行
             # 注意: 実際のADK APIの呼び出し方法は、ADKの実装に依存します
             # ここでは仮の実装として、非同期で実行する想定
@@ -285,23 +660,120 @@ class SimulationDirectorAgentService:
         except Exception as e:
             logger.error(f"Error executing simulation: {str(e)}")
             raise
+        finally:
+            # 先行して開始したまま使われなかった参加者への呼び出しを止める
+            if director_agent:
+                for concurrent_calls in self._find_concurrent_tool_calls(director_agent):
+                    await concurrent_calls.cancel_pending()
+            # ディレクターのセッション（イベント履歴）を共有のセッションストアから削除
+            if client:
+                await client.close()
+            # このシミュレーションで開いたリモートセッションを削除
+            released = 0
+            with telemetry_span('session_release'):
+                for scope in release_scopes:
+                    released += await get_remote_session_pool().release_scope_async(scope)
+            if released:
+                logger.info(f"Released {released} remote sessions for simulation {session_scope}")
+
+    @staticmethod
+    def _find_concurrent_tool_calls(agent) -> List[ConcurrentToolCalls]:
+        """エージェントとそのサブエージェントに after_model_callback として登録された ConcurrentToolCalls を返します。"""
+        found = []
+        callbacks = agent.after_model_callback if isinstance(getattr(agent, 'after_model_callback', None), list) \
+            else [getattr(agent, 'after_model_callback', None)]
+        for callback in callbacks:
+            owner = getattr(callback, '__self__', None)
+            if isinstance(owner, ConcurrentToolCalls):
+                found.append(owner)
+        for sub_agent in agent.sub_agents:
+            found.extend(SimulationDirectorAgentService._find_concurrent_tool_calls(sub_agent))
+        return found
 
     async def validate_participants(self, participant_user_ids: List[str]) -> bool:
         """
         参加者のエージェントが存在するかどうかを検証します。
+        ユーザーをまとめて取得し、各参加者のエージェント（Agent Engine）を並行して解決します。
+        解決できたエージェントはレジストリに REMOTE_AGENT_HANDLE_TTL_SECONDS の間キャッシュされるため、
+        同じ参加者で続けて作成する場合はリモートへの問い合わせを行いません。
         
         Args:
             participant_user_ids: 参加者のユーザーIDリスト
             
         Returns:
             全参加者のエージェントが存在する場合はTrue
+            
+        Raises:
+            ValueError: ユーザーが存在しない、エージェントが未作成、またはエージェントが見つからない場合
+        """
+        if not participant_user_ids:
+            raise ValueError("Invalid participants: At least one participant is required")
+
+        agent_ids = await asyncio.to_thread(load_participant_agent_ids, firestore.client(), participant_user_ids)
+        without_agent = [user_id for user_id, agent_id in zip(participant_user_ids, agent_ids) if not agent_id]
+        if without_agent:
+            raise ValueError(f"Invalid participants: Some users do not have valid agents ({', '.join(without_agent)})")
+
+        unique_agent_ids = list(dict.fromkeys(agent_ids))
+        available = await asyncio.gather(*(self._probe_agent(agent_id) for agent_id in unique_agent_ids))
+        unavailable = {agent_id for agent_id, ok in zip(unique_agent_ids, available) if not ok}
+        if unavailable:
+            users = [user_id for user_id, agent_id in zip(participant_user_ids, agent_ids) if agent_id in unavailable]
+            raise ValueError(f"Invalid participants: Agents of some users could not be found ({', '.join(users)})")
+
+        logger.info(f"Validated participants: {participant_user_ids}")
+        return True
+
+    async def _probe_agent(self, agent_id: str) -> bool:
+        """
+        エージェントのハンドルを解決できるか確認します（レジストリにキャッシュ済みなら即座に返ります）。
+        一時的なエラーやタイムアウトは実行時のリトライに任せ、有効とみなします。
+        
+        Args:
+            agent_id: エージェントのリソースID
+            
+        Returns:
+            エージェントが存在しない場合のみFalse
         """
+        registry = get_remote_agent_registry()
         try:
-            # TODO: 実際のユーザーエージェント検証ロジックを実装
-            # ここでは仮の実装として、常にTrueを返す
-            logger.info(f"Validating participants: {participant_user_ids}")
+            await asyncio.wait_for(
+                asyncio.to_thread(registry.get, agent_id),
+                timeout=settings.REMOTE_AGENT_PROBE_TIMEOUT_SECONDS
+            )
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out resolving agent {agent_id}; skipping its validation")
             return True
-            
         except Exception as e:
-            logger.error(f"Error validating participants: {str(e)}")
-            return False 
\ No newline at end of file
+            if is_transient_error(e):
+                logger.warning(f"Transient error resolving agent {agent_id}; skipping its validation: {str(e)}")
+                return True
+            logger.warning(f"Agent {agent_id} could not be resolved: {str(e)}")
+            return False
+
+
+def load_participant_agent_ids(db_client, participant_user_ids: List[str]) -> List[Optional[str]]:
+    """
+    参加者のエージェントID（users/{id}.agent_engine_id）をまとめて取得します。ブロッキング。
+    PARTICIPANT_AGENT_MODE=shared の場合は、ペルソナ（prompt）のあるユーザーに共有エージェントを割り当てます。
+    
+    Args:
+        db_client: Firestoreクライアント
+        participant_user_ids: 参加者のユーザーIDリスト
+        
+    Returns:
+        エージェントIDのリスト（participant_user_ids と同じ順序。ユーザーやエージェントがない場合はNone）
+    """
+    shared = shared_participant_mode()
+    field = 'prompt' if shared else 'agent_engine_id'
+    users_collection = db_client.collection('users')
+    refs = [users_collection.document(user_id) for user_id in dict.fromkeys(participant_user_ids)]
+    values = {
+        snapshot.id: (snapshot.to_dict() or {}).get(field)
+        for snapshot in db_client.get_all(refs, field_paths=[field])
+        if snapshot.exists
+    }
+    if shared:
+        return [shared_participant_agent_id(user_id) if values.get(user_id) else None for user_id in participant_user_ids]
+    return [values.get(user_id) for user_id in participant_user_ids]
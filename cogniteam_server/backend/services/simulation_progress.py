@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime
+from typing import List
+
+from routers.sse import broadcast_simulation_notification
+
+logger = logging.getLogger(__name__)
+
+
+def extract_progress_entries(event) -> List[dict]:
+    """
+    ADKのイベントを進捗エントリのリストに変換します。
+    - message: ディレクターのテキスト出力
+    - question: ディレクターから参加者への質問（function call）
+    - answer: 参加者の回答（function response）
+
+    Args:
+        event: ADKのイベント
+
+    Returns:
+        {'author', 'kind', 'text'} のリスト
+    """
+    entries = []
+    if not event.content or not event.content.parts:
+        return entries
+    for part in event.content.parts:
+        if part.text:
+            entries.append({'author': event.author, 'kind': 'message', 'text': part.text})
+        elif part.function_call:
+            query = (part.function_call.args or {}).get('query', '')
+            entries.append({'author': event.author, 'kind': 'question', 'text': query, 'participant': part.function_call.name})
+        elif part.function_response:
+            response = part.function_response.response or {}
+            text = response.get('result', response.get('error', ''))
+            entries.append({'author': part.function_response.name, 'kind': 'answer', 'text': str(text)})
+    return entries
+
+
+class SimulationProgressReporter:
+    """
+    シミュレーション実行中のディレクター/参加者のイベントを、到着するたびに
+    simulation_progress イベントとして作成者のSSE（/sse/simulation）に送信します。
+    checkpointer を指定すると各ターンをFirestoreにも記録します。
+    """
+
+    def __init__(self, simulation_id: str, user_id: str, checkpointer=None, start_turn: int = 0):
+        self.simulation_id = simulation_id
+        self.user_id = user_id
+        self.checkpointer = checkpointer
+        # チェックポイントから再開する場合は続きの番号から
+        self.turn = start_turn
+
+    async def on_event(self, event):
+        """LocalAppから呼び出されるイベントコールバック"""
+        for entry in extract_progress_entries(event):
+            self.turn += 1
+            await self.report(entry)
+            if self.checkpointer:
+                await self.checkpointer.add(self.turn, entry)
+
+    async def report(self, entry: dict):
+        notification_data = {
+            'type': 'simulation_progress',
+            'simulation_id': self.simulation_id,
+            'turn': self.turn,
+            'timestamp': datetime.utcnow().isoformat(),
+            **entry,
+        }
+        try:
+            await broadcast_simulation_notification(self.user_id, notification_data)
+        except Exception as e:
+            # 進捗通知の失敗でシミュレーション自体は止めない
+            logger.error(f"Failed to send simulation progress for {self.simulation_id}: {str(e)}")
@@ -0,0 +1,193 @@
+import codecs
+import logging
+import os
+import zlib
+from typing import Iterator, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# simulations/{simulation_id}/result_chunks/{index:04d}
+RESULT_CHUNKS_SUBCOLLECTION = 'result_chunks'
+# 1回のバッチ書き込みのリクエストサイズ上限（10 MiB）を超えないようにまとめる件数
+FIRESTORE_CHUNKS_PER_BATCH = 8
+
+
+class FirestoreResultBlobStore:
+    """圧縮済みの結果を simulations/{id}/result_chunks にチャンクごとのドキュメントとして保存します。"""
+
+    name = 'firestore'
+
+    def __init__(self, db_client):
+        self.db = db_client
+
+    def _chunks_collection(self, simulation_id: str):
+        return self.db.collection('simulations').document(simulation_id).collection(RESULT_CHUNKS_SUBCOLLECTION)
+
+    def write(self, simulation_id: str, chunks: List[bytes]):
+        chunks_collection = self._chunks_collection(simulation_id)
+        for start in range(0, len(chunks), FIRESTORE_CHUNKS_PER_BATCH):
+            batch = self.db.batch()
+            for index in range(start, min(start + FIRESTORE_CHUNKS_PER_BATCH, len(chunks))):
+                batch.set(chunks_collection.document(f"{index:04d}"), {'index': index, 'data': chunks[index]})
+            batch.commit()
+
+    def read(self, simulation_id: str, chunk_count: int) -> Iterator[bytes]:
+        chunks_collection = self._chunks_collection(simulation_id)
+        for index in range(chunk_count):
+            snapshot = chunks_collection.document(f"{index:04d}").get()
+            if not snapshot.exists:
+                raise ValueError(f"Result chunk {index} of simulation {simulation_id} is missing")
+            yield snapshot.get('data')
+
+    def delete(self, simulation_id: str):
+        chunks_collection = self._chunks_collection(simulation_id)
+        while True:
+            docs = list(chunks_collection.limit(100).stream())
+            if not docs:
+                return
+            batch = self.db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+
+class LocalFileResultBlobStore:
+    """圧縮済みの結果を {root_dir}/{simulation_id}.zlib に保存します（ローカル開発・単一インスタンス用）。"""
+
+    name = 'local'
+
+    def __init__(self, root_dir: str, chunk_bytes: int):
+        self.root_dir = root_dir
+        self.chunk_bytes = chunk_bytes
+
+    def _path(self, simulation_id: str) -> str:
+        return os.path.join(self.root_dir, f"{os.path.basename(simulation_id)}.zlib")
+
+    def write(self, simulation_id: str, chunks: List[bytes]):
+        os.makedirs(self.root_dir, exist_ok=True)
+        path = self._path(simulation_id)
+        # 読み込み中のリクエストが書きかけのファイルを読まないように置き換える
+        with open(f"{path}.tmp", 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(f"{path}.tmp", path)
+
+    def read(self, simulation_id: str, chunk_count: int) -> Iterator[bytes]:
+        with open(self._path(simulation_id), 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_bytes)
+                if not chunk:
+                    return
+                yield chunk
+
+    def delete(self, simulation_id: str):
+        try:
+            os.remove(self._path(simulation_id))
+        except FileNotFoundError:
+            pass
+
+
+def get_result_blob_store(db_client, backend: str = None):
+    """
+    結果の保存先を返します。
+
+    Args:
+        db_client: Firestoreクライアント
+        backend: firestore / local（省略時は SIMULATION_RESULT_STORE）
+
+    Returns:
+        保存先のストア
+    """
+    backend = backend or settings.SIMULATION_RESULT_STORE
+    if backend == 'local':
+        return LocalFileResultBlobStore(settings.SIMULATION_RESULT_LOCAL_DIR, settings.SIMULATION_RESULT_CHUNK_BYTES)
+    return FirestoreResultBlobStore(db_client)
+
+
+def store_result(db_client, simulation_id: str, result_text: Optional[str]) -> dict:
+    """
+    結果を保存し、simulations/{id} に書き込むフィールドを返します。ブロッキング。
+    SIMULATION_RESULT_INLINE_MAX_BYTES 以下の結果はこれまで通り result_summary にそのまま保存し、
+    それより大きい結果はzlibで圧縮してチャンクに分けて外部に保存し、result_summary には先頭部分のみ残します。
+
+    Args:
+        db_client: Firestoreクライアント
+        simulation_id: シミュレーションID
+        result_text: 結果のテキスト
+
+    Returns:
+        result_summary / result_storage / has_result を含む辞書
+    """
+    if result_text is None:
+        return {'result_summary': None, 'result_storage': None, 'has_result': False}
+
+    data = result_text.encode('utf-8')
+    if len(data) <= settings.SIMULATION_RESULT_INLINE_MAX_BYTES:
+        return {'result_summary': result_text, 'result_storage': None, 'has_result': True}
+
+    compressed = zlib.compress(data)
+    chunk_bytes = settings.SIMULATION_RESULT_CHUNK_BYTES
+    chunks = [compressed[i:i + chunk_bytes] for i in range(0, len(compressed), chunk_bytes)]
+    store = get_result_blob_store(db_client)
+    store.write(simulation_id, chunks)
+    logger.info(f"Stored result of simulation {simulation_id} externally ({len(data)} bytes -> {len(compressed)} bytes in {len(chunks)} chunks, {store.name})")
+
+    return {
+        'result_summary': result_text[:settings.SIMULATION_RESULT_PREVIEW_CHARS],
+        'result_storage': {
+            'backend': store.name,
+            'encoding': 'zlib',
+            'chunk_count': len(chunks),
+            'size': len(data),
+            'compressed_size': len(compressed),
+        },
+        'has_result': True,
+    }
+
+
+def iter_result_text(db_client, simulation_id: str, result_storage: dict) -> Iterator[str]:
+    """
+    外部に保存した結果をチャンクごとに展開して返します。ブロッキング。
+
+    Args:
+        db_client: Firestoreクライアント
+        simulation_id: シミュレーションID
+        result_storage: store_result が返した result_storage
+
+    Returns:
+        結果のテキストの断片のイテレーター
+    """
+    store = get_result_blob_store(db_client, result_storage['backend'])
+    decompressor = zlib.decompressobj()
+    # チャンク境界で分断されたマルチバイト文字を正しく扱う
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in store.read(simulation_id, result_storage['chunk_count']):
+        text = decoder.decode(decompressor.decompress(chunk))
+        if text:
+            yield text
+    text = decoder.decode(decompressor.flush(), final=True)
+    if text:
+        yield text
+
+
+def load_result_text(db_client, simulation_id: str, data: dict) -> Optional[str]:
+    """simulations/{id} のデータから結果の全文を返します（外部に保存されている場合は読み込みます）。"""
+    result_storage = data.get('result_storage')
+    if result_storage:
+        return ''.join(iter_result_text(db_client, simulation_id, result_storage))
+    result_summary = data.get('result_summary')
+    if isinstance(result_summary, list):
+        result_summary = '\n\n'.join(result_summary)
+    return result_summary
+
+
+def delete_result(db_client, simulation_id: str, result_storage: Optional[dict]):
+    """外部に保存した結果を削除します。"""
+    if not result_storage:
+        return
+    try:
+        get_result_blob_store(db_client, result_storage['backend']).delete(simulation_id)
+    except Exception as e:
+        logger.warning(f"Could not delete stored result of simulation {simulation_id}: {str(e)}")
@@ -1,41 +1,93 @@
 import asyncio
-from typing import List, Optional
+import base64
+import json
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
 import logging
 from firebase_admin import firestore
-from models import Simulation, SimulationCreate, SimulationResponse, SimulationListResponse
-from services.simulation_director_agent_service import SimulationDirectorAgentService
+from models import Simulation, SimulationCreate, SimulationResponse, SimulationListResponse, SimulationTurn
+from services.simulation_director_agent_service import SimulationDirectorAgentService, load_participant_agent_ids
+from services.job_runner import JobRunner
+from services.simulation_progress import SimulationProgressReporter
+from services.simulation_cancellation import (
+    CancellationToken, SimulationCancelledError, get_cancellation_token,
+    register_cancellation_token, unregister_cancellation_token,
+)
+from services.simulation_checkpoint import SimulationCheckpointer, load_turns, delete_turns, format_transcript
+from services.simulation_result_store import store_result, iter_result_text, delete_result
+from services.participant_response_cache import get_participant_response_cache, persona_version
+from services.shared_participant_agent import shared_participant_mode
+from services.simulation_telemetry import SimulationTelemetry, current_telemetry, telemetry_span
 from routers.sse import broadcast_simulation_notification
 from utils.firebase_setup import initialize_firebase_admin
+from config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ジョブの優先度（小さいほど先に実行）
+SIMULATION_PRIORITY_RESUMED = 5
+SIMULATION_PRIORITY_DEFAULT = 10
+# バッチ実行のセルは個別に作成されたシミュレーションより後に実行する
+SIMULATION_PRIORITY_BATCH = 20
+
+# ワーカーモードでシミュレーションを取得する際のリース（workers/simulation.py）
+SIMULATION_LEASE_COLLECTION = 'simulation_leases'
+
+# 一覧表示で読み込むフィールド（result_summary は詳細取得時のみ）
+SIMULATION_LIST_FIELDS = [
+    'simulation_name', 'instruction', 'participant_user_ids', 'status', 'created_by',
+    'created_at', 'started_at', 'completed_at', 'error_message', 'has_result',
+]
+
+
+def encode_list_cursor(simulation_id: str) -> str:
+    """一覧のページングに使う不透明なカーソル文字列を作成します。"""
+    return base64.urlsafe_b64encode(json.dumps({'id': simulation_id}).encode()).decode().rstrip('=')
+
+
+def decode_list_cursor(cursor: str) -> str:
+    """カーソル文字列からシミュレーションIDを取り出します。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())['id']
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# プロセス全体で共有するシミュレーション実行用ジョブランナー（SimulationServiceはリクエストごとに生成されるため）
+simulation_job_runner = JobRunner(
+    name="simulation",
+    max_workers=settings.SIMULATION_MAX_CONCURRENCY,
+    max_per_user=settings.SIMULATION_MAX_CONCURRENCY_PER_USER,
+    shutdown_grace_seconds=settings.SIMULATION_SHUTDOWN_GRACE_SECONDS,
+)
+
 class SimulationService:
     def __init__(self):
         self.db = firestore.client()
         self.simulation_director_service = SimulationDirectorAgentService()
         self.simulations_collection = self.db.collection('simulations')
 
-    async def create_simulation(self, simulation_data: SimulationCreate, created_by: str) -> SimulationResponse:
+    async def create_simulation(self, simulation_data: SimulationCreate, created_by: str,
+                                batch_id: Optional[str] = None, priority: int = SIMULATION_PRIORITY_DEFAULT) -> SimulationResponse:
         """
         新しいシミュレーションを作成します。
         
         Args:
             simulation_data: シミュレーション作成データ
             created_by: 作成者のユーザーID
+            batch_id: バッチ実行のセルとして作成する場合のバッチID
+            priority: 実行キューでの優先度（小さいほど先に実行）
             
         Returns:
             作成されたシミュレーションのレスポンス
         """
         try:
-            # 参加者の検証
-            is_valid = await self.simulation_director_service.validate_participants(
+            # 参加者の検証（ユーザーやエージェントが存在しない場合は ValueError）
+            await self.simulation_director_service.validate_participants(
                 simulation_data.participant_user_ids
             )
-            if not is_valid:
-                raise ValueError("Invalid participants: Some users do not have valid agents")
 
             # シミュレーションオブジェクトを作成
             simulation = Simulation(
@@ -57,13 +109,15 @@ class SimulationService:
                 'started_at': simulation.started_at,
                 'completed_at': simulation.completed_at,
                 'result_summary': simulation.result_summary,
-                'error_message': simulation.error_message
+                'has_result': False,
+                'error_message': simulation.error_message,
+                'batch_id': batch_id
             })
 
             logger.info(f"Simulation created successfully: {simulation.simulation_id}")
             
             # バックグラウンドでシミュレーションを実行
-            asyncio.create_task(self._execute_simulation_background(simulation.simulation_id))
+            self._enqueue_simulation(simulation.simulation_id, simulation.created_by, priority=priority)
             
             return SimulationResponse(
                 simulation_id=simulation.simulation_id,
@@ -76,19 +130,21 @@ class SimulationService:
                 completed_at=simulation.completed_at,
                 result_summary=simulation.result_summary,
                 error_message=simulation.error_message,
-                created_by=simulation.created_by
+                created_by=simulation.created_by,
+                batch_id=batch_id
             )
 
         except Exception as e:
             logger.error(f"Error creating simulation: {str(e)}")
             raise
 
-    async def get_simulation(self, simulation_id: str) -> Optional[SimulationResponse]:
+    async def get_simulation(self, simulation_id: str, include_transcript: bool = False) -> Optional[SimulationResponse]:
         """
         シミュレーションの詳細を取得します。
         
         Args:
             simulation_id: シミュレーションID
+            include_transcript: チェックポイント済みのターン（実行中は途中経過）を含めるかどうか
             
         Returns:
             シミュレーションの詳細、存在しない場合はNone
@@ -107,6 +163,10 @@ class SimulationService:
             if isinstance(result_summary, list):
                 result_summary = '\n\n'.join(result_summary)
             
+            transcript = None
+            if include_transcript:
+                transcript = [SimulationTurn(**turn) for turn in await asyncio.to_thread(load_turns, self.db, simulation_id)]
+            
             return SimulationResponse(
                 simulation_id=simulation_id,
                 simulation_name=data['simulation_name'],
@@ -118,41 +178,89 @@ class SimulationService:
                 completed_at=data.get('completed_at'),
                 result_summary=result_summary,
                 error_message=data.get('error_message'),
-                created_by=data['created_by']
+                created_by=data['created_by'],
+                transcript=transcript,
+                has_result=data.get('has_result', result_summary is not None),
+                result_truncated=bool(data.get('result_storage')),
+                batch_id=data.get('batch_id'),
+                telemetry=data.get('telemetry')
             )
 
         except Exception as e:
             logger.error(f"Error getting simulation: {str(e)}")
             raise
 
-    async def get_simulations_by_user(self, user_id: str, limit: int = 50, offset: int = 0) -> SimulationListResponse:
+    async def iter_simulation_result(self, simulation_id: str) -> AsyncIterator[str]:
+        """
+        外部に保存されたシミュレーション結果を、チャンクを展開しながら順に返します。
+        結果が result_summary にそのまま保存されている場合はそれを1回で返します。
+        
+        Args:
+            simulation_id: シミュレーションID
+            
+        Returns:
+            結果のテキストの断片を返す非同期イテレーター
+        """
+        doc = self.simulations_collection.document(simulation_id).get()
+        if not doc.exists:
+            return
+        data = doc.to_dict()
+        result_storage = data.get('result_storage')
+        if not result_storage:
+            result_summary = data.get('result_summary')
+            if isinstance(result_summary, list):
+                result_summary = '\n\n'.join(result_summary)
+            if result_summary:
+                yield result_summary
+            return
+
+        pieces = iter_result_text(self.db, simulation_id, result_storage)
+        while True:
+            # チャンクの読み込み・展開はブロッキングのためスレッドで実行
+            piece = await asyncio.to_thread(next, pieces, None)
+            if piece is None:
+                return
+            yield piece
+
+    async def get_simulations_by_user(self, user_id: str, limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> SimulationListResponse:
         """
-        ユーザーが作成したシミュレーション一覧を取得します。
+        ユーザーが作成したシミュレーション一覧を取得します（created_atの降順）。
+        Firestore側で並び替え・ページングし、一覧には不要な result_summary は読み込みません。
         
         Args:
             user_id: ユーザーID
             limit: 取得件数制限
-            offset: オフセット
+            offset: オフセット（cursor指定時は無視。互換性のため残しています）
+            cursor: 前のページの next_cursor
             
         Returns:
             シミュレーション一覧
         """
         try:
-            # ユーザーが作成したシミュレーションをクエリ（インデックスなしでフィルタリングのみ）
-            query = self.simulations_collection.where('created_by', '==', user_id)
-            docs = query.stream()
-            
-            # メモリ上でソート・ページネーション
+            # created_by + created_at DESC の複合インデックスが必要（firestore.indexes.json）
+            base_query = self.simulations_collection.where(filter=firestore.FieldFilter('created_by', '==', user_id))
+            query = base_query.order_by('created_at', direction=firestore.Query.DESCENDING).select(SIMULATION_LIST_FIELDS)
+
+            if cursor:
+                # 並び順のキーだけを読み込む（result_summary などの大きなフィールドは不要）
+                cursor_doc = self.simulations_collection.document(decode_list_cursor(cursor)).get(
+                    field_paths=['created_by', 'created_at']
+                )
+                if not cursor_doc.exists or cursor_doc.get('created_by') != user_id:
+                    raise ValueError("Invalid cursor")
+                query = query.start_after(cursor_doc)
+            elif offset:
+                query = query.offset(offset)
+
+            # 次のページがあるか判定するため1件多く取得
+            docs = list(query.limit(limit + 1).stream())
+            has_more = len(docs) > limit
+            docs = docs[:limit]
+
             simulations = []
             for doc in docs:
                 data = doc.to_dict()
-                
-                # result_summaryがリストの場合は文字列として結合
-                result_summary = data.get('result_summary')
-                if isinstance(result_summary, list):
-                    result_summary = '\n\n'.join(result_summary)
-                
-                simulation = SimulationResponse(
+                simulations.append(SimulationResponse(
                     simulation_id=doc.id,
                     simulation_name=data['simulation_name'],
                     instruction=data['instruction'],
@@ -161,22 +269,18 @@ class SimulationService:
                     created_at=data['created_at'],
                     started_at=data.get('started_at'),
                     completed_at=data.get('completed_at'),
-                    result_summary=result_summary,
                     error_message=data.get('error_message'),
-                    created_by=data['created_by']
-                )
-                simulations.append(simulation)
-            
-            # created_atで降順ソート
-            simulations.sort(key=lambda x: x.created_at, reverse=True)
-            
-            # ページネーション適用
-            total_count = len(simulations)
-            simulations = simulations[offset:offset + limit]
+                    created_by=data['created_by'],
+                    has_result=data.get('has_result', data['status'] == 'completed')
+                ))
+
+            # 件数は集計クエリで取得（ドキュメント本体は読み込まない）
+            total_count = base_query.count(alias='total').get()[0][0].value
 
             return SimulationListResponse(
                 simulations=simulations,
-                total_count=total_count
+                total_count=total_count,
+                next_cursor=encode_list_cursor(docs[-1].id) if has_more else None
             )
 
         except Exception as e:
@@ -206,6 +310,9 @@ class SimulationService:
                 raise ValueError("Only the creator can delete the simulation")
                 
             doc_ref.delete()
+            # サブコレクションは連鎖削除されないため、チェックポイントと外部に保存した結果も削除
+            await asyncio.to_thread(delete_turns, self.db, simulation_id)
+            await asyncio.to_thread(delete_result, self.db, simulation_id, data.get('result_storage'))
             logger.info(f"Simulation deleted successfully: {simulation_id}")
             return True
 
@@ -213,13 +320,14 @@ class SimulationService:
             logger.error(f"Error deleting simulation: {str(e)}")
             raise
 
-    async def rerun_simulation(self, simulation_id: str, user_id: str) -> SimulationResponse:
+    async def rerun_simulation(self, simulation_id: str, user_id: str, resume: bool = False) -> SimulationResponse:
         """
         シミュレーションを再実行します。
         
         Args:
             simulation_id: シミュレーションID
             user_id: 再実行を実行するユーザーID（作成者のみ再実行可能）
+            resume: Trueの場合、最後のチェックポイントから続きを実行（Falseの場合は最初から）
             
         Returns:
             更新されたシミュレーションのレスポンス
@@ -233,18 +341,33 @@ class SimulationService:
             if existing_simulation.created_by != user_id:
                 raise ValueError("Only the creator can rerun the simulation")
 
+            if simulation_job_runner.get(simulation_id):
+                raise ValueError("Simulation is already queued or running")
+            if settings.SIMULATION_EXECUTION_MODE == 'worker' and existing_simulation.status in ('pending', 'running'):
+                raise ValueError("Simulation is already queued or running")
+
             # ステータスをpendingにリセット
             doc_ref = self.simulations_collection.document(simulation_id)
+            previous_result_storage = doc_ref.get().to_dict().get('result_storage')
             doc_ref.update({
                 'status': 'pending',
                 'started_at': None,
                 'completed_at': None,
                 'result_summary': None,
-                'error_message': None
+                'result_storage': None,
+                'has_result': False,
+                'telemetry': None,
+                'error_message': None,
+                'resumable': False,
+                'resume_from_checkpoint': resume,
+                'cancel_requested': False
             })
+            if not resume:
+                await asyncio.to_thread(delete_turns, self.db, simulation_id)
+            await asyncio.to_thread(delete_result, self.db, simulation_id, previous_result_storage)
 
             # バックグラウンドでシミュレーションを再実行
-            asyncio.create_task(self._execute_simulation_background(simulation_id))
+            self._enqueue_simulation(simulation_id, existing_simulation.created_by)
             
             # 更新されたシミュレーションを返す
             updated_simulation = await self.get_simulation(simulation_id)
@@ -254,6 +377,172 @@ class SimulationService:
             logger.error(f"Error rerunning simulation: {str(e)}")
             raise
 
+    async def cancel_simulation(self, simulation_id: str, user_id: str) -> SimulationResponse:
+        """
+        実行中または待機中のシミュレーションをキャンセルします。
+        記録済みの途中経過は result_summary に保存され、ステータスは cancelled になります。
+        
+        Args:
+            simulation_id: シミュレーションID
+            user_id: キャンセルを実行するユーザーID（作成者のみキャンセル可能）
+            
+        Returns:
+            更新されたシミュレーションのレスポンス
+        """
+        try:
+            existing_simulation = await self.get_simulation(simulation_id)
+            if not existing_simulation:
+                raise ValueError("Simulation not found")
+            if existing_simulation.created_by != user_id:
+                raise ValueError("Only the creator can cancel the simulation")
+            if existing_simulation.status not in ('pending', 'running', 'interrupted'):
+                raise ValueError(f"Simulation is not running (status: {existing_simulation.status})")
+
+            # 他のプロセス（ワーカー等）で実行中の場合は、参加者ツールがこのフラグを検出して停止する
+            doc_ref = self.simulations_collection.document(simulation_id)
+            doc_ref.update({'cancel_requested': True, 'resumable': False})
+
+            token = get_cancellation_token(simulation_id)
+            if token:
+                token.cancel()
+            job = simulation_job_runner.get(simulation_id)
+            if job and job.status == 'running':
+                # 実行中のタスクをキャンセル（_execute_simulation_background が途中経過を保存して cancelled にする）
+                simulation_job_runner.cancel(simulation_id)
+            else:
+                # まだ開始されていないジョブはここで cancelled にする
+                if job:
+                    simulation_job_runner.cancel(simulation_id)
+                await self._mark_simulation_cancelled(simulation_id, only_if_not_started=True)
+
+            logger.info(f"Cancellation requested for simulation {simulation_id}")
+            return await self.get_simulation(simulation_id)
+
+        except Exception as e:
+            logger.error(f"Error cancelling simulation: {str(e)}")
+            raise
+
+    async def _mark_simulation_cancelled(
+        self, simulation_id: str, only_if_not_started: bool = False, telemetry: Optional[SimulationTelemetry] = None
+    ):
+        """
+        シミュレーションをcancelledにし、記録済みの途中経過を result_summary に保存します。
+        
+        Args:
+            simulation_id: シミュレーションID
+            only_if_not_started: Trueの場合、まだ開始されていない（pending/interrupted）場合のみ更新
+            telemetry: 実行中にキャンセルされた場合、それまでの計測結果
+        """
+        doc_ref = self.simulations_collection.document(simulation_id)
+
+        @firestore.transactional
+        def mark(transaction, result_fields):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            if only_if_not_started and snapshot.get('status') not in ('pending', 'interrupted'):
+                return False
+            transaction.update(doc_ref, {
+                'status': 'cancelled',
+                'completed_at': datetime.utcnow(),
+                'resumable': False,
+                **result_fields
+            })
+            return True
+
+        try:
+            turns = await asyncio.to_thread(load_turns, self.db, simulation_id)
+            result_fields = await asyncio.to_thread(store_result, self.db, simulation_id, format_transcript(turns) if turns else None)
+            if telemetry:
+                result_fields['telemetry'] = telemetry.to_dict()
+            if not mark(self.db.transaction(), result_fields):
+                await asyncio.to_thread(delete_result, self.db, simulation_id, result_fields['result_storage'])
+                return
+            logger.info(f"Simulation cancelled: {simulation_id} ({len(turns)} turns kept)")
+            if telemetry:
+                telemetry.export_metrics('cancelled')
+            simulation = await self.get_simulation(simulation_id)
+            if simulation:
+                await broadcast_simulation_notification(simulation.created_by, {
+                    'type': 'simulation_cancelled',
+                    'simulation_id': simulation_id,
+                    'simulation_name': simulation.simulation_name,
+                    'message': f'シミュレーション "{simulation.simulation_name}" をキャンセルしました',
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+                if simulation.batch_id:
+                    await self._update_batch_progress(simulation.batch_id)
+        except Exception as e:
+            logger.error(f"Failed to mark simulation {simulation_id} as cancelled: {str(e)}")
+
+    def _enqueue_simulation(self, simulation_id: str, created_by: str, priority: int = SIMULATION_PRIORITY_DEFAULT):
+        """
+        シミュレーションをジョブランナーに投入します。
+        
+        Args:
+            simulation_id: シミュレーションID
+            created_by: 作成者のユーザーID（ユーザーごとの同時実行数制限に使用）
+            priority: 優先度（小さいほど先に実行）
+        """
+        if settings.SIMULATION_EXECUTION_MODE == 'worker':
+            # APIはキューに積むだけ（ドキュメントはpendingのまま）。実行はワーカーがリースを取得して行う
+            logger.info(f"Simulation {simulation_id} queued for out-of-process workers")
+            return
+        simulation_job_runner.submit(
+            job_id=simulation_id,
+            user_id=created_by,
+            factory=lambda: self._execute_simulation_background(simulation_id),
+            priority=priority,
+            on_interrupted=lambda: self._mark_simulation_interrupted(simulation_id),
+        )
+
+    async def _mark_simulation_interrupted(self, simulation_id: str):
+        """
+        シャットダウンで中断されたシミュレーションを再開可能としてマークします。
+        
+        Args:
+            simulation_id: シミュレーションID
+        """
+        try:
+            self.simulations_collection.document(simulation_id).update({
+                'status': 'interrupted',
+                'resumable': True,
+                'interrupted_at': datetime.utcnow()
+            })
+            logger.info(f"Simulation marked as resumable after shutdown: {simulation_id}")
+        except Exception as e:
+            logger.error(f"Failed to mark simulation {simulation_id} as interrupted: {str(e)}")
+
+    async def resume_interrupted_simulations(self) -> int:
+        """
+        シャットダウンで中断されたシミュレーションを再投入します（起動時に呼び出し）。
+        複数インスタンスが同時に起動しても1回だけ再投入されるよう、トランザクションで取得します。
+        
+        Returns:
+            再投入したシミュレーション数
+        """
+        @firestore.transactional
+        def claim(transaction, doc_ref):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists or not snapshot.get('resumable'):
+                return None
+            transaction.update(doc_ref, {'resumable': False, 'status': 'pending', 'resume_from_checkpoint': True})
+            return snapshot.get('created_by')
+
+        resumed = 0
+        query = self.simulations_collection.where(filter=firestore.FieldFilter('resumable', '==', True))
+        for doc in query.stream():
+            try:
+                created_by = claim(self.db.transaction(), doc.reference)
+                if created_by:
+                    self._enqueue_simulation(doc.id, created_by, priority=SIMULATION_PRIORITY_RESUMED)
+                    resumed += 1
+            except Exception as e:
+                logger.error(f"Failed to resume simulation {doc.id}: {str(e)}")
+        if resumed:
+            logger.info(f"Resumed {resumed} interrupted simulations")
+        return resumed
+
     async def _execute_simulation_background(self, simulation_id: str):
         """
         バックグラウンドでシミュレーションを実行します。
@@ -261,6 +550,12 @@ class SimulationService:
         Args:
             simulation_id: シミュレーションID
         """
+        cancellation_token = CancellationToken(self.db, simulation_id)
+        register_cancellation_token(cancellation_token)
+        # フェーズごとの所要時間・リモート呼び出し回数・トークン数を計測（参加者ツールやLocalAppから参照される）
+        telemetry = SimulationTelemetry()
+        telemetry_context = current_telemetry.set(telemetry)
+        batch_id = None
         try:
             # ステータスをrunningに更新
             doc_ref = self.simulations_collection.document(simulation_id)
@@ -273,26 +568,66 @@ class SimulationService:
             simulation = await self.get_simulation(simulation_id)
             if not simulation:
                 raise ValueError("Simulation not found")
+            batch_id = simulation.batch_id
 
-            # 参加者のエージェントIDを取得
-            participant_agent_ids = await self._get_participant_agent_ids(simulation.participant_user_ids)
+            with telemetry_span('participant_lookup'):
+                # 参加者のエージェントIDを取得
+                participant_agent_ids = await self._get_participant_agent_ids(simulation.participant_user_ids)
+                # 共有エージェントを使う場合はペルソナを渡す。回答キャッシュが有効な場合は、
+                # ペルソナが変わった参加者のキャッシュを使わないようにバージョンを渡す
+                personas = None
+                persona_versions = None
+                if shared_participant_mode() or get_participant_response_cache():
+                    prompts = await asyncio.to_thread(self._get_participant_prompts, simulation.participant_user_ids)
+                    if shared_participant_mode():
+                        personas = prompts
+                    if get_participant_response_cache():
+                        persona_versions = [persona_version(prompt) for prompt in prompts]
+            
+            # チェックポイントから再開する場合は記録済みのターンを読み込む
+            prior_turns = []
+            if doc_ref.get().to_dict().get('resume_from_checkpoint'):
+                with telemetry_span('checkpoint_load'):
+                    prior_turns = await asyncio.to_thread(load_turns, self.db, simulation_id)
+                logger.info(f"Resuming simulation {simulation_id} from checkpoint ({len(prior_turns)} turns)")
             
-            # シミュレーション実行
-            result = await self.simulation_director_service.execute_simulation(
-                simulation.instruction,
-                participant_agent_ids,
-                simulation.participant_user_ids
+            # シミュレーション実行（途中経過は simulation_progress としてSSEで逐次送信し、turnsに記録）
+            checkpointer = SimulationCheckpointer(self.db, simulation_id)
+            progress_reporter = SimulationProgressReporter(
+                simulation_id,
+                simulation.created_by,
+                checkpointer=checkpointer,
+                start_turn=prior_turns[-1]['turn'] if prior_turns else 0
             )
+            try:
+                result = await self.simulation_director_service.execute_simulation(
+                    simulation.instruction,
+                    participant_agent_ids,
+                    simulation.participant_user_ids,
+                    simulation_id=simulation_id,
+                    on_event=progress_reporter.on_event,
+                    prior_transcript=format_transcript(prior_turns) if prior_turns else None,
+                    cancellation_token=cancellation_token,
+                    persona_versions=persona_versions,
+                    personas=personas
+                )
+            finally:
+                # 失敗・中断時も記録済みのターンを残す
+                await checkpointer.flush()
 
             # 結果を文字列として結合して保存
             result_summary = result if isinstance(result, str) else '\n\n'.join(result) if isinstance(result, list) else str(result)
 
-            # 結果を保存
+            # 結果を保存（大きな結果は圧縮してチャンクに分けて保存し、result_summary には先頭部分のみ残す）
+            with telemetry_span('result_write'):
+                result_fields = await asyncio.to_thread(store_result, self.db, simulation_id, result_summary)
             doc_ref.update({
                 'status': 'completed',
                 'completed_at': datetime.utcnow(),
-                'result_summary': result_summary
+                **result_fields,
+                'telemetry': telemetry.to_dict()
             })
+            telemetry.export_metrics('completed')
 
             logger.info(f"Simulation completed successfully: {simulation_id}")
 
@@ -310,6 +645,19 @@ class SimulationService:
             except Exception as e:
                 logger.error(f"Failed to send simulation completion notification: {str(e)}")
 
+            if batch_id:
+                await self._update_batch_progress(batch_id)
+
+        except asyncio.CancelledError:
+            # キャンセル要求による停止の場合のみcancelledにする（シャットダウンによる中断はinterruptedとして扱う）
+            if cancellation_token.cancelled:
+                await self._mark_simulation_cancelled(simulation_id, telemetry=telemetry)
+            raise
+
+        except SimulationCancelledError:
+            # 参加者ツールが（別プロセスからの）キャンセル要求を検出した
+            await self._mark_simulation_cancelled(simulation_id, telemetry=telemetry)
+
         except Exception as e:
             logger.error(f"Error executing simulation in background: {str(e)}")
             
@@ -318,8 +666,10 @@ class SimulationService:
             doc_ref.update({
                 'status': 'failed',
                 'completed_at': datetime.utcnow(),
-                'error_message': str(e)
+                'error_message': str(e),
+                'telemetry': telemetry.to_dict()
             })
+            telemetry.export_metrics('failed')
 
             # シミュレーション作成者にエラー通知を送信
             try:
@@ -338,9 +688,50 @@ class SimulationService:
             except Exception as notification_error:
                 logger.error(f"Failed to send simulation failure notification: {str(notification_error)}")
 
+            if batch_id:
+                await self._update_batch_progress(batch_id)
+
+        finally:
+            current_telemetry.reset(telemetry_context)
+            unregister_cancellation_token(cancellation_token)
+
+    async def _update_batch_progress(self, batch_id: str):
+        """
+        バッチ実行の進捗を更新し、全セルが終了していれば比較レポートを作成します。
+        
+        Args:
+            batch_id: バッチID
+        """
+        # simulation_batch_service は SimulationService を使うため、循環インポートを避けてここでインポート
+        from services.simulation_batch_service import SimulationBatchService
+        try:
+            await SimulationBatchService().update_progress(batch_id)
+        except Exception as e:
+            logger.error(f"Failed to update progress of simulation batch {batch_id}: {str(e)}")
+
+    def _get_participant_prompts(self, participant_user_ids: List[str]) -> List[Optional[str]]:
+        """
+        参加者ごとのペルソナ（プロンプト）を取得します。ブロッキング。
+        
+        Args:
+            participant_user_ids: 参加者のユーザーIDリスト
+            
+        Returns:
+            ペルソナのリスト（participant_user_ids と同じ順序）
+        """
+        users_collection = self.db.collection('users')
+        refs = [users_collection.document(user_id) for user_id in participant_user_ids]
+        prompts = {
+            snapshot.id: (snapshot.to_dict() or {}).get('prompt')
+            for snapshot in self.db.get_all(refs, field_paths=['prompt'])
+            if snapshot.exists
+        }
+        return [prompts.get(user_id) for user_id in participant_user_ids]
+
     async def _get_participant_agent_ids(self, participant_user_ids: List[str]) -> List[str]:
         """
         参加者のエージェントIDを取得します。
+        作成後にユーザーやエージェントが削除された場合は、実行を始める前に失敗させます。
         
         Args:
             participant_user_ids: 参加者のユーザーIDリスト
@@ -348,34 +739,9 @@ class SimulationService:
         Returns:
             参加者のエージェントIDリスト
         """
-        try:
-            agent_ids = []
-            users_collection = self.db.collection('users')
-            
-            for user_id in participant_user_ids:
-                # ユーザードキュメントを取得
-                user_doc = users_collection.document(user_id).get()
-                
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    agent_engine_id = user_data.get('agent_engine_id')
-                    
-                    if agent_engine_id:
-                        agent_ids.append(agent_engine_id)
-                        logger.info(f"Found agent_engine_id for user {user_id}: {agent_engine_id}")
-                    else:
-                        logger.warning(f"No agent_engine_id found for user {user_id}")
-                        # agent_engine_idがない場合は、ユーザーIDをそのまま使用（フォールバック）
-                        agent_ids.append(user_id)
-                else:
-                    logger.warning(f"User document not found for user_id: {user_id}")
-                    # ユーザードキュメントが見つからない場合は、ユーザーIDをそのまま使用（フォールバック）
-                    agent_ids.append(user_id)
-            
-            logger.info(f"Retrieved agent IDs: {agent_ids}")
-            return agent_ids
-            
-        except Exception as e:
-            logger.error(f"Error getting participant agent IDs: {str(e)}")
-            # エラーが発生した場合は、元のユーザーIDをそのまま返す（フォールバック）
-            return participant_user_ids 
\ No newline at end of file
+        agent_ids = await asyncio.to_thread(load_participant_agent_ids, self.db, participant_user_ids)
+        without_agent = [user_id for user_id, agent_id in zip(participant_user_ids, agent_ids) if not agent_id]
+        if without_agent:
+            raise ValueError(f"Some participants no longer have agents ({', '.join(without_agent)})")
+        logger.info(f"Retrieved agent IDs: {agent_ids}")
+        return agent_ids 
\ No newline at end of file
@@ -0,0 +1,106 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from utils import metrics
+
+# 1シミュレーションあたり保存するターンの上限（ドキュメントサイズを抑えるため）
+MAX_RECORDED_TURNS = 300
+
+# 実行中のシミュレーションのテレメトリ（参加者ツールやLocalAppから参照。asyncio.to_thread にも引き継がれる）
+current_telemetry: contextvars.ContextVar[Optional['SimulationTelemetry']] = contextvars.ContextVar('simulation_telemetry', default=None)
+
+
+class SimulationTelemetry:
+    """
+    1回のシミュレーション実行のフェーズごとの所要時間、ターンごとの記録、リモート呼び出し・リトライ回数、
+    入出力トークン数を集計します。to_dict() の結果は simulations/{id}.telemetry に保存され、
+    export_metrics() で /metrics の集計値にも加算されます。
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.phases: Dict[str, List[float]] = {}  # phase -> [count, total_seconds, max_seconds]
+        self.counters: Dict[str, int] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.turns: List[dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase: str):
+        """with telemetry.span('stream_query'): ... の所要時間をフェーズに加算します。"""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(phase, time.monotonic() - started_at)
+
+    def add_span(self, phase: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def increment(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def add_turn(self, author: str, kind: str, seconds: float, input_tokens: int = 0, output_tokens: int = 0):
+        """ディレクターのモデル呼び出しや参加者への質問1回分を記録します。"""
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            if len(self.turns) < MAX_RECORDED_TURNS:
+                self.turns.append({
+                    'turn': len(self.turns) + 1,
+                    'author': author,
+                    'kind': kind,
+                    'seconds': round(seconds, 3),
+                    'input_tokens': input_tokens,
+                    'output_tokens': output_tokens,
+                })
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'wall_seconds': round(time.monotonic() - self.started_at, 3),
+                'phases': {
+                    phase: {'count': count, 'total_seconds': round(total, 3), 'max_seconds': round(maximum, 3)}
+                    for phase, (count, total, maximum) in self.phases.items()
+                },
+                'counters': dict(self.counters),
+                'tokens': {'input': self.input_tokens, 'output': self.output_tokens},
+                'turns': list(self.turns),
+            }
+
+    def export_metrics(self, status: str):
+        """集計値をプロセス全体のメトリクスに加算します。"""
+        with self._lock:
+            metrics.observe("simulation_wall_seconds", time.monotonic() - self.started_at, status=status)
+            for phase, (count, total, maximum) in self.phases.items():
+                metrics.observe("simulation_phase_seconds", total, phase=phase)
+            for counter, value in self.counters.items():
+                metrics.increment(f"simulation_{counter}_total", value)
+            metrics.increment("simulation_tokens_total", self.input_tokens, direction="input")
+            metrics.increment("simulation_tokens_total", self.output_tokens, direction="output")
+
+
+@contextmanager
+def telemetry_span(phase: str):
+    """実行中のシミュレーションがあればそのフェーズとして計測します（なければ何もしません）。"""
+    telemetry = current_telemetry.get()
+    if telemetry is None:
+        yield
+        return
+    with telemetry.span(phase):
+        yield
+
+
+def telemetry_increment(counter: str, value: int = 1):
+    telemetry = current_telemetry.get()
+    if telemetry is not None:
+        telemetry.increment(counter, value)
@@ -0,0 +1,103 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from config import settings
+from utils import metrics
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Events without a "type" field (plain chat messages) are classified as this type.
+DEFAULT_EVENT_TYPE = "message"
+
+
+def parse_overflow_policies(raw: str) -> Dict[str, str]:
+    """Parses "event_type:policy,event_type:policy" into a dict, ignoring unknown policies."""
+    policies = {}
+    for item in (raw or "").split(","):
+        if ":" not in item:
+            continue
+        event_type, policy = (part.strip() for part in item.split(":", 1))
+        if policy in OVERFLOW_POLICIES:
+            policies[event_type] = policy
+        else:
+            print(f"SSE: Ignoring unknown overflow policy '{policy}' for event type '{event_type}'")
+    return policies
+
+
+class BoundedSSEQueue:
+    """
+    Per-connection SSE queue with a hard size limit.
+    When a slow consumer lets the queue fill up, the policy configured for the incoming
+    event's type decides what happens:
+    - drop_oldest: discard the oldest queued event to make room.
+    - coalesce: replace the queued event of the same type (and same simulation_id/group_id)
+      with the latest one; falls back to drop_oldest if there is nothing to coalesce.
+    - disconnect: close the connection; the client reconnects and refetches state.
+    put() never blocks, so a stalled client can no longer grow memory or stall broadcasters.
+    """
+
+    def __init__(self, stream: str, maxsize: Optional[int] = None, policies: Optional[Dict[str, str]] = None,
+                 default_policy: Optional[str] = None):
+        self.stream = stream
+        self.maxsize = maxsize or settings.SSE_QUEUE_MAXSIZE
+        self.policies = policies if policies is not None else parse_overflow_policies(settings.SSE_OVERFLOW_POLICIES)
+        self.default_policy = default_policy or settings.SSE_DEFAULT_OVERFLOW_POLICY
+        self._events: Deque[dict] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def qsize(self) -> int:
+        return len(self._events)
+
+    async def put(self, event: dict):
+        self.put_nowait(event)
+
+    def put_nowait(self, event: dict):
+        if self.closed:
+            return
+        if len(self._events) >= self.maxsize:
+            event_type = self._event_type(event)
+            policy = self.policies.get(event_type, self.default_policy)
+            if policy == DISCONNECT:
+                metrics.increment("sse_connections_evicted_total", stream=self.stream, event_type=event_type)
+                print(f"SSE: Evicting slow {self.stream} consumer (queue full at {self.maxsize}, event type {event_type})")
+                self.close()
+                return
+            if policy == COALESCE and self._coalesce(event, event_type):
+                metrics.increment("sse_events_coalesced_total", stream=self.stream, event_type=event_type)
+                return
+            dropped = self._events.popleft()
+            metrics.increment("sse_events_dropped_total", stream=self.stream, event_type=self._event_type(dropped))
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self) -> Optional[dict]:
+        """Returns the next event, or None once the queue has been closed."""
+        while not self._events:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._events.popleft()
+
+    def close(self):
+        self.closed = True
+        self._events.clear()
+        self._ready.set()
+
+    def _coalesce(self, event: dict, event_type: str) -> bool:
+        key = (event.get("simulation_id"), event.get("group_id"))
+        for index in range(len(self._events) - 1, -1, -1):
+            queued = self._events[index]
+            if self._event_type(queued) == event_type and (queued.get("simulation_id"), queued.get("group_id")) == key:
+                self._events[index] = event
+                return True
+        return False
+
+    @staticmethod
+    def _event_type(event: dict) -> str:
+        return event.get("type") or DEFAULT_EVENT_TYPE
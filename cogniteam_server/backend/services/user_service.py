@@ -61,7 +61,7 @@ class UserService:
         doc = users_collection.where('email', '==', user_email).get()
 
     @staticmethod
-    async def create_user_in_firestore(user_id: str, user_email:str, user_data_dict: dict, prompt: str, agent_engine_endpoint: str = None, agent_engine_id: str = None, db_client = None) -> User | None:
+    async def create_user_in_firestore(user_id: str, user_email:str, user_data_dict: dict, prompt: str, agent_engine_endpoint: str = None, agent_engine_id: str = None, agent_status: str = None, db_client = None) -> User | None:
         """
         Creates a user profile document in Firestore.
         user_id: Firebase UID.
@@ -70,6 +70,7 @@ class UserService:
         prompt: Generated prompt string.
         agent_engine_endpoint: Vertex AI Agent Engine endpoint URL (optional).
         agent_engine_id: Vertex AI Agent Engine ID (optional).
+        agent_status: Agent creation status (optional, "pending" when the agent is created in the background).
         db_client: Firestore client instance.
         Returns a Pydantic User model instance if successful, None otherwise.
         """
@@ -100,6 +101,7 @@ class UserService:
                 "prompt": prompt,
                 "agent_engine_endpoint": agent_engine_endpoint, # Add the endpoint URL
                 "agent_engine_id": agent_engine_id, # Add the agent engine ID
+                "agent_status": agent_status, # pending / deploying / ready / failed
                 "created_at": date.today().isoformat(), # Add created_at field
                 # Add any other fields from User model that should be initialized
                 # "created_at": firestore.SERVER_TIMESTAMP, # Optional: server-side timestamp
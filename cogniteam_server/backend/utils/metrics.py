@@ -0,0 +1,62 @@
+# In-process metrics registry (counters, gauges and timings), exported at /api/v1/metrics.
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_gauges: Dict[Tuple[str, tuple], float] = {}
+# timings: Dict[key, [count, total_seconds, max_seconds]]
+_timings: Dict[Tuple[str, tuple], list] = {}
+
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Adds `value` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Sets a gauge to its current value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Records a duration sample."""
+    key = _key(name, labels)
+    with _lock:
+        entry = _timings.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def snapshot() -> dict:
+    """Returns every metric as JSON-serializable data."""
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_gauges.items())
+            ],
+            "timings": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "avg_seconds": round(total / count, 6) if count else 0.0,
+                    "max_seconds": round(maximum, 6),
+                }
+                for (name, labels), (count, total, maximum) in sorted(_timings.items())
+            ],
+        }
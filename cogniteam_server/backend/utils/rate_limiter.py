@@ -0,0 +1,100 @@
+# Token-bucket rate limiting for remote calls with a per-minute quota (e.g. Agent Engine queries).
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+from utils import metrics
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate_per_second` up to `burst`.
+    Callers reserve a token up front: the bucket may go negative, and each caller waits
+    for its own share of the deficit, so waiters are served in arrival order without polling.
+    """
+
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate_per_second = rate_per_second
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes one token and returns how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+
+class RateLimiter:
+    """
+    A set of token buckets keyed by quota scope, shared by every caller in the process.
+    Only callers that find their bucket empty wait, and time spent waiting is recorded in
+    the `rate_limiter_wait_seconds` timing metric.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, burst: float):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, scope: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(scope)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_minute / 60.0, self.burst)
+                self._buckets[scope] = bucket
+            return bucket
+
+    def _record(self, scope: str, waited: float):
+        metrics.increment("rate_limiter_requests_total", limiter=self.name, scope=scope)
+        if waited > 0:
+            metrics.observe("rate_limiter_wait_seconds", waited, limiter=self.name, scope=scope)
+
+    async def acquire(self, scope: str = "default"):
+        """Waits (without blocking the event loop) until a request in `scope` is allowed."""
+        wait = self._bucket(scope).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(scope, wait)
+
+    def acquire_blocking(self, scope: str = "default"):
+        """Same as acquire() for code running in a worker thread."""
+        wait = self._bucket(scope).reserve()
+        if wait > 0:
+            time.sleep(wait)
+        self._record(scope, wait)
+
+
+agent_engine_rate_limiter_instance: Optional[RateLimiter] = None
+
+
+def get_agent_engine_rate_limiter() -> RateLimiter:
+    global agent_engine_rate_limiter_instance
+    if agent_engine_rate_limiter_instance is None:
+        agent_engine_rate_limiter_instance = RateLimiter(
+            name="agent_engine",
+            requests_per_minute=settings.AGENT_ENGINE_REQUESTS_PER_MINUTE,
+            burst=settings.AGENT_ENGINE_RATE_BURST,
+        )
+    return agent_engine_rate_limiter_instance
+
+
+def agent_engine_quota_scope(agent_id: str) -> str:
+    """
+    Quota scope for a remote agent call. Agent Engine query quotas are per project and region
+    by default; AGENT_ENGINE_RATE_LIMIT_SCOPE=agent gives every deployed agent its own bucket.
+    """
+    if settings.AGENT_ENGINE_RATE_LIMIT_SCOPE == "agent":
+        return agent_id
+    return f"{settings.VERTEX_AI_PROJECT}/{settings.VERTEX_AI_LOCATION}"
@@ -0,0 +1,176 @@
+# Retry (exponential backoff + jitter + deadline) and circuit breakers for remote agent calls.
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+from config import settings
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRANSIENT_EXCEPTIONS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+)
+TRANSIENT_MARKERS = ("429", "500", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "timed out")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for errors worth retrying (throttling, 5xx, timeouts, dropped connections)."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, TRANSIENT_EXCEPTIONS):
+        return True
+    message = str(error)
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an endpoint is unhealthy.
+    - closed: calls go through; `failure_threshold` consecutive failures open the circuit.
+    - open: calls raise CircuitOpenError until `reset_timeout_seconds` have passed.
+    - half_open: a single probe call is let through; success closes the circuit, failure reopens it.
+    The state is exported as the `circuit_breaker_state` gauge (0 closed, 1 half_open, 2 open).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._export()
+
+    def call(self, fn: Callable[[], T]) -> T:
+        self._before_call()
+        try:
+            result = fn()
+        except Exception:
+            self._record_failure()
+            raise
+        self._record_success()
+        return result
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout_seconds:
+                    metrics.increment("circuit_breaker_rejections_total", breaker=self.name)
+                    raise CircuitOpenError(f"Circuit for {self.name} is open")
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    metrics.increment("circuit_breaker_rejections_total", breaker=self.name)
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open, probe in progress")
+                self._probe_in_flight = True
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        log = logger.warning if state == self.OPEN else logger.info
+        log(f"CircuitBreaker: {self.name} {self.state} -> {state}")
+        self.state = state
+        self._export()
+
+    def _export(self):
+        metrics.set_gauge("circuit_breaker_state", self._GAUGE_VALUES[self.state], breaker=self.name)
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with exponential backoff and full jitter.
+    A retry is only attempted if its backoff still ends before `deadline_at` (time.monotonic()),
+    so a call never outlives its caller's budget. Blocking; run it in a worker thread.
+    """
+
+    def __init__(self, max_attempts: int, base_delay_seconds: float, max_delay_seconds: float):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+    def call(self, fn: Callable[[], T], operation: str, breaker: Optional[CircuitBreaker] = None,
+             deadline_at: Optional[float] = None, retry_on: Callable[[Exception], bool] = is_transient_error,
+             before_retry: Optional[Callable[[], None]] = None) -> T:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return breaker.call(fn) if breaker else fn()
+            except Exception as e:
+                if attempt == self.max_attempts or not retry_on(e):
+                    raise
+                delay = random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * (2 ** (attempt - 1))))
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    metrics.increment("remote_call_deadline_exceeded_total", operation=operation)
+                    raise
+                metrics.increment("remote_call_retries_total", operation=operation)
+                logger.warning(f"RetryPolicy: {operation} failed (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                if before_retry:
+                    before_retry()
+
+
+remote_agent_retry_policy_instance: Optional[RetryPolicy] = None
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_remote_agent_retry_policy() -> RetryPolicy:
+    global remote_agent_retry_policy_instance
+    if remote_agent_retry_policy_instance is None:
+        remote_agent_retry_policy_instance = RetryPolicy(
+            max_attempts=settings.REMOTE_AGENT_RETRY_MAX_ATTEMPTS,
+            base_delay_seconds=settings.REMOTE_AGENT_RETRY_BASE_DELAY_SECONDS,
+            max_delay_seconds=settings.REMOTE_AGENT_RETRY_MAX_DELAY_SECONDS,
+        )
+    return remote_agent_retry_policy_instance
+
+
+def get_remote_agent_breaker(agent_id: str) -> CircuitBreaker:
+    """One circuit breaker per remote agent."""
+    with _breakers_lock:
+        breaker = _breakers.get(agent_id)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name=f"agent:{agent_id}",
+                failure_threshold=settings.REMOTE_AGENT_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout_seconds=settings.REMOTE_AGENT_BREAKER_RESET_SECONDS,
+            )
+            _breakers[agent_id] = breaker
+        return breaker
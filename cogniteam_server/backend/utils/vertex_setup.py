@@ -0,0 +1,27 @@
+import os
+import threading
+import vertexai
+from config import settings
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def initialize_vertex_ai():
+    """
+    Initializes the Vertex AI SDK once per process.
+    Also sets the GOOGLE_CLOUD_* / GOOGLE_GENAI_USE_VERTEXAI environment variables that ADK
+    reads when it calls Gemini through Vertex AI. Safe to call more than once.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        os.environ['GOOGLE_CLOUD_PROJECT'] = settings.VERTEX_AI_PROJECT
+        os.environ['GOOGLE_CLOUD_LOCATION'] = settings.VERTEX_AI_LOCATION
+        os.environ['GOOGLE_GENAI_USE_VERTEXAI'] = 'True'
+        vertexai.init(project=settings.VERTEX_AI_PROJECT, location=settings.VERTEX_AI_LOCATION)
+        _initialized = True
+        print(f"Vertex AI initialized for project: {settings.VERTEX_AI_PROJECT} in location: {settings.VERTEX_AI_LOCATION}")
@@ -0,0 +1 @@
+# Makes 'workers' a Python package
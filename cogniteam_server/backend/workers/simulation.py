@@ -0,0 +1,205 @@
+"""
+シミュレーション実行ワーカー（APIプロセスとは別プロセスで実行）
+
+    python -m workers.simulation
+
+SIMULATION_EXECUTION_MODE=worker の場合、APIはシミュレーションを pending で保存するだけです。
+ワーカーは simulation_leases コレクションのリースを取得してシミュレーションを実行し、
+ハートビートでリースを延長します。ワーカーが落ちるとリースが期限切れになり、別のワーカーが引き継ぎます。
+完了通知をSSE接続を持つAPIプロセスに届けるため、EVENT_BUS_BACKEND=redis を使用してください。
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import List, Optional
+
+from firebase_admin import firestore
+
+from config import settings
+from utils.firebase_setup import initialize_firebase_admin
+from utils.vertex_setup import initialize_vertex_ai
+from services.event_bus import InProcessEventBus, get_event_bus
+from services.job_runner import JobRunner
+from services.lease_service import LeaseService
+from services.remote_session_pool import get_remote_session_pool
+from services.simulation_service import SimulationService, SIMULATION_LEASE_COLLECTION, SIMULATION_PRIORITY_DEFAULT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# リースを取得できるシミュレーションのステータス（running はリース期限切れの引き継ぎ用）
+CLAIMABLE_STATUSES = ('pending', 'running')
+
+
+class SimulationWorker:
+    """
+    Firestoreのリースでシミュレーションを取得して実行するワーカー。
+    同時実行数はSIMULATION_MAX_CONCURRENCY（ワーカーごと）で制限されます。
+    """
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.simulation_service = SimulationService()
+        self.db = self.simulation_service.db
+        self.simulations_collection = self.simulation_service.simulations_collection
+        self.leases = LeaseService(self.db, SIMULATION_LEASE_COLLECTION)
+        self.runner = JobRunner(
+            name=f"simulation-worker-{self.worker_id}",
+            max_workers=settings.SIMULATION_MAX_CONCURRENCY,
+            max_per_user=settings.SIMULATION_MAX_CONCURRENCY_PER_USER,
+            shutdown_grace_seconds=settings.SIMULATION_SHUTDOWN_GRACE_SECONDS,
+        )
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def run(self):
+        """SIGINT/SIGTERMを受けるまでシミュレーションを取得・実行し続けます。"""
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        event_bus = get_event_bus()
+        if isinstance(event_bus, InProcessEventBus):
+            logger.warning("Worker is using the in-process event bus; SSE notifications will not reach API processes")
+        await event_bus.start()
+        self.runner.start()
+        get_remote_session_pool().start()
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Simulation worker {self.worker_id} started")
+
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await self._claim_available()
+                except Exception as e:
+                    logger.error(f"Worker {self.worker_id}: Error while claiming simulations: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.SIMULATION_WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            logger.info(f"Simulation worker {self.worker_id} shutting down")
+            # 実行中のジョブを待ち、終わらなかったものはpendingに戻して他のワーカーに引き継ぐ
+            await self.runner.shutdown()
+            heartbeat_task.cancel()
+            await asyncio.gather(heartbeat_task, return_exceptions=True)
+            await get_remote_session_pool().stop()
+            await event_bus.stop()
+
+    def _free_slots(self) -> int:
+        stats = self.runner.stats()
+        return self.runner.max_workers - stats["queued"] - stats["running"]
+
+    async def _claim_available(self):
+        free_slots = self._free_slots()
+        if free_slots <= 0:
+            return
+        candidates = await asyncio.to_thread(self._find_candidates, free_slots)
+        for simulation_id in candidates:
+            if free_slots <= 0 or self._stopping.is_set():
+                break
+            if self.runner.get(simulation_id):
+                continue
+            created_by = await asyncio.to_thread(self._claim, simulation_id)
+            if not created_by:
+                continue
+            self.runner.submit(
+                job_id=simulation_id,
+                user_id=created_by,
+                factory=lambda simulation_id=simulation_id: self._run_simulation(simulation_id),
+                priority=SIMULATION_PRIORITY_DEFAULT,
+                on_interrupted=lambda simulation_id=simulation_id: self._requeue(simulation_id),
+            )
+            free_slots -= 1
+
+    def _find_candidates(self, limit: int) -> List[str]:
+        """pendingのシミュレーションと、リースが期限切れになったシミュレーションのIDを返します。"""
+        pending_query = (
+            self.simulations_collection
+            .where(filter=firestore.FieldFilter('status', '==', 'pending'))
+            .limit(limit * 2)
+        )
+        candidates = [doc.id for doc in pending_query.stream()]
+        for simulation_id in self.leases.list_expired(limit):
+            if simulation_id not in candidates:
+                candidates.append(simulation_id)
+        return candidates
+
+    def _claim(self, simulation_id: str) -> Optional[str]:
+        """
+        リースを取得し、同じトランザクションでシミュレーションをrunningにします。
+
+        Returns:
+            取得できた場合は作成者のユーザーID、できなかった場合はNone
+        """
+        doc_ref = self.simulations_collection.document(simulation_id)
+        claimed = self.leases.try_acquire(
+            simulation_id,
+            self.worker_id,
+            settings.SIMULATION_LEASE_TTL_SECONDS,
+            extra_updates=[(
+                doc_ref,
+                self._claim_updates,
+                lambda snapshot: snapshot.exists and snapshot.get('status') in CLAIMABLE_STATUSES,
+            )],
+        )
+        snapshot = doc_ref.get()
+        if not claimed:
+            if not snapshot.exists or snapshot.get('status') not in CLAIMABLE_STATUSES:
+                # 完了後にリースを解放できずに落ちたワーカーの残骸を掃除する
+                if not self.leases.is_held(simulation_id):
+                    self.leases.leases_collection.document(simulation_id).delete()
+            return None
+        logger.info(f"Worker {self.worker_id} claimed simulation {simulation_id}")
+        return snapshot.get('created_by')
+
+    def _claim_updates(self, snapshot) -> dict:
+        updates = {'status': 'running', 'worker_id': self.worker_id}
+        if snapshot.get('status') == 'running':
+            # 停止したワーカーから引き継ぐ場合は、記録済みのターンを上書きしないようチェックポイントから再開する
+            updates['resume_from_checkpoint'] = True
+        return updates
+
+    async def _run_simulation(self, simulation_id: str):
+        try:
+            await self.simulation_service._execute_simulation_background(simulation_id)
+        finally:
+            await asyncio.to_thread(self.leases.release, simulation_id, self.worker_id)
+
+    async def _requeue(self, simulation_id: str):
+        """シャットダウンで中断されたシミュレーションをpendingに戻します（次のワーカーはチェックポイントから再開）。"""
+        try:
+            self.simulations_collection.document(simulation_id).update({
+                'status': 'pending',
+                'worker_id': None,
+                'resume_from_checkpoint': True
+            })
+            await asyncio.to_thread(self.leases.release, simulation_id, self.worker_id)
+            logger.info(f"Simulation {simulation_id} returned to the queue")
+        except Exception as e:
+            logger.error(f"Failed to requeue simulation {simulation_id}: {str(e)}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.SIMULATION_LEASE_HEARTBEAT_SECONDS)
+            for simulation_id in self.runner.active_job_ids():
+                renewed = await asyncio.to_thread(
+                    self.leases.renew, simulation_id, self.worker_id, settings.SIMULATION_LEASE_TTL_SECONDS
+                )
+                if not renewed:
+                    # 他のワーカーが引き継いだので、二重実行を避けるためローカルのジョブを止める
+                    logger.warning(f"Worker {self.worker_id} lost the lease on simulation {simulation_id}; cancelling")
+                    self.runner.cancel(simulation_id)
+
+
+def main():
+    initialize_firebase_admin()
+    initialize_vertex_ai()
+    asyncio.run(SimulationWorker().run())
+
+
+if __name__ == "__main__":
+    main()